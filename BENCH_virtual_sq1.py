@@ -0,0 +1,468 @@
+"""
+Benchmarks for the hot paths of virtual_sq1.
+
+Runs every benchmark over fixed, hard-coded datasets (so they never
+change with virtual_sq1), prints the results as JSON and optionally
+compares them against a baseline saved by an earlier run (exiting with
+status 1 if anything got slower than the tolerance).
+
+Every run is timed for at least --min-time seconds and the fastest of
+--repeat interleaved runs is kept, but timings still drift by up to
+about 15% between invocations on a single shared CPU (less on an idle
+machine with several), so keep --tolerance above the noise floor of the
+machine (compare two runs of the same code to measure it).
+
+Usage:
+    python BENCH_virtual_sq1.py --output results.json
+    python BENCH_virtual_sq1.py --baseline results.json --tolerance 0.2
+
+Need help? Visit https://github.com/Wo0fle/virtual-sq1
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import platform
+import re
+import sys
+import time
+
+from virtual_sq1 import __version__, Square1, FastSquare1, Layer, compile_alg
+
+
+SEED = 2024  # the seed the hard-coded datasets below were drawn with (kept in the results)
+SHORT_ALGS = (
+    "/ (3,0) / (1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) / (-1,0)",
+    "/ (3,0) / (-3,-3) / (0,3) /",
+    "(1,0) / (-1,0)",
+    "/ (6,6) / (2,1)",
+    "(0,-1) / (-3,0) / (1,1) / (3,0) / (-1,0)",
+)
+BAD_ALGS = ("2/", "(1,0) / (0,2) /", "--3/", "3,4,5,6/")
+BAD_STATES = ("ABCDEFGHI123456789", "ABCDEF1234567", "1ABCDEFG2345678")
+# random states, scrambles of them (about 100 slashes each) and turn amounts, fixed so the datasets never depend on
+# the code being measured
+LONG_ALGS = (
+    ("(1,0) / (6,6) / (6,0) / (0,3) / (0,-3) / (3,3) / (-1,0) / (3,0) / (1,0) / (0,3) / (-1,0) / (-3,0) / (1,0) / (0,-3) / "
+     "(-3,-1) / (6,6) / (1,0) / (0,-3) / (-1,0) / (3,0) / (1,0) / (0,3) / (-1,0) / (3,6) / (-1,1) / (3,0) / (1,0) / "
+     "(0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) / (3,0) / (3,0) / (6,0) / (6,0) / (2,0) / (0,-3) / (-2,-1) / (6,-2) / "
+     "(0,3) / (0,6)"),
+    ("(1,3) / (6,0) / (3,0) / (-3,0) / (0,6) / (0,3) / (0,3) / (0,3) / (0,-3) / (3,-3) / (0,-3) / (0,3) / (-1,0) / (3,0) / "
+     "(1,0) / (0,-3) / (-1,0) / (-3,0) / (1,3) / (-3,3) / (0,3) / (0,-3) / (3,3) / (6,3) / (-1,0) / (3,6) / (5,-2) / "
+     "(4,-4) / (4,-4) / (2,-5) / (0,3) / (1,-3) / (-3,-1) / (-3,6) / (1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) / "
+     "(-1,0) / (6,6) / (3,1) / (0,6) / (-1,0) / (3,0) / (1,0) / (0,3) / (-1,0) / (-3,-3) / (-2,5) / (-4,4) / (-4,4) / "
+     "(-5,2) / (-3,6) / (4,0) / (-3,0) / (-1,0) / (3,6) / (5,-2) / (4,-4) / (4,-4) / (2,-5) / (0,3) / (4,0) / (-1,0) / "
+     "(6,6) / (2,1) / (3,0) / (1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) / (-3,-1) / (6,6) / (1,0) / (-4,0) / (3,0) / "
+     "(1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) / (2,0) / (6,6) / (3,1) / (0,-3) / (-1,0) / (3,0) / (1,0) / (0,3) / "
+     "(-1,0) / (-3,0) / (1,3) / (6,6) / (-3,-3) / (0,3) / (0,3) / (0,3) / (0,-3) / (-1,0) / (0,-3) / (-2,5) / (-4,4) / "
+     "(-4,4) / (-5,2) / (-3,6) / (1,3) / (0,-3) / (-4,-3) / (0,-3) / (-2,5) / (-4,4) / (-4,4) / (-5,2) / (-3,6) / (0,-3) / "
+     "(3,6) / (5,-2) / (4,-4) / (4,-4) / (0,6) / (3,-4) / (6,5) / (4,0)"),
+    ("(4,0) / (0,-3) / (3,0) / (6,3) / (-1,0) / (3,6) / (5,-2) / (4,-4) / (4,-4) / (2,-5) / (0,3) / (-2,6) / (0,3) / "
+     "(0,-3) / (3,0) / (0,3) / (0,3) / (0,-3) / (0,-3) / (-1,0) / (3,0) / (1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / "
+     "(0,6) / (-3,-1) / (-3,6) / (1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) / (-1,0) / (6,6) / (3,1) / (0,6) / "
+     "(-1,0) / (3,0) / (1,0) / (0,3) / (-1,0) / (-3,-3) / (-2,5) / (-4,4) / (-4,4) / (-5,2) / (-3,6) / (4,0) / (-3,0) / "
+     "(-1,0) / (3,6) / (5,-2) / (4,-4) / (4,-4) / (2,-5) / (0,3) / (4,0) / (-3,-4) / (-3,6) / (1,0) / (0,-3) / (-1,0) / "
+     "(-3,0) / (1,0) / (0,3) / (3,0) / (0,-3) / (-1,0) / (3,0) / (1,0) / (0,3) / (-1,0) / (3,6) / (2,1) / (0,-3) / (0,-1) / "
+     "(1,-4) / (-4,2) / (4,-3)"),
+    ("(1,6) / (-3,0) / (0,-3) / (3,0) / (-3,0) / (6,0) / (0,3) / (6,-3) / (6,3) / (-1,0) / (3,6) / (5,-2) / (4,-4) / "
+     "(4,-4) / (2,-5) / (0,3) / (-2,6) / (0,3) / (0,-3) / (3,0) / (0,3) / (0,3) / (0,-3) / (2,0) / (3,0) / (1,0) / (0,-3) / "
+     "(-1,0) / (-3,0) / (1,0) / (0,3) / (6,0) / (0,-3) / (-1,0) / (3,0) / (1,0) / (0,3) / (-1,0) / (-3,0) / (4,0) / "
+     "(-3,-1) / (6,6) / (1,0) / (0,-3) / (-1,0) / (3,0) / (1,0) / (0,3) / (-1,0) / (3,6) / (3,1) / (0,6) / (-1,0) / (3,0) / "
+     "(1,0) / (0,3) / (-1,0) / (-3,-3) / (-2,5) / (-4,4) / (-4,4) / (-5,2) / (-3,6) / (4,0) / (-3,0) / (-1,0) / (3,6) / "
+     "(5,-2) / (4,-4) / (4,-4) / (2,-5) / (0,3) / (4,0) / (-1,0) / (6,6) / (3,1) / (0,-3) / (-1,0) / (3,0) / (1,0) / "
+     "(0,3) / (-1,0) / (-3,0) / (-2,-1) / (6,6) / (-2,-1) / (6,6) / (1,0) / (0,-3) / (-1,0) / (3,0) / (1,0) / (0,3) / "
+     "(-1,0) / (3,6) / (2,1) / (0,-3) / (0,-1) / (0,-4) / (4,6) / (-4,6) / (4,0)"),
+    ("(1,6) / (-3,6) / (0,3) / (0,-3) / (0,3) / (0,-3) / (3,-3) / (0,-3) / (0,3) / (-3,0) / (-1,0) / (3,0) / (1,0) / "
+     "(0,3) / (-1,0) / (-3,0) / (1,0) / (-4,-3) / (3,0) / (1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) / (2,0) / "
+     "(6,6) / (2,1) / (3,0) / (1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) / (-3,-1) / (6,6) / (-2,-1) / (-3,6) / "
+     "(1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) / (-1,0) / (6,6) / (3,1) / (-4,0) / (3,0) / (1,0) / (0,-3) / "
+     "(-1,0) / (-3,0) / (1,0) / (0,3) / (2,0) / (6,6) / (3,1) / (0,-3) / (-1,0) / (3,0) / (1,0) / (0,3) / (-1,0) / (-3,0) / "
+     "(1,3) / (6,6) / (-3,-3) / (0,3) / (0,3) / (0,3) / (0,-3) / (-1,0) / (0,-3) / (-2,5) / (-4,4) / (-4,4) / (-5,2) / "
+     "(-3,6) / (1,3) / (0,-3) / (-4,-3) / (0,-3) / (-2,5) / (-4,4) / (-4,4) / (-5,2) / (-3,6) / (0,-3) / (3,6) / (5,-2) / "
+     "(4,-4) / (4,-4) / (2,-5) / (0,3) / (4,0) / (6,0) / (6,0) / (2,0) / (0,-3) / (-2,5) / (0,-2) / (2,0)"),
+    ("(4,6) / (-3,6) / (-3,0) / (0,3) / (0,-3) / (3,-3) / (-1,0) / (3,0) / (1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / "
+     "(-3,3) / (0,-3) / (-1,0) / (3,0) / (1,0) / (0,3) / (-1,0) / (-3,0) / (-5,0) / (0,-3) / (-1,0) / (3,0) / (1,0) / "
+     "(0,3) / (-1,0) / (-3,0) / (-2,6) / (0,-3) / (0,3) / (-1,3) / (3,6) / (5,-2) / (4,-4) / (4,-4) / (2,-5) / (0,3) / "
+     "(3,0) / (0,-3) / (-2,5) / (-4,4) / (-4,4) / (-5,2) / (-3,6) / (1,6) / (-1,0) / (3,0) / (1,0) / (0,3) / (-1,0) / "
+     "(-3,-3) / (-2,5) / (-4,4) / (-4,4) / (-5,2) / (-3,6) / (4,0) / (-3,0) / (-1,0) / (3,6) / (5,-2) / (4,-4) / (4,-4) / "
+     "(2,-5) / (0,3) / (4,0) / (-3,-1) / (-3,6) / (1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) / (-1,0) / (6,6) / "
+     "(3,1) / (-4,0) / (3,0) / (1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) / (2,0) / (6,6) / (3,1) / (0,-3) / (-1,0) / "
+     "(3,0) / (1,0) / (0,3) / (-1,0) / (-3,0) / (1,3) / (6,6) / (-3,-3) / (0,3) / (0,3) / (0,3) / (0,-3) / (-1,0) / "
+     "(0,-3) / (-2,5) / (-4,4) / (-4,4) / (-5,2) / (-3,6) / (1,3) / (0,-3) / (-4,-3) / (0,-3) / (-2,5) / (-4,4) / (-4,4) / "
+     "(-5,2) / (-3,6) / (0,-3) / (3,6) / (5,-2) / (4,-4) / (4,-4) / (2,-5) / (0,3) / (4,0) / (6,0) / (6,0) / (2,0) / "
+     "(0,-3) / (-2,-1) / (-3,6) / (-5,-2)"),
+    ("(1,0) / (-3,0) / (0,-3) / (3,0) / (-1,0) / (6,6) / (3,4) / (0,3) / (3,-3) / (6,3) / (-1,0) / (3,6) / (5,-2) / "
+     "(4,-4) / (4,-4) / (2,-5) / (0,3) / (-2,6) / (0,3) / (0,-3) / (3,0) / (0,3) / (0,3) / (0,6) / (-1,0) / (3,0) / (1,0) / "
+     "(0,3) / (-1,0) / (-3,0) / (-2,0) / (-1,0) / (3,0) / (1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / (3,3) / (-3,-1) / "
+     "(-3,6) / (1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) / (-1,0) / (6,6) / (3,1) / (-1,0) / (3,0) / (1,0) / "
+     "(0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) / (-1,3) / (0,-3) / (-2,5) / (-4,4) / (-4,4) / (-5,2) / (-3,6) / (1,3) / "
+     "(0,-3) / (-1,-3) / (0,-3) / (-2,5) / (-4,4) / (-4,4) / (-5,2) / (-3,6) / (3,0) / (0,-3) / (-2,5) / (-4,4) / (-4,4) / "
+     "(-5,2) / (3,0) / (2,1) / (3,0) / (1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) / (-3,-1) / (6,6) / (-2,-1) / "
+     "(-3,6) / (1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) / (-1,0) / (6,6) / (3,1) / (-4,0) / (3,0) / (1,0) / "
+     "(0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) / (2,0) / (6,6) / (3,1) / (0,-3) / (-1,0) / (3,0) / (1,0) / (0,3) / (-1,0) / "
+     "(-3,0) / (1,3) / (6,6) / (-3,-3) / (0,3) / (0,3) / (0,3) / (0,-3) / (-1,0) / (0,-3) / (-2,5) / (-4,4) / (-4,4) / "
+     "(-5,2) / (-3,6) / (1,3) / (0,-3) / (-4,-3) / (0,-3) / (-2,5) / (-4,4) / (-4,4) / (-5,2) / (-3,6) / (0,-3) / (3,6) / "
+     "(5,-2) / (4,-4) / (4,-4) / (2,-5) / (0,3) / (4,0) / (6,0) / (6,0) / (2,0) / (0,-3) / (-2,5) / (6,4) / (1,0) /"),
+    ("(4,3) / (-3,6) / (0,3) / (3,3) / (6,3) / (-1,0) / (3,6) / (5,-2) / (4,-4) / (4,-4) / (2,-5) / (0,3) / (-2,6) / "
+     "(0,3) / (0,-3) / (3,0) / (0,3) / (0,3) / (-1,-3) / (3,0) / (1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / (-3,0) / "
+     "(-1,0) / (3,0) / (1,0) / (0,3) / (-1,0) / (-3,0) / (1,0) / (3,0) / (-3,-1) / (-3,6) / (1,0) / (0,-3) / (-1,0) / "
+     "(-3,0) / (1,0) / (0,3) / (-1,0) / (6,6) / (3,1) / (-3,-1) / (-3,6) / (1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / "
+     "(0,3) / (-1,0) / (6,6) / (2,1) / (0,-3) / (-2,-1) / (-3,4) / (-5,6) / (-4,2)"),
+    ("(-2,3) / (-3,0) / (0,-3) / (3,0) / (-3,0) / (6,0) / (0,3) / (5,-3) / (3,0) / (1,0) / (0,-3) / (-1,0) / (-3,0) / "
+     "(1,3) / (-3,3) / (0,3) / (0,-3) / (3,3) / (6,3) / (-1,0) / (3,6) / (5,-2) / (4,-4) / (4,-4) / (2,-5) / (0,3) / "
+     "(1,-3) / (-3,-1) / (-3,6) / (1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) / (-1,0) / (6,6) / (3,1) / (0,6) / "
+     "(-1,0) / (3,0) / (1,0) / (0,3) / (-1,0) / (-3,-3) / (-2,5) / (-4,4) / (-4,4) / (-5,2) / (-3,6) / (4,0) / (-3,0) / "
+     "(-1,0) / (3,6) / (5,-2) / (4,-4) / (4,-4) / (2,-5) / (3,3) / (1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) / "
+     "(2,0) / (6,6) / (3,1) / (0,-3) / (-1,0) / (3,0) / (1,0) / (0,3) / (-1,0) / (-3,0) / (1,3) / (6,6) / (-3,-3) / (0,3) / "
+     "(0,3) / (0,3) / (0,-3) / (-1,0) / (0,-3) / (-2,5) / (-4,4) / (-4,4) / (-5,2) / (-3,6) / (1,3) / (0,-3) / (-4,-3) / "
+     "(0,-3) / (-2,5) / (-4,4) / (-4,4) / (-5,2) / (-3,6) / (0,-3) / (3,6) / (5,-2) / (4,-4) / (4,-4) / (2,-5) / (0,3) / "
+     "(4,0) / (6,0) / (6,0) / (2,0) / (0,-3) / (0,-1) / (1,-4) / (-4,5) / (2,1) / (2,0)"),
+    ("(1,0) / (-3,0) / (0,-3) / (3,0) / (-1,0) / (6,6) / (3,1) / (0,3) / (0,6) / (0,3) / (0,-3) / (3,-3) / (0,-3) / (0,3) / "
+     "(-3,-3) / (-1,0) / (3,0) / (1,0) / (0,3) / (-1,0) / (-3,0) / (1,0) / (-3,0) / (-1,0) / (3,0) / (1,0) / (0,-3) / "
+     "(-1,0) / (-3,0) / (1,0) / (6,3) / (0,-3) / (-1,0) / (3,0) / (1,0) / (0,3) / (-1,0) / (-3,0) / (-2,6) / (0,-3) / "
+     "(0,3) / (-1,3) / (3,6) / (5,-2) / (4,-4) / (4,-4) / (2,-5) / (0,3) / (3,0) / (0,-3) / (-2,5) / (-4,4) / (-4,4) / "
+     "(-5,2) / (3,0) / (2,1) / (3,0) / (1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) / (-3,-1) / (6,6) / (-2,-1) / "
+     "(-3,6) / (1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) / (-1,0) / (6,6) / (3,1) / (-4,0) / (3,0) / (1,0) / "
+     "(0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) / (2,0) / (6,6) / (3,1) / (0,-3) / (-1,0) / (3,0) / (1,0) / (0,3) / (-1,0) / "
+     "(-3,0) / (1,3) / (6,6) / (-3,-3) / (0,3) / (0,3) / (0,3) / (0,-3) / (-1,0) / (0,-3) / (-2,5) / (-4,4) / (-4,4) / "
+     "(-5,2) / (-3,6) / (1,3) / (0,-3) / (-4,-3) / (0,-3) / (-2,5) / (-4,4) / (-4,4) / (-5,2) / (-3,6) / (0,-3) / (3,6) / "
+     "(5,-2) / (4,-4) / (4,-4) / (2,-5) / (0,3) / (4,0) / (6,0) / (6,0) / (2,0) / (0,-3) / (0,-1) / (1,-4) / (6,5) / (2,3)"),
+    ("(1,0) / (3,-3) / (0,-3) / (0,-3) / (0,3) / (0,-3) / (-1,0) / (3,0) / (1,0) / (0,3) / (-1,0) / (-3,0) / (1,0) / "
+     "(3,3) / (6,6) / (-1,-3) / (3,0) / (1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) / (-3,-1) / (6,6) / (-2,0) / "
+     "(0,-3) / (-1,0) / (3,0) / (1,0) / (0,3) / (-1,0) / (-3,0) / (4,0) / (-1,0) / (6,6) / (2,1) / (3,0) / (1,0) / (0,-3) / "
+     "(-1,0) / (-3,0) / (1,0) / (0,3) / (-3,-1) / (6,6) / (-2,-1) / (-3,6) / (1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / "
+     "(0,3) / (-1,0) / (6,6) / (3,1) / (-4,0) / (3,0) / (1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) / (2,0) / (6,6) / "
+     "(3,1) / (0,-3) / (-1,0) / (3,0) / (1,0) / (0,3) / (-1,0) / (-3,0) / (1,3) / (6,6) / (-3,-3) / (0,3) / (0,3) / (0,3) / "
+     "(0,-3) / (-1,0) / (0,-3) / (-2,5) / (-4,4) / (-4,4) / (-5,2) / (-3,6) / (1,3) / (0,-3) / (-4,-3) / (0,-3) / (-2,5) / "
+     "(-4,4) / (-4,4) / (-5,2) / (-3,6) / (0,-3) / (3,6) / (5,-2) / (4,-4) / (4,-4) / (2,-5) / (-3,0) / (4,5) / (-2,6) / "
+     "(-2,0) /"),
+    ("(1,-3) / (6,-3) / (-3,0) / (0,3) / (0,-3) / (0,-3) / (3,3) / (6,3) / (-1,0) / (3,6) / (5,-2) / (4,-4) / (4,-4) / "
+     "(2,-5) / (0,3) / (1,0) / (-3,-1) / (-3,6) / (1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) / (-1,0) / (6,6) / "
+     "(3,1) / (-1,0) / (3,0) / (1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) / (-1,3) / (0,-3) / (-2,5) / (-4,4) / "
+     "(-4,4) / (-5,2) / (-3,6) / (1,3) / (0,-3) / (-1,-3) / (0,-3) / (-2,5) / (-4,4) / (-4,4) / (-5,2) / (-3,6) / (3,0) / "
+     "(0,-3) / (-2,5) / (-4,4) / (-4,4) / (-5,2) / (-3,6) / (-2,-4) / (-3,6) / (1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / "
+     "(0,3) / (2,0) / (6,6) / (2,1) / (0,-3) / (4,5) / (-4,6) /"),
+    ("(-5,6) / (-3,-3) / (0,-3) / (3,3) / (6,3) / (-1,0) / (3,6) / (5,-2) / (4,-4) / (4,-4) / (2,-5) / (0,3) / (3,0) / "
+     "(3,0) / (1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) / (6,0) / (-1,0) / (3,0) / (1,0) / (0,-3) / (-1,0) / "
+     "(-3,0) / (1,0) / (6,3) / (0,-3) / (-1,0) / (3,0) / (1,0) / (0,3) / (-1,0) / (-3,0) / (-2,6) / (0,-3) / (0,3) / "
+     "(-1,3) / (3,6) / (5,-2) / (4,-4) / (4,-4) / (2,-5) / (0,3) / (3,0) / (0,-3) / (-2,5) / (-4,4) / (-4,4) / (-5,2) / "
+     "(-3,6) / (1,6) / (-1,0) / (3,0) / (1,0) / (0,3) / (-1,0) / (-3,-3) / (-2,5) / (-4,4) / (-4,4) / (-5,2) / (-3,6) / "
+     "(4,0) / (-3,0) / (-1,0) / (3,6) / (5,-2) / (4,-4) / (4,-4) / (2,-5) / (0,3) / (4,0) / (-3,-4) / (-3,6) / (1,0) / "
+     "(0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) / (2,0) / (6,6) / (2,1) / (-3,6) / (6,-5) /"),
+    ("(1,3) / (6,6) / (0,-3) / (0,-3) / (3,6) / (6,3) / (-1,0) / (3,6) / (5,-2) / (4,-4) / (4,-4) / (2,-5) / (0,3) / "
+     "(1,-3) / (-1,0) / (3,0) / (1,0) / (0,3) / (-1,0) / (-3,0) / (1,0) / (-3,-3) / (-1,0) / (3,0) / (1,0) / (0,3) / "
+     "(-1,0) / (-3,0) / (1,0) / (2,0) / (6,6) / (2,1) / (3,0) / (1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) / "
+     "(-3,-1) / (6,6) / (-2,-1) / (6,6) / (1,0) / (0,-3) / (-1,0) / (3,0) / (1,0) / (0,3) / (-1,0) / (3,6) / (3,1) / "
+     "(-4,0) / (3,0) / (1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) / (2,0) / (6,6) / (3,1) / (0,-3) / (-1,0) / (3,0) / "
+     "(1,0) / (0,3) / (-1,0) / (-3,0) / (1,3) / (6,6) / (-3,-3) / (0,3) / (0,3) / (0,3) / (0,-3) / (-1,0) / (0,-3) / "
+     "(-2,5) / (-4,4) / (-4,4) / (-5,2) / (-3,6) / (1,3) / (0,-3) / (-4,-3) / (0,-3) / (-2,5) / (-4,4) / (-4,4) / (-5,2) / "
+     "(-3,6) / (0,-3) / (3,6) / (5,-2) / (4,-4) / (4,-4) / (2,-5) / (0,3) / (4,0) / (6,0) / (6,0) / (2,0) / (0,-3) / "
+     "(4,-1) / (4,6) /"),
+    ("(1,0) / (3,-3) / (0,-3) / (0,-3) / (0,-3) / (0,3) / (0,-3) / (3,-3) / (0,-3) / (0,3) / (6,6) / (0,3) / (0,-3) / "
+     "(3,0) / (0,3) / (0,3) / (0,-3) / (0,-3) / (-1,0) / (3,0) / (1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / (-4,6) / "
+     "(3,0) / (1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) / (6,0) / (0,-3) / (-1,0) / (3,0) / (1,0) / (0,3) / (-1,0) / "
+     "(-3,0) / (-2,6) / (0,-3) / (0,3) / (-1,3) / (3,6) / (5,-2) / (4,-4) / (4,-4) / (2,-5) / (0,3) / (3,0) / (0,-3) / "
+     "(-2,5) / (-4,4) / (-4,4) / (-5,2) / (-3,6) / (1,0) / (-3,0) / (0,-3) / (-1,0) / (3,0) / (1,0) / (0,3) / (-1,0) / "
+     "(-3,0) / (4,0) / (-1,0) / (6,6) / (3,1) / (0,-3) / (-1,0) / (3,0) / (1,0) / (0,3) / (-1,0) / (-3,0) / (-2,-1) / "
+     "(6,6) / (-2,-1) / (6,6) / (1,0) / (0,-3) / (-1,0) / (3,0) / (1,0) / (0,3) / (-1,0) / (3,6) / (3,1) / (-4,0) / (3,0) / "
+     "(1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) / (2,0) / (6,6) / (3,1) / (0,-3) / (-1,0) / (3,0) / (1,0) / (0,3) / "
+     "(-1,0) / (-3,0) / (1,3) / (6,6) / (-3,-3) / (0,3) / (0,3) / (0,3) / (0,-3) / (-1,0) / (0,-3) / (-2,5) / (-4,4) / "
+     "(-4,4) / (-5,2) / (-3,6) / (1,3) / (0,-3) / (-4,-3) / (0,-3) / (-2,5) / (-4,4) / (-4,4) / (-5,2) / (-3,6) / (0,-3) / "
+     "(3,6) / (5,-2) / (4,-4) / (4,-4) / (2,6) / (0,-4) / (0,1) / (3,4)"),
+    ("(1,3) / (6,0) / (3,0) / (-3,3) / (2,0) / (3,0) / (1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) / (6,0) / (-1,0) / "
+     "(3,0) / (1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / (3,6) / (-1,0) / (0,-3) / (-2,5) / (-4,4) / (-4,4) / (-5,2) / "
+     "(-3,6) / (4,0) / (-3,0) / (0,3) / (5,0) / (6,6) / (2,1) / (3,6) / (5,-2) / (4,-4) / (4,-4) / (2,-5) / (0,3) / "
+     "(-2,-4) / (6,6) / (1,0) / (0,-3) / (-1,0) / (3,0) / (1,0) / (0,3) / (-1,0) / (3,6) / (3,1) / (-4,0) / (3,0) / (1,0) / "
+     "(0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) / (2,0) / (6,6) / (3,1) / (0,-3) / (-1,0) / (3,0) / (1,0) / (0,3) / (-1,0) / "
+     "(-3,0) / (1,3) / (6,6) / (-3,-3) / (0,3) / (0,3) / (0,3) / (0,-3) / (-1,0) / (0,-3) / (-2,5) / (-4,4) / (-4,4) / "
+     "(-5,2) / (-3,6) / (1,3) / (0,-3) / (-4,-3) / (0,-3) / (-2,5) / (-4,4) / (-4,4) / (-5,2) / (-3,6) / (0,-3) / (3,6) / "
+     "(5,-2) / (4,-4) / (4,-4) / (2,-5) / (0,3) / (4,0) / (6,0) / (6,0) / (2,0) / (0,-3) / (0,-1) / (0,-4) / (6,-5) / "
+     "(-2,3) / (6,-4)"),
+    ("(-5,0) / (3,0) / (-3,6) / (-3,0) / (0,3) / (0,-3) / (6,0) / (6,3) / (-1,0) / (3,6) / (5,-2) / (4,-4) / (4,-4) / "
+     "(2,-5) / (3,3) / (1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) / (-4,0) / (3,0) / (1,0) / (0,-3) / (-1,0) / "
+     "(-3,0) / (1,0) / (0,3) / (3,0) / (-3,-1) / (-3,6) / (1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) / (-1,0) / "
+     "(6,6) / (0,1) / (0,-3) / (-1,0) / (3,0) / (1,0) / (0,3) / (-1,0) / (-3,0) / (4,0) / (-3,-4) / (-3,6) / (1,0) / "
+     "(0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) / (3,0) / (0,-3) / (-1,0) / (3,0) / (1,0) / (0,3) / (-1,0) / (3,6) / (3,1) / "
+     "(-4,0) / (3,0) / (1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) / (2,0) / (6,6) / (3,1) / (0,-3) / (-1,0) / (3,0) / "
+     "(1,0) / (0,3) / (-1,0) / (-3,0) / (1,3) / (6,6) / (-3,-3) / (0,3) / (0,3) / (0,3) / (0,-3) / (-1,0) / (0,-3) / "
+     "(-2,5) / (-4,4) / (-4,4) / (-5,2) / (-3,6) / (1,3) / (0,-3) / (-4,-3) / (0,-3) / (-2,5) / (-4,4) / (-4,4) / (-5,2) / "
+     "(-3,6) / (0,-3) / (3,6) / (5,-2) / (4,-4) / (4,-4) / (2,-5) / (0,3) / (4,0) / (6,0) / (6,0) / (2,0)"),
+    ("(4,3) / (0,-3) / (0,-3) / (0,3) / (0,3) / (0,-3) / (3,-3) / (0,-3) / (0,3) / (6,6) / (0,3) / (0,-3) / (3,0) / (0,3) / "
+     "(0,3) / (0,-3) / (2,0) / (3,0) / (1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) / (-3,0) / (3,3) / (6,6) / "
+     "(-1,-3) / (3,0) / (1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) / (-3,-1) / (6,6) / (1,0) / (-1,0) / (3,0) / "
+     "(1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) / (-1,3) / (0,-3) / (-2,5) / (-4,4) / (-4,4) / (-5,2) / (-3,6) / "
+     "(1,3) / (0,-3) / (-1,-3) / (0,-3) / (-2,5) / (-4,4) / (-4,4) / (-5,2) / (-3,6) / (3,0) / (0,-3) / (-2,5) / (-4,4) / "
+     "(-4,4) / (-5,2) / (3,0) / (2,1) / (3,0) / (1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) / (-3,-1) / (6,3) / "
+     "(-2,-1) / (-3,4) / (3,4) / (-2,6) /"),
+    ("(4,3) / (-3,3) / (-3,0) / (0,3) / (0,-3) / (3,0) / (0,-3) / (-1,0) / (3,0) / (1,0) / (0,3) / (-1,0) / (-3,0) / "
+     "(-2,0) / (-1,0) / (3,0) / (1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / (6,3) / (0,-3) / (-1,0) / (3,0) / (1,0) / "
+     "(0,3) / (-1,0) / (-3,0) / (-2,6) / (0,-3) / (0,3) / (-1,3) / (3,6) / (5,-2) / (4,-4) / (4,-4) / (2,-5) / (0,3) / "
+     "(3,0) / (0,-3) / (-2,5) / (-4,4) / (-4,4) / (-5,2) / (-3,6) / (1,0) / (-3,0) / (0,-3) / (-1,0) / (3,0) / (1,0) / "
+     "(0,3) / (-1,0) / (-3,0) / (4,0) / (-3,-4) / (-3,6) / (1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) / (3,0) / "
+     "(0,-3) / (-1,0) / (3,0) / (1,0) / (0,3) / (-1,0) / (3,6) / (3,1) / (-4,0) / (3,0) / (1,0) / (0,-3) / (-1,0) / "
+     "(-3,0) / (1,0) / (0,3) / (2,0) / (6,6) / (3,1) / (0,-3) / (-1,0) / (3,0) / (1,0) / (0,3) / (-1,0) / (-3,0) / (1,3) / "
+     "(6,6) / (-3,-3) / (0,3) / (0,3) / (0,3) / (0,-3) / (-1,0) / (0,-3) / (-2,5) / (-4,4) / (-4,4) / (-5,2) / (-3,6) / "
+     "(1,3) / (0,-3) / (-4,-3) / (0,-3) / (-2,5) / (-4,4) / (-4,4) / (-5,2) / (-3,6) / (0,-3) / (3,6) / (5,-2) / (4,-4) / "
+     "(4,-4) / (2,-5) / (0,3) / (4,0) / (6,0) / (6,0) / (2,0) / (0,-3) / (-2,5) / (0,-2) / (2,1) / (1,6)"),
+    ("(-2,0) / (3,0) / (-3,6) / (0,-3) / (0,3) / (0,-3) / (3,-3) / (0,-3) / (0,3) / (-3,0) / (-1,0) / (3,0) / (1,0) / "
+     "(0,-3) / (-1,0) / (-3,0) / (1,0) / (-4,3) / (3,0) / (1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) / (3,0) / "
+     "(-1,0) / (0,-3) / (-2,5) / (-4,4) / (-4,4) / (-5,2) / (-3,6) / (4,0) / (-3,0) / (0,3) / (5,0) / (6,6) / (2,1) / "
+     "(3,6) / (5,-2) / (4,-4) / (4,-4) / (2,-5) / (0,3) / (1,6) / (-1,0) / (3,0) / (1,0) / (0,3) / (-1,0) / (-3,-3) / "
+     "(-2,5) / (-4,4) / (-4,4) / (-5,2) / (-3,6) / (4,0) / (-3,0) / (-1,0) / (3,6) / (5,-2) / (4,-4) / (4,-4) / (2,-5) / "
+     "(0,3) / (4,0) / (-3,-1) / (-3,6) / (1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) / (-1,0) / (6,6) / (3,1) / "
+     "(-4,0) / (3,0) / (1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) / (2,0) / (6,6) / (3,1) / (0,-3) / (-1,0) / (3,0) / "
+     "(1,0) / (0,3) / (-1,0) / (-3,0) / (1,3) / (6,6) / (-3,-3) / (0,3) / (0,3) / (0,3) / (0,-3) / (-1,0) / (0,-3) / "
+     "(-2,5) / (-4,4) / (-4,4) / (-5,2) / (-3,6) / (1,3) / (0,-3) / (-4,-3) / (0,-3) / (-2,5) / (-4,4) / (-4,4) / (-5,2) / "
+     "(-3,6) / (0,-3) / (3,6) / (5,-2) / (4,-4) / (4,-4) / (2,-5) / (-3,0) / (4,5) / (6,2) / (0,-4)"),
+)
+TURNS = (
+    -2, -3, 3, 2, -1, -3, 1, -5, 1, -1, 3, -2, -1, 6, 1, -3, 6, -3, -3, 1, -2, 3, -3, -1, -1,
+    -2, 1, -2, 3, -3, -2, 2, 3, 2, 2, -1, -5, 1, 3, -2, 1, -2, 1, -1, -2, 3, -1, -2, -2, -1,
+    1, -5, -3, 3, 3, -5, 6, -2, 1, 2, 6, 2, 1, 6, 6, -5, 1, -2, 3, 6, 2, 6, 2, -2, -3,
+    1, -1, -2, 6, 6, 2, -5, -2, -3, 3, -5, 1, -3, -3, 6, 6, -1, -1, 2, 1, 6, 1, -5, -1, 6,
+    -1, 1, 2, 1, 2, -5, -2, 1, 2, 2, -2, -5, 2, -5, 2, 2, -1, -2, 1, 6, -5, -2, -3, 6, 1,
+    3, -5, 3, -1, -2, -2, 2, -5, 6, 2, 3, -1, -3, 2, 6, 2, -5, 3, 6, -1, -2, -3, 3, 6, 3,
+    6, 6, -1, -5, 6, -3, 1, -3, 2, 2, -3, 2, 6, 6, 1, 3, 3, 1, -3, -5, -1, 3, -2, -2, -1,
+    -5, -5, 1, -5, -3, 2, -2, -1, -1, 1, -3, -2, -5, 1, 2, -3, 2, -2, -3, 2, 1, -5, 3, 6, -1,
+)
+STATES = (
+    "A7D16342G/8BH5EFC",
+    "5G2HCD63/B18AEF74",
+    "5E1ABF82/D3H74GC6",
+    "7F4B18HE/56CA3G2D",
+    "A5G1HCB/ED324F786",
+    "4CE583DF-71G26HAB",
+    "6HC47E1A-38B25DFG",
+    "23DAF4C5-H18EBG67",
+    "C54HG8B6-A7E12F3D",
+    "45GBD3A7-H68F2EC1",
+    "ABEG2136-F75H84DC",
+    "GAHC5F4-7816B3D2E",
+    "6B2A4C8F-G51H37ED",
+    "4B825CG63/FHA7E1D",
+    "7HF5A61B-8C4EDG32",
+    "2DH8FG64-CA35B1E7",
+    "C8A1G2F7/6E3D5H4B",
+    "61GD23AB/FH57C8E4",
+    "4F7H12EG/58B36DCA",
+    "AG256718C-DHFB43E",
+)
+
+
+def _datasets() -> dict:
+    """Builds the fixed inputs every benchmark runs over."""
+
+    layers = [re.split("[-/]", state) for state in STATES]
+
+    return {
+        "layers": [top for top, _ in layers] + [bottom for _, bottom in layers],
+        "turns": list(TURNS),
+        "short_algs": list(SHORT_ALGS),
+        "long_algs": list(LONG_ALGS),
+        "states": list(STATES),
+    }
+
+
+def _calibrate(function, min_time: float) -> int:
+    """Returns how many calls of `function` in a row take at least `min_time` seconds (warming up its caches)."""
+
+    loops = 1
+
+    while True:
+        start = time.perf_counter()
+
+        for _ in range(loops):
+            function()
+
+        if time.perf_counter() - start >= min_time:
+            return loops
+
+        loops *= 2
+
+
+def _time(function, operations: int, loops: int) -> float:
+    """Returns the seconds per operation of `loops` calls of `function` (which does `operations` operations)."""
+
+    start = time.perf_counter()
+
+    for _ in range(loops):
+        function()
+
+    return (time.perf_counter() - start) / (loops * operations)
+
+
+def _apply_alg(engine, algs: list, for_case: bool = False):
+    """Returns a benchmark applying each of `algs` to a new puzzle of the class `engine`."""
+
+    def run():
+        for alg in algs:
+            engine().apply_alg(alg, for_case)
+
+    return run
+
+
+def _apply_state(engine, states: list):
+    """Returns a benchmark applying each of `states` to a new puzzle of the class `engine`."""
+
+    def run():
+        for state in states:
+            engine().apply_state(state)
+
+    return run
+
+
+def _compiled_apply(algs: list):
+    """Returns a benchmark applying each of `algs`, compiled beforehand, to a new FastSquare1."""
+
+    compiled = [compile_alg(alg) for alg in algs]
+
+    def run():
+        for alg in compiled:
+            alg.apply_to(FastSquare1())
+
+    return run
+
+
+def _benchmarks(data: dict) -> dict:
+    """Returns each benchmark's name, mapped to a function that runs it once and the number of operations it does."""
+
+    def layer_turn():
+        for state in data["layers"]:
+            layer = Layer(state)
+
+            for amount in data["turns"][:20]:
+                layer.turn(amount)  # illegal turns leave the layer as it was
+
+    def layer_is_sliceable():
+        for state in data["layers"]:
+            Layer(state)._is_sliceable()
+
+    def square1_slash():
+        square1 = Square1()
+
+        for _ in range(200):
+            square1.slash()
+
+    benchmarks = {
+        "layer_turn": (layer_turn, len(data["layers"]) * 20),
+        "layer_is_sliceable": (layer_is_sliceable, len(data["layers"])),
+        "square1_slash": (square1_slash, 200),
+    }
+
+    for name, engine in (("square1", Square1), ("fast_square1", FastSquare1)):
+        benchmarks.update({
+            f"{name}_apply_alg_short": (_apply_alg(engine, data["short_algs"]), len(data["short_algs"])),
+            f"{name}_apply_alg_long": (_apply_alg(engine, data["long_algs"]), len(data["long_algs"])),
+            f"{name}_apply_alg_for_case": (_apply_alg(engine, data["short_algs"], True), len(data["short_algs"])),
+            f"{name}_apply_state": (_apply_state(engine, data["states"]), len(data["states"])),
+            f"{name}_apply_alg_error": (_apply_alg(engine, BAD_ALGS), len(BAD_ALGS)),
+            f"{name}_apply_state_error": (_apply_state(engine, BAD_STATES), len(BAD_STATES)),
+        })
+
+    benchmarks["compiled_apply_long"] = (_compiled_apply(data["long_algs"]), len(data["long_algs"]))
+
+    return benchmarks
+
+
+def run(repeat: int = 7, only: list = None, min_time: float = 0.2) -> dict:
+    """
+    Runs every benchmark (or only the ones named in `only`) `repeat` times
+    (each run taking at least `min_time` seconds) and returns the
+    machine-readable results.
+
+    Notes:
+        The runs of every benchmark are interleaved, `ops_per_sec` comes
+        from the fastest run (the least disturbed by the rest of the
+        machine) and `latency_us` is per operation.
+    """
+
+    data = _datasets()
+    benchmarks = {name: benchmark for name, benchmark in _benchmarks(data).items() if not only or name in only}
+    timings = {name: [] for name in benchmarks}
+
+    with contextlib.redirect_stdout(io.StringIO()):  # the error paths print
+        loops = {name: _calibrate(function, min_time) for name, (function, _) in benchmarks.items()}
+
+        # one run of every benchmark per round, so a slow spell of the machine doesn't hit every run of one benchmark
+        for _ in range(repeat):
+            for name, (function, operations) in benchmarks.items():
+                timings[name].append(_time(function, operations, loops[name]))
+
+    results = {}
+
+    for name, (_, operations) in benchmarks.items():
+        runs = sorted(timings[name])
+        results[name] = {
+            "operations": operations,
+            "ops_per_sec": 1 / runs[0],
+            "latency_us": {"min": runs[0] * 1e6, "median": runs[len(runs) // 2] * 1e6, "max": runs[-1] * 1e6},
+        }
+
+    return {
+        "version": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": SEED,
+        "repeat": repeat,
+        "min_time": min_time,
+        "benchmarks": results,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float = 0.2) -> list:
+    """
+    Compares `results` against `baseline` (both from `run`) and returns the
+    (name, baseline ops/sec, current ops/sec, ratio) of every benchmark
+    that got more than `tolerance` (a fraction) slower.
+    """
+
+    regressions = []
+
+    for name, result in results["benchmarks"].items():
+        before = baseline["benchmarks"].get(name)
+
+        if before is not None:
+            ratio = result["ops_per_sec"] / before["ops_per_sec"]
+
+            if ratio < 1 - tolerance:
+                regressions.append((name, before["ops_per_sec"], result["ops_per_sec"], ratio))
+
+    return regressions
+
+
+def main(argv: list = None) -> int:
+    """Runs the benchmarks with the command line arguments `argv` and returns the exit status."""
+
+    parser = argparse.ArgumentParser(description="Benchmarks for the hot paths of virtual_sq1")
+    parser.add_argument("--output", help="also write the results (JSON) to this file (use it as a later --baseline)")
+    parser.add_argument("--baseline", help="results (JSON) of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="slowdown (as a fraction) that counts as a regression (default: 0.2)")
+    parser.add_argument("--repeat", type=int, default=7, help="runs of each benchmark (default: 7)")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds each run takes at least (default: 0.2)")
+    parser.add_argument("--only", nargs="+", help="names of the benchmarks to run")
+    args = parser.parse_args(argv)
+
+    results = run(args.repeat, args.only, args.min_time)
+    print(json.dumps(results, indent=2))
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+
+        for name, before, after, ratio in regressions:
+            print(f"REGRESSION {name}: {before:.0f} -> {after:.0f} ops/sec ({ratio:.0%} of baseline)", file=sys.stderr)
+
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,27 @@
-from virtual_sq1 import Square1
+from virtual_sq1 import (
+    Square1, FastSquare1, compile_alg, encode_states, decode_states, batch_apply_alg, solve, generate_tables,
+    load_tables, random_state, scramble, scrambles, parse_alg, AlgSyntaxError, Turn, SLASH, simplify_alg, canonical_key,
+    apply_symmetry, rank, unrank, N_STATES, N_REACHABLE_STATES, run_batch, stream, main, set_error_policy, error_policy,
+    Square1Error, IllegalMoveError, InvalidStateError, validate_alg, validate_state, iter_states, CaseIndex, group_algs,
+    render_svg, render_png, render_sheet, render_batch, Service, Layer, enable_instrumentation, disable_instrumentation,
+    instrumentation, stats
+)
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import os
+import socket
+import threading
+import time
+import tracemalloc
+import struct
+import zlib
+import io
+import itertools
+import json
 import pytest
+import virtual_sq1
+import random
 
 
 # im pretty sure i tested every typical case
@@ -98,3 +120,916 @@ def test_error_message_reset_from_bad_state(sq1):
     assert sq1.error_message == 'Error with "1ABCDEFG2345678".\nCheck your input isn\'t missing any or contains any extra symbols.\nSquare-1 reset to previous state.\n'
     sq1.apply_alg("//")
     assert sq1.error_message == ''
+
+
+@pytest.fixture
+def fast_sq1():
+    return FastSquare1()
+
+
+def test_fast_apply_alg(fast_sq1):
+    fast_sq1.apply_alg("13/0,9/ -1,0)/ ignore this text (3,0)/ 1/ 0,3/-1,0 / (-3,/")
+    assert fast_sq1.__str__() == "A2B3C1D4-5E6F7G8H"
+
+
+def test_fast_apply_case(fast_sq1):
+    fast_sq1.apply_alg("/ (-9,0) / (1,0) / (0,9) / (-1,0) / (-3,0) / (1,0) / (0,3) / (-1,0)", True)
+    assert fast_sq1.__str__() == "A2B3C1D4-5E6F7G8H"
+
+
+def test_fast_apply_state_with_slash(fast_sq1):
+    fast_sq1.apply_state("ABCDEF GH12345678 /")
+    assert fast_sq1.__str__() == "ABCDEF/GH12345678"
+
+
+def test_fast_apply_algs_from_different_initial_states(fast_sq1):
+    fast_sq1.apply_state("CG216F5B/EHD4A837")
+    fast_sq1.apply_alg("(3,-1)/ (-2,1)/ (2,-4)/ (-2,-5)/ (0,-3)/ (3,-1)/ (0,-3)/ (3,0)/ (4,-4)/ (6,-2)", True)
+    assert fast_sq1.__str__() == "A1B2C3D4-5E6F7G8H"
+
+
+def test_fast_apply_illegal_alg_impossible_bottom_turn(fast_sq1):
+    fast_sq1.apply_alg("0,2/3/0,2")
+    assert fast_sq1.error_message == 'Error at "0,2" (move #3).\nSquare-1 reset to previous state.\n'
+    assert fast_sq1.__str__() == "A1B2C3D4-5E6F7G8H"
+
+
+def test_fast_apply_illegal_case(fast_sq1):
+    fast_sq1.apply_alg("/ (3,0) / (1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) /", True)
+    assert fast_sq1.error_message == (
+        'Error at "1,0" (move #7).\nCheck that your input starts and ends in fully-aligned cubeshape.\n'
+        "Square-1 reset to previous state.\n"
+    )
+
+
+def test_fast_apply_illegal_state_missing_pieces(fast_sq1):
+    fast_sq1.apply_state("ABCDEF1234567")
+    assert fast_sq1.error_message == (
+        'Error with "ABCDEF1234567".\nCheck your input isn\'t missing any or contains any extra symbols.\n'
+        "Square-1 reset to previous state.\n"
+    )
+
+
+def test_fast_apply_state_matches_square1_when_flipped(sq1, fast_sq1):
+    for square1 in (sq1, fast_sq1):
+        square1.apply_alg("(1,0) / (3,0) / (-1,-4)")  # not solved, equator flipped
+
+    for state in ("CG216F5B/EHD4A837", "CG216F5B-EHD4A837", "CG216F5BEHD4A837", "ABCDEF1234567/", "CG216F5B/EHD4A837"):
+        sq1.apply_state(state)
+        fast_sq1.apply_state(state)
+        assert fast_sq1.__str__() == sq1.__str__()
+        assert fast_sq1.error_message == sq1.error_message
+
+
+def test_fast_matches_square1_on_random_algs(sq1, fast_sq1):
+    rng = random.Random(2024)
+
+    for _ in range(200):
+        alg = " / ".join(f"({rng.randint(-7, 7)},{rng.randint(-7, 7)})" for _ in range(rng.randint(1, 6)))
+        for_case = rng.random() < 0.3
+        sq1.apply_alg(alg, for_case)
+        fast_sq1.apply_alg(alg, for_case)
+        assert fast_sq1.__str__() == sq1.__str__()
+        assert fast_sq1.error_message == sq1.error_message
+
+
+def test_parse_alg():
+    assert parse_alg("13/0,9/ -1,0)/ ignore this text (3,0)/") == (
+        Turn(13, 0), SLASH, Turn(0, 9), SLASH, Turn(-1, 0), SLASH, Turn(3, 0), SLASH
+    )
+    assert parse_alg("/ (1,0) /", True) == (SLASH, Turn(-1, 0), SLASH)
+
+
+def test_parse_alg_error_position():
+    with pytest.raises(AlgSyntaxError) as error:
+        parse_alg("/ (3,0) / (3--3) /")
+    assert (error.value.symbol, error.value.move, error.value.position, error.value.text) == ("-", 3, 12, "3--3")
+
+    with pytest.raises(AlgSyntaxError) as error:
+        parse_alg("(1,0) / (3,4,5,6)")
+    assert (error.value.symbol, error.value.move, error.value.position) == (",", 2, 12)
+
+
+def test_compile_alg_normalizes_alg():
+    assert compile_alg("13/0,9/ -1,0)/ (3,0)/").alg == "(1,0) / (0,-3) / (-1,0) / (3,0) /"
+    assert compile_alg("/ (3,0) / (-3,-3) / (0,3) /") is compile_alg("/3/-3,-3/0,3/")
+
+
+def test_compile_alg_applies_to_both_engines(sq1, fast_sq1):
+    compiled = compile_alg("/ (3,0) / (1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) / (-1,0)", True)
+    assert compiled.apply_to(sq1)
+    assert compiled.apply_to(fast_sq1)
+    assert sq1.__str__() == fast_sq1.__str__() == "A2B3C1D4-5E6F7G8H"
+
+
+def test_compile_alg_effect(fast_sq1):
+    compiled = compile_alg("/")
+    end_shape, permutation, equator_flip = compiled.effect()
+    assert equator_flip
+    assert sorted(permutation) == list(range(16))
+    assert compiled.effect(end_shape) is not None
+    assert not compile_alg("2").is_legal_from(fast_sq1.shape)
+    assert not compile_alg("2").apply_to(fast_sq1)
+    assert fast_sq1.__str__() == "A1B2C3D4-5E6F7G8H"
+
+
+def test_compile_alg_syntax_error():
+    with pytest.raises(AlgSyntaxError):
+        compile_alg("--3/")
+
+
+def test_simplify_alg():
+    assert simplify_alg("(1,0) / / (2,0) / (13,0) / (0,0) / (-1,0)") == "(3,0) /"
+    assert simplify_alg("/ /") == ""
+    assert simplify_alg("(0,0) / (-7,6) /") == "/ (5,6) /"
+
+
+def test_simplify_alg_with_shape(fast_sq1):
+    removed = 0
+
+    for seed in range(5):
+        scrambled, alg = scramble(seed)
+        simplified = simplify_alg(alg, fast_sq1)
+        removed += alg.count("/") - simplified.count("/")
+        fast_sq1.apply_state("A1B2C3D4-5E6F7G8H")
+        fast_sq1.apply_alg(simplified)
+        assert fast_sq1.__str__() == scrambled.__str__()
+
+    assert removed > 0
+
+
+def test_encode_and_decode_states():
+    pytest.importorskip("numpy")
+    units, equator = encode_states(["A1B2C3D4-5E6F7G8H", "ABCDEF/GH12345678"])
+    assert units.shape == (2, 24)
+    assert bytes(units[0]).decode() == "AA1BB2CC3DD45EE6FF7GG8HH"
+    assert list(equator) == [False, True]
+    assert decode_states(units, equator) == ["A1B2C3D4-5E6F7G8H", "ABCDEF/GH12345678"]
+
+
+def test_batch_apply_alg():
+    pytest.importorskip("numpy")
+    units, equator = encode_states(["A1B2C3D4-5E6F7G8H", "A2B3C1D4-5E6F7G8H", "ABCDEF/GH12345678"])
+    alg = "/ (3,0) / (1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) / (-1,0)"
+    new_units, new_equator, legal = batch_apply_alg(units, equator, alg, True)
+    assert list(legal) == [True, True, False]
+    assert decode_states(new_units, new_equator) == ["A2B3C1D4-5E6F7G8H", "A3B1C2D4-5E6F7G8H", "ABCDEF/GH12345678"]
+
+
+def test_batch_apply_alg_per_row_matches_fast_square1():
+    pytest.importorskip("numpy")
+    rng = random.Random(3)
+    states = []
+    algs = []
+
+    for _ in range(100):
+        square1 = FastSquare1()
+        compile_alg("/ (3,0) / (-3,-3) / (0,3) /").apply_to(square1)
+        square1.turn(rng.choice([-3, 0, 3, 6]), rng.choice([-3, 0, 3, 6]))
+        states.append(square1.__str__())
+        algs.append(" / ".join(f"({rng.randint(-6, 6)},{rng.randint(-6, 6)})" for _ in range(rng.randint(1, 4))))
+
+    units, equator = encode_states(states)
+    new_units, new_equator, legal = batch_apply_alg(units, equator, algs)
+
+    for state, alg, new_state, row_legal in zip(states, algs, decode_states(new_units, new_equator), legal):
+        square1 = FastSquare1()
+        square1.apply_state(state)
+        assert compile_alg(alg).apply_to(square1) == row_legal
+        assert square1.__str__() == new_state
+
+
+def test_solve_solved(sq1):
+    assert solve(sq1) == ""
+
+
+def test_solve_finds_shortest_alg(sq1):
+    sq1.apply_alg("/ (3,0) / (-3,-3) / (0,3) /", True)
+    solution = solve(sq1)
+    assert solution.count("/") == 4
+    sq1.apply_alg(solution)
+    assert sq1.__str__() == "A1B2C3D4-5E6F7G8H"
+
+
+def test_solve_face_metric(fast_sq1):
+    fast_sq1.apply_alg("(1,0) / (-1,2) / (3,0)")
+    solution = solve(fast_sq1, "face")
+    assert solution.count("/") == 2 and solution.count("(") == 3
+    fast_sq1.apply_alg(solution)
+    assert fast_sq1.__str__() == "A1B2C3D4-5E6F7G8H"
+
+
+def test_solve_random_states():
+    for seed in (0, 3, 5):
+        square1 = random_state(seed)
+        solution = solve(square1, time_limit=60)
+        assert solution.count("/") == 10
+        square1.apply_alg(solution)
+        assert square1.__str__() == "A1B2C3D4-5E6F7G8H"
+
+
+def test_solve_within_budget(sq1):
+    sq1.apply_alg("/ (3,0) / (1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) / (-1,0)", True)
+    solution = solve(sq1, max_depth=2)  # too short for a shortest solution, so it's the quick one
+    assert solution.count("/") > 2
+    assert sq1.__str__() == "A2B3C1D4-5E6F7G8H"
+    sq1.apply_alg(solution)
+    assert sq1.__str__() == "A1B2C3D4-5E6F7G8H"
+
+
+def test_solve_out_of_time(fast_sq1):
+    fast_sq1.apply_state("1A2B3C4D/5E6F7G8H")  # takes minutes to solve optimally
+    solve(FastSquare1())  # builds the tables outside the time limit
+    start = time.perf_counter()
+    solution = solve(fast_sq1, time_limit=1)
+    assert time.perf_counter() - start < 10
+    fast_sq1.apply_alg(solution)
+    assert fast_sq1.__str__() == "A1B2C3D4-5E6F7G8H"
+
+
+def test_solve_unreachable_shape(sq1):
+    sq1.apply_state("AB1C2D34-5E6F7G8H")
+
+    with pytest.raises(ValueError):
+        solve(sq1)
+
+
+def test_solve_unknown_metric(sq1):
+    with pytest.raises(ValueError):
+        solve(sq1, "slice")
+
+
+def test_generate_and_load_tables(tmp_path, sq1):
+    path = str(tmp_path / "sq1.tables")
+    generate_tables(path)
+    load_tables(path)
+    sq1.apply_alg("/ (3,0) / (-3,-3) / (0,3) /")
+    assert solve(sq1) == "/ (0,-3) / (3,3) / (-3,0) /"
+
+
+def test_load_tables_is_bounded(tmp_path):
+    path = str(tmp_path / "sq1.tables")
+    generate_tables(path)
+    tracemalloc.start()
+    start = time.perf_counter()
+
+    try:
+        load_tables(path)
+        elapsed = time.perf_counter() - start
+        memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    assert elapsed < 1
+    assert memory < 10_000_000
+
+
+def test_load_tables_wrong_version(tmp_path):
+    path = tmp_path / "sq1.tables"
+    path.write_bytes(b"VSQ1TBLS" + bytes(24))
+
+    with pytest.raises(ValueError):
+        load_tables(str(path))
+
+
+def test_random_state_is_seeded():
+    assert str(random_state(5)) == str(random_state(5)) == str(scramble(5)[0])
+    assert len({str(random_state(seed)) for seed in range(20)}) == 20
+
+
+def test_scramble_alg_reaches_state():
+    for seed in range(20):
+        scrambled, alg = scramble(seed)
+        sq1 = Square1()
+        sq1.apply_alg(alg)
+        assert str(sq1) == str(scrambled)
+
+
+def test_scrambles():
+    generated = list(scrambles(50, seed=1))
+    assert len(generated) == 50
+    assert [alg for _, alg in generated] == [alg for _, alg in scrambles(50, seed=1)]
+
+
+def test_scramble_length():
+    lengths = [alg.count("/") for _, alg in scrambles(500, seed=2)]
+    assert sum(lengths) / len(lengths) < 80
+
+
+def test_scramble_optimal():
+    for seed in (3, 5):
+        scrambled, alg = scramble(seed, optimal=True)
+        assert str(scrambled) == str(random_state(seed))
+        assert alg.count("/") == 10
+        sq1 = Square1()
+        sq1.apply_alg(alg)
+        assert str(sq1) == str(scrambled)
+
+
+def test_canonical_key_layer_rotations(sq1):
+    key = canonical_key(sq1)[0]
+
+    for alg in ("(1,0)", "(0,-1)", "(3,3)", "(6,-5)"):
+        rotated = Square1()
+        rotated.apply_alg(alg)
+        assert canonical_key(rotated)[0] == key
+
+    sq1.apply_alg("/")
+    assert canonical_key(sq1)[0] != key
+
+
+def test_canonical_key_mirror_colours_and_equator():
+    alg = "/ (3,0) / (1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) / (-1,0)"
+    mirror_alg = "(-2,-4) / (-3,0) / (-1,0) / (0,3) / (1,0) / (3,0) / (-1,0) / (0,-3) / (1,0)"
+    upside_down_alg = "(1,-1) / (0,3) / (0,1) / (-3,0) / (0,-1) / (0,-3) / (0,1) / (3,0) / (0,-1)"
+    keys = {}
+
+    for name, case in (("alg", alg), ("mirror", mirror_alg), ("upside down", upside_down_alg)):
+        sq1 = FastSquare1()
+        sq1.apply_alg(case)
+        keys[name] = (canonical_key(sq1, mirror=False)[0], canonical_key(sq1)[0], canonical_key(sq1, colours=True)[0])
+
+    assert keys["alg"][0] != keys["mirror"][0] and keys["alg"][1] == keys["mirror"][1]
+    assert keys["alg"][1] != keys["upside down"][1] and keys["alg"][2] == keys["upside down"][2]
+
+    flipped = FastSquare1()
+    flipped.apply_state("A1B2C3D4/5E6F7G8H")
+    assert canonical_key(flipped)[0] != canonical_key(FastSquare1())[0]
+    assert canonical_key(flipped, equator=True)[0] == canonical_key(FastSquare1(), equator=True)[0]
+
+
+def test_apply_symmetry_round_trip():
+    for seed in range(20):
+        scrambled = random_state(seed)
+        key, symmetry = canonical_key(scrambled, colours=True)
+        sq1 = FastSquare1()
+        sq1.apply_state(scrambled.__str__())
+        apply_symmetry(sq1, symmetry)
+        assert canonical_key(sq1, colours=True) == (key, (False, False, 0, 0, False))
+        apply_symmetry(sq1, symmetry, inverse=True)
+        assert sq1.__str__() == scrambled.__str__()
+
+
+def test_rank_and_unrank(sq1):
+    assert unrank(rank(sq1)).__str__() == sq1.__str__()
+
+    for seed in range(50):
+        scrambled = random_state(seed)
+        index = rank(scrambled)
+        assert 0 <= index < N_REACHABLE_STATES
+        assert unrank(index).__str__() == scrambled.__str__()
+
+
+def test_rank_is_dense():
+    for index in (0, 1, N_REACHABLE_STATES - 1, N_REACHABLE_STATES, N_STATES - 1):
+        assert rank(unrank(index)) == index
+
+    with pytest.raises(ValueError):
+        unrank(N_STATES)
+
+
+def test_rank_shape_counts():
+    shapes, _ = virtual_sq1._rank_shapes()
+    assert N_STATES == len(shapes) * 40320 * 40320 * 2
+    assert N_REACHABLE_STATES == len(virtual_sq1._precompute_shape_moves()) * 40320 * 40320 * 2
+
+
+def test_rank_unsliceable_state(sq1):
+    sq1.apply_state("AB1C2D34-5E6F7G8H")
+    assert rank(sq1) >= N_REACHABLE_STATES
+    assert unrank(rank(sq1)).__str__() == sq1.__str__()
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_run_batch_keeps_order_and_errors(workers):
+    items = ["/ (3,0) / (-3,-3) / (0,3) /", "2/", "(1,0) / (-1,0)", "--3/"] * 5
+    results = list(run_batch(items, workers=workers, chunk_size=3))
+
+    assert [result.input for result in results] == items
+    assert results[0].state == "A1C3B2D4-5E7G6F8H" and results[0].error is None
+    assert results[1].state is None and results[1].error == 'Error at "2" (move #1).\nSquare-1 reset to previous state.\n'
+    assert results[4:8] == results[:4]
+
+
+def test_run_batch_modes(capsys):
+    cases = list(run_batch(["/ (3,0) / (-3,-3) / (0,3) /"], mode="case", start="A1C3B2D4-5E7G6F8H", workers=1))
+    assert cases[0].state == "A1B2C3D4-5E6F7G8H"
+
+    solved = list(run_batch(["A1C3B2D4-5E7G6F8H", "ABC", "AB1C2D34-5E6F7G8H"], mode="solve", workers=1))
+    assert solved[0].solution == "/ (0,-3) / (3,3) / (-3,0) /"
+    assert solved[1].solution is None and solved[1].error.startswith('Error with "ABC"')
+    assert solved[2].solution is None and "can't be solved" in solved[2].error
+    assert capsys.readouterr().out == ""
+
+    with pytest.raises(ValueError):
+        list(run_batch([], mode="simulate"))
+
+
+def test_run_batch_rejects_invalid_start():
+    with pytest.raises(ValueError):
+        run_batch(["/"], start="ZZZ", workers=2)
+
+
+def test_run_batch_is_lazy():
+    endless = itertools.cycle(["/ (3,0) / (-3,-3) / (0,3) /", "2/"])
+    results = list(itertools.islice(run_batch(endless, workers=2, chunk_size=4), 10))
+
+    assert [result.error is None for result in results] == [True, False] * 5
+
+
+def test_stream_json_records():
+    lines = [
+        '{"alg": "/ (3,0) / (-3,-3) / (0,3) /", "id": 7}',
+        '{"state": "A1C3B2D4-5E7G6F8H", "alg": "/ (3,0) / (-3,-3) / (0,3) /", "for_case": true}',
+        '{"alg": "/ (3,0) / (3--3) /"}',
+        '{"alg": "2/"}',
+        '{"state": "ABC"}',
+        '{not json',
+    ]
+    outputs = [json.loads(line) for line in stream(lines)]
+
+    assert outputs[0] == {"state": "A1C3B2D4-5E7G6F8H", "id": 7}
+    assert outputs[1] == {"state": "A1B2C3D4-5E6F7G8H"}
+    assert outputs[2]["error"]["kind"] == "syntax" and outputs[2]["error"]["position"] == 12
+    assert outputs[3]["error"] == {
+        "kind": "logic", "message": 'Error at "2" (move #1).\nSquare-1 reset to previous state.\n', "move": 1
+    }
+    assert outputs[4]["error"]["kind"] == "state"
+    assert outputs[5]["error"]["kind"] == "input"
+
+
+def test_stream_plain_lines(monkeypatch, capsys):
+    assert list(stream(["/ (3,0) / (-3,-3) / (0,3) /", "2/"])) == [
+        "A1C3B2D4-5E7G6F8H", 'ERROR Error at "2" (move #1). Square-1 reset to previous state.'
+    ]
+    assert list(stream(["/ (3,0) / (-3,-3) / (0,3) /"], "case")) == ["A1C3B2D4-5E7G6F8H"]
+
+    monkeypatch.setattr("sys.stdin", io.StringIO("A1C3B2D4-5E7G6F8H\n"))
+    main(["stream", "--mode", "state"])
+    assert capsys.readouterr().out == "A1C3B2D4-5E7G6F8H\n"
+
+
+def test_benchmarks_run_and_compare():
+    from BENCH_virtual_sq1 import run, compare
+
+    results = run(repeat=1, only=["layer_turn", "fast_square1_apply_alg_error"])
+    assert set(results["benchmarks"]) == {"layer_turn", "fast_square1_apply_alg_error"}
+    assert compare(results, results) == []
+
+    slower = {"benchmarks": {"layer_turn": {"ops_per_sec": results["benchmarks"]["layer_turn"]["ops_per_sec"] * 2}}}
+    assert [name for name, *_ in compare(results, slower)] == ["layer_turn"]
+
+
+@pytest.mark.parametrize("engine", [Square1, FastSquare1])
+def test_error_policy_raise(engine):
+    square1 = engine()
+
+    with error_policy("raise"):
+        with pytest.raises(IllegalMoveError) as error:
+            square1.apply_alg("(1,0) / (0,1) /")
+
+        assert (error.value.move, error.value.position, error.value.text, error.value.reason) \
+            == (2, 8, "0,1", "incomplete turn")
+        assert square1.__str__() == "A1B2C3D4-5E6F7G8H"
+        assert square1.error_message == 'Error at "0,1" (move #2).\nSquare-1 reset to previous state.\n'
+
+        with pytest.raises(Square1Error) as error:
+            square1.apply_alg("(1,0) / --3")
+
+        assert isinstance(error.value, AlgSyntaxError) and error.value.position == 9
+
+        with pytest.raises(InvalidStateError) as error:
+            square1.apply_state("1ABCDEFG2345678-H")
+
+        assert error.value.reason == "impossible layer state"
+
+
+def test_error_policy_quiet_and_log(sq1, capsys, caplog):
+    with error_policy("quiet"):
+        error = sq1.apply_alg("2/")
+        assert sq1.apply_alg("/ (3,0) / (-3,-3) / (0,3) /") is None
+
+    assert isinstance(error, IllegalMoveError) and error.move == 1
+    assert capsys.readouterr().out == ""
+
+    with caplog.at_level(logging.WARNING, logger="virtual_sq1"), error_policy("log"):
+        FastSquare1().apply_state("ABC")
+
+    assert capsys.readouterr().out == ""
+    assert caplog.messages == ['Invalid state "ABC": missing pieces.']
+
+    with pytest.raises(ValueError):
+        set_error_policy("ignore")
+
+
+def test_error_policy_is_per_thread(sq1, capsys):
+    entered, done = threading.Event(), threading.Event()
+
+    def quiet_worker():
+        with error_policy("quiet"):
+            entered.set()
+            done.wait()
+            Square1().apply_alg("2/")
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        futures = [pool.submit(quiet_worker) for _ in range(2)]
+        entered.wait()
+        sq1.apply_alg("2/")  # this thread still prints
+        done.set()
+
+        for future in futures:
+            future.result()
+
+    assert capsys.readouterr().out.count("Error at") == 1
+    assert set_error_policy("print") == "print"
+
+
+def test_validate_alg_and_state(fast_sq1, capsys):
+    assert validate_alg("/ (3,0) / (-3,-3) / (0,3) /") is None
+    assert validate_alg("(1,0) / (0,1) /").move == 2
+    assert validate_alg("0,0,1/").position == 3
+
+    fast_sq1.apply_state("A1C3B2D4-5E7G6F8H")
+    assert validate_alg("/ (3,0) / (-3,-3) / (0,3) /", True, fast_sq1) is None
+    assert fast_sq1.__str__() == "A1C3B2D4-5E7G6F8H"
+
+    assert validate_state("ABCDEF GH12345678 /") is None
+    assert validate_state("ABCDEFGHI123456789").reason == "extra/nonexistent pieces"
+    assert capsys.readouterr().out == ""
+
+
+def test_snapshot_and_restore(sq1):
+    top = sq1.top
+    snapshot = sq1.snapshot()
+    sq1.apply_alg("/ (3,0) / (-3,-3) / (0,3) /")
+    sq1.slash()
+
+    sq1.restore(snapshot)
+    assert sq1.__str__() == "A1B2C3D4-5E6F7G8H" and sq1.top is top
+    assert sq1.undo() and sq1.__str__() == "A1C3B2D4-5E7G6F8H"  # restoring isn't a move
+
+    with pytest.raises(AttributeError):
+        sq1.colour = "white"
+
+
+@pytest.mark.parametrize("engine", [Square1, FastSquare1])
+def test_undo_and_redo(engine):
+    square1 = engine()
+    assert not square1.undo() and not square1.redo()
+
+    with error_policy("quiet"):
+        square1.apply_alg("/ (3,0) / (-3,-3) / (0,3) /")
+        square1.slash()
+        square1.apply_alg("2/")  # failed moves aren't recorded
+        square1.apply_state("ABCDEF GH12345678 /")
+
+    assert square1.undo() and square1.__str__() == "A1C35E7G/B2D46F8H"
+    assert square1.undo() and square1.__str__() == "A1C3B2D4-5E7G6F8H"
+    assert square1.redo() and square1.__str__() == "A1C35E7G/B2D46F8H"
+
+    square1.apply_alg("(0,0)")
+    assert not square1.redo()
+    assert square1.undo() and square1.undo() and square1.undo() and not square1.undo()
+    assert square1.__str__() == "A1B2C3D4-5E6F7G8H"
+
+
+@pytest.mark.parametrize("engine", [Square1, FastSquare1])
+def test_transaction(engine):
+    square1 = engine()
+
+    with pytest.raises(IllegalMoveError), error_policy("raise"), square1.transaction():
+        square1.apply_alg("/ (3,0) / (-3,-3) / (0,3) /")
+        square1.apply_alg("2/")
+
+    assert square1.__str__() == "A1B2C3D4-5E6F7G8H" and not square1.undo()
+
+    with square1.transaction():
+        square1.apply_alg("/ (3,0) / (-3,-3) / (0,3) /")
+        square1.apply_alg("/ (3,0) / (-3,-3) / (0,3) /")
+
+    assert square1.__str__() == "A1B2C3D4-5E6F7G8H" and not square1.undo()
+
+    with square1.transaction():
+        square1.slash()
+        square1.slash()
+        square1.apply_alg("/ (3,0) / (-3,-3) / (0,3) /")
+
+    assert square1.undo() and square1.__str__() == "A1B2C3D4-5E6F7G8H" and not square1.undo()
+
+
+def test_iter_states(sq1):
+    states = list(iter_states("/ (3,0) / (-3,-3) / (0,3) /"))
+    assert len(states) == len(parse_alg("/ (3,0) / (-3,-3) / (0,3) /"))
+    assert states[:2] == ["A1B25E6F/C3D47G8H", "6FA1B25E/C3D47G8H"] and states[-1] == "A1C3B2D4-5E7G6F8H"
+
+    sq1.apply_state("A1C3B2D4-5E7G6F8H")
+    assert list(iter_states("/ (3,0) / (-3,-3) / (0,3) /", True, sq1))[-1] == "A1B2C3D4-5E6F7G8H"
+    assert sq1.__str__() == "A1C3B2D4-5E7G6F8H"
+
+    square1, alg = scramble(1)
+    assert list(iter_states(alg, compact=True))[-1] == rank(square1)
+
+
+def test_iter_states_stops_at_illegal_move():
+    states = iter_states("(1,0) / (0,1) /")
+    assert next(states) == "4A1B2C3D-5E6F7G8H"
+    assert next(states) == "4A1B5E6F/2C3D7G8H"
+
+    with pytest.raises(IllegalMoveError) as error:
+        next(states)
+
+    assert error.value.move == 2
+
+    with pytest.raises(AlgSyntaxError):
+        next(iter_states("/ (3,0) / (3--3) /"))
+
+
+def test_case_index_recognizes_rotated_cases(fast_sq1):
+    algs = {"U": "/ (3,0) / (-3,-3) / (0,3) /", "T": "(1,0) / (2,-1) / (0,1)"}
+    index = CaseIndex(algs)
+    assert not index.add("/ (3,0) / (-3,-3) / (0,3) / (3,0)")  # the same cases as "U", up to the last turn
+
+    fast_sq1.turn(0, 3)
+    fast_sq1.apply_alg(algs["T"], True)
+    fast_sq1.turn(-3, 6)
+    match = index.recognize(fast_sq1)
+    assert match.name == "T" and match.alg == algs["T"]
+
+    fast_sq1.turn(*match.pre)
+    fast_sq1.apply_alg(match.alg)
+    fast_sq1.turn(*match.post)
+    assert fast_sq1.__str__() == "A1B2C3D4-5E6F7G8H"
+
+    assert index.recognize(Square1()) is None
+    assert CaseIndex(algs, post=False).recognize(Square1()) is None
+
+
+def test_case_index_shape(sq1):
+    index = CaseIndex(["/ (3,3) /"], match="shape", post=False)
+    assert len(index) == 1
+
+    sq1.apply_alg("/ (3,0) / (-3,-3) / (0,3) /")
+    sq1.apply_alg("/ (3,3) /", True)
+    sq1.top.turn(1)
+    match = index.recognize(sq1)
+
+    sq1.top.turn(match.pre.top)
+    sq1.bottom.turn(match.pre.bottom)
+    sq1.apply_alg(match.alg)
+    assert sq1.error_message == ""
+
+    for layer in (sq1.top, sq1.bottom):  # back in cubeshape
+        assert [piece.isdigit() for piece in layer.current_state] in ([False, True] * 4, [True, False] * 4)
+
+    with pytest.raises(IllegalMoveError):
+        index.add("(1,0) / (3,0) /")
+
+    with pytest.raises(ValueError):
+        CaseIndex(match="pieces")
+
+
+def test_compiled_alg_algebra(fast_sq1):
+    u = compile_alg("/ (3,0) / (-3,-3) / (0,3) /")
+    t = compile_alg("(1,0) / (2,-1) / (0,1)")
+
+    assert (t * t).alg == (t ** 2).alg == "(1,0) / (2,-1) / (1,1) / (2,-1) / (0,1)"
+    assert t.inverse().alg == (t ** -1).alg == "(0,-1) / (-2,1) / (-1,0)"
+    assert (t * t.inverse()).alg == (t ** 0).alg == ""
+
+    fast_sq1.apply_alg("/ (3,0) / (-3,-3) / (0,3) /")
+    fast_sq1.apply_alg((u * t).alg)
+    (t.inverse() * u.inverse()).apply_to(fast_sq1)
+    assert fast_sq1.__str__() == "A1C3B2D4-5E7G6F8H"
+
+
+def test_compiled_alg_order_and_cycles(sq1):
+    u = compile_alg("/ (3,0) / (-3,-3) / (0,3) /")
+    assert u.order() == 2
+    assert u.cycles() == [("B", "C"), ("2", "3"), ("6", "7"), ("F", "G")]
+
+    t = compile_alg("(1,0) / (2,-1) / (0,1)")
+    order = t.order()
+
+    for _ in range(order - 1):
+        sq1.apply_alg(t.alg)
+        assert sq1.__str__() != "A1B2C3D4-5E6F7G8H"
+
+    sq1.apply_alg(t.alg)
+    assert sq1.__str__() == "A1B2C3D4-5E6F7G8H"
+
+    assert compile_alg("(1,0)").order() is None
+    assert compile_alg("/").order() == 2
+
+    with pytest.raises(ValueError):
+        compile_alg("/").cycles()
+
+
+def test_group_algs():
+    algs = ["/ (3,0) / (-3,-3) / (0,3) /", "(0,0) / (3,0) / (-3,-3) / (0,3) / (0,0)", "/ (3,0) / (-3,-3) / (0,3) / (3,0)",
+            "--3/", "(1,0) / (0,1)", "", "/ /", "(12,0)", "--3/"]
+
+    groups, illegal = group_algs(algs)
+    assert [(group.representative, len(group.algs)) for group in groups] == [(algs[0], 2), (algs[2], 1), ("", 3)]
+    assert [alg for alg, _ in illegal] == ["--3/", "(1,0) / (0,1)", "--3/"]
+    assert isinstance(illegal[0][1], AlgSyntaxError)
+    assert isinstance(illegal[1][1], IllegalMoveError)
+
+    groups, _ = group_algs(algs, rotations=True)
+    assert [group.algs for group in groups] == [algs[:3], ["", "/ /", "(12,0)"]]
+
+    algs = ["(0,3) / (0,3) / (6,6)", "(6,-3) / (3,0) / (0,0)"]
+    assert [group.representative for group in group_algs(algs)[0]] == [algs[0]]
+    assert [group.representative for group in group_algs(algs, metric="face")[0]] == [algs[1]]
+
+    with pytest.raises(ValueError):
+        group_algs(algs, metric="slice")
+
+
+def _png_pixels(png):
+    assert png[:8] == b"\x89PNG\r\n\x1a\n"
+
+    width, height = struct.unpack(">II", png[16:24])
+    chunks = {}
+    i = 8
+
+    while i < len(png):
+        length, kind = struct.unpack(">I4s", png[i:i + 8])
+        chunks[kind] = png[i + 8:i + 8 + length]
+        i += 12 + length
+
+    rows = zlib.decompress(chunks[b"IDAT"])
+    palette = chunks[b"PLTE"]
+
+    return width, height, lambda x, y: palette[3 * rows[y * (width + 1) + 1 + x]:3 * rows[y * (width + 1) + 1 + x] + 3].hex()
+
+
+def test_render_svg_and_png(sq1, fast_sq1):
+    svg = render_svg(sq1)
+    assert svg.startswith('<svg xmlns="http://www.w3.org/2000/svg" width="200" height="114"')
+    assert svg.count("<polygon") == 2 * (4 * 3 + 4 * 2 + 1)
+    assert svg.count('fill="#ffffff"') == svg.count('fill="#ffd500"') == 8
+
+    fast_sq1.apply_alg("/ (3,0) / (1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) / (-1,0)")
+    assert render_svg(fast_sq1) == render_svg(fast_sq1.__str__()) != svg
+    assert 'fill="#123456"' in render_svg(sq1, colours={"U": "#123456"})
+
+    width, height, pixel = _png_pixels(render_png("A1B2C3D4/5E6F7G8H", colours={"U": "#123"}))
+    assert (width, height) == (200, 114)
+    assert pixel(0, 0) == "000000"  # transparent
+    assert pixel(60, 30) == "112233"
+    assert pixel(140, 30) == "ffd500"
+    assert pixel(50, 106) == "009b48"
+    assert pixel(150, 106) == "0046ad"
+
+    with pytest.raises(InvalidStateError):
+        render_svg("A1B2C3D4")
+
+    with pytest.raises(ValueError):
+        render_png(sq1, colours={"U": "white"})
+
+    with pytest.raises(ValueError):
+        render_svg(sq1, colours={"X": "#ffffff"})
+
+
+def test_render_sheet_and_batch(tmp_path):
+    states = ["A1B2C3D4-5E6F7G8H", "A1C3B2D4-5E7G6F8H", "A1B2C3D4/5E6F7G8H"]
+
+    svg = render_sheet(states, columns=2, size=100)
+    assert svg.count("<g transform=") == 3
+    assert 'width="200" height="114" viewBox="0 0 14 8"' in svg
+
+    width, height, pixel = _png_pixels(render_sheet(states, columns=2, format="png", size=100))
+    assert (width, height) == (200, 114)
+    assert pixel(75, 110) == "0046ad"
+    assert pixel(175, 110) == "000000"
+
+    paths = render_batch(states, str(tmp_path / "diagrams"), "png", names=["a", "b", "c"])
+    assert sorted(os.listdir(tmp_path / "diagrams")) == ["a.png", "b.png", "c.png"]
+
+    with open(paths[2], "rb") as file:
+        assert file.read() == render_png(states[2])
+
+    assert render_batch(states[:1], str(tmp_path))[0].endswith("00000.svg")
+
+    with pytest.raises(ValueError):
+        render_sheet(states, format="gif")
+
+
+async def _ask(connection, lines):
+    reader, writer = await connection
+    writer.write("".join(line + "\n" for line in lines).encode())
+    responses = [json.loads(await reader.readline()) for _ in lines]
+    writer.close()
+
+    return responses
+
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_service(executor, capsys):
+    algs = ["/ (3,0) / (-3,-3) / (0,3) /", "(1,0) / (0,1)", "--3/"]
+
+    async def run():
+        service = Service(workers=2, executor=executor, max_batch=4)
+        host, port = (await service.start())[:2]
+
+        requests = [[json.dumps({"id": [client, i], "alg": alg}) for i, alg in enumerate(algs * 3)] for client in range(5)]
+        answers = await asyncio.gather(*(_ask(asyncio.open_connection(host, port), lines) for lines in requests))
+        await service.close()
+
+        return requests, answers
+
+    requests, answers = asyncio.run(run())
+
+    for lines, responses in zip(requests, answers):
+        assert responses == [json.loads(line) for line in stream(lines)]
+        assert responses[0]["state"] == "A1C3B2D4-5E7G6F8H"
+        assert responses[1]["error"]["kind"] == "logic"
+
+    # the workers' "quiet" policy never leaks out of them
+    assert set_error_policy("print") == "print"
+    assert capsys.readouterr().out == ""
+
+
+def test_service_errors_and_timeout(monkeypatch, tmp_path):
+    def slow_chunk(lines):
+        time.sleep(0.3)
+        return list(stream(lines))
+
+    monkeypatch.setattr(virtual_sq1, "_serve_chunk", slow_chunk)
+
+    async def run():
+        service = Service(workers=1, executor="thread", timeout=0.1)
+        path = str(tmp_path / "sq1.sock")
+        connection = asyncio.open_unix_connection(path) if hasattr(socket, "AF_UNIX") else None
+
+        if connection is not None:
+            await service.start(path=path)
+        else:
+            host, port = (await service.start())[:2]
+            connection = asyncio.open_connection(host, port)
+
+        responses = await _ask(connection, ['{"id": 7, "alg": "/"}', "/ (3,0) /", '{"alg": 1}'])
+        await service.close()
+
+        return responses
+
+    responses = asyncio.run(run())
+    assert responses[0] == {"error": {"kind": "timeout", "message": "No response within 0.1 seconds."}, "id": 7}
+    assert responses[1]["error"]["kind"] == "input"
+    assert responses[2]["error"]["kind"] == "timeout"
+
+    with pytest.raises(ValueError):
+        Service(executor="fibers")
+
+
+def test_instrumentation(sq1, fast_sq1):
+    turn, apply_alg = Layer.turn, Square1.apply_alg
+    stats(reset=True)
+    calls = []
+
+    with instrumentation(lambda name, seconds: calls.append(name)):
+        sq1.apply_alg("/ (3,0) / (-3,-3) / (0,3) /")
+        sq1.apply_alg("(1,0) / (0,1)")
+        sq1.apply_alg("--3/")
+        sq1.apply_state("ABC")
+        fast_sq1.apply_alg("(1,0) / (-1,0)")
+        virtual_sq1.parse_alg("/")
+
+        with error_policy("raise"), pytest.raises(InvalidStateError):
+            fast_sq1.apply_state("A1B2")
+
+    snapshot = stats(reset=True)
+    assert not snapshot["enabled"]
+    assert snapshot["counters"] == {"layer_turns": 8, "slashes": 6, "rollbacks": 4, "parse_failures": 3}
+    assert snapshot["timings"]["Square1.apply_alg"]["calls"] == 3
+    assert snapshot["timings"]["Square1.apply_state"]["seconds"] > 0
+    calls = [name for name in calls if name != "compile_alg"]  # only called if it isn't cached yet
+    assert calls == ["Square1.apply_alg"] * 3 + ["Square1.apply_state", "FastSquare1.apply_alg", "parse_alg",
+                                                 "FastSquare1.apply_state"]
+
+    assert Layer.turn is turn and Square1.apply_alg is apply_alg  # nothing left behind on the hot paths
+    sq1.apply_alg("/")
+    assert stats() == {"enabled": False, "counters": dict.fromkeys(snapshot["counters"], 0), "timings": {}}
+
+    enable_instrumentation()
+    enable_instrumentation()
+    sq1.slash()
+    disable_instrumentation()
+    assert Layer.turn is turn
+    assert list(stats(reset=True)["timings"]) == ["Square1.slash"]
+
+
+def test_instrumentation_counts_both_engines(capsys):
+    stats(reset=True)
+
+    with instrumentation():
+        fast_sq1 = FastSquare1()
+        fast_sq1.turn(1, 0)
+        fast_sq1.slash()
+        fast_sq1.turn(-1, 3)
+        compile_alg("/ (3,0) /").apply_to(fast_sq1)
+        compile_alg("/ (3,0) /").apply_to(Square1())
+        Square1().apply_state("AAAAAAAAAAAAAAAA")  # reports missing and extra pieces, but rolls back once
+
+    assert stats(reset=True)["counters"] == {"layer_turns": 5, "slashes": 5, "rollbacks": 1, "parse_failures": 1}
+    assert capsys.readouterr().out.count("SYNTAX ERROR") == 2
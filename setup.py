@@ -30,6 +30,7 @@ setup(
     ],
 
     py_modules=['virtual_sq1'],
+    entry_points={'console_scripts': ['virtual-sq1=virtual_sq1:main']},
 
-    extras_require={'dev': ['pytest', 'coverage']}
+    extras_require={'dev': ['pytest', 'coverage'], 'numpy': ['numpy']}
 )
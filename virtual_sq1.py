@@ -10,12 +10,25 @@ Classes:
         _invert_alg(simplified_alg):
             Inverts the input simplified algorithm `simplified_alg`
             and returns it.
-        _error_detected(input_type, errored_input, error_turns, error_turns_i):
-            Prints an error message depending on the input type `input_type`.
+        _error_detected(input_type, errored_input, error_turns, error_turns_i, error):
+            Records an error message depending on the input type `input_type`
+            and reports the error `error` according to the error policy.
             If `input_type = 0` or `input_type = 1`: `error_turns` and
             `error_turns_i` are the specifics of where the error occurred
             in `errored_input`.
 
+        snapshot():
+            Returns the Square1's current state as an immutable snapshot.
+        restore(snapshot):
+            Changes the Square1's state back to the state of `snapshot` in
+            place.
+        undo():
+            Undoes the last move and returns True if successful.
+        redo():
+            Redoes the last undone move and returns True if successful.
+        transaction():
+            Context manager that undoes every move made in the block if the
+            block raises an exception (and records them as one move).
         slash():
             Does a slice/slash move to the Square1.
         apply_alg(alg, for_case):
@@ -36,6 +49,181 @@ Classes:
             Rotates the Layer by an input amount `amount` and returns True
             if successful (False if Layer becomes unsliceable).
 
+
+    FastSquare1: A virtual Square-1 object backed by precomputed turn and
+    slash tables (same `apply_alg`, `apply_state` and `__str__` as Square1).
+        turn(top, bottom):
+            Rotates the top and bottom layers and returns True if successful
+            (False if either layer becomes unsliceable).
+        slash():
+            Does a slice/slash move and returns True if successful.
+        apply_alg(alg, for_case):
+            Same as Square1.apply_alg.
+        apply_state(state):
+            Same as Square1.apply_state.
+        snapshot(), restore(snapshot), undo(), redo(), transaction():
+            Same as Square1's.
+
+
+    CompiledAlg: An algorithm compiled into its net effect from each
+    starting shape (create with `compile_alg`).
+        effect(shape):
+            Returns the resulting shape, piece permutation and equator flip
+            of the algorithm from the starting shape `shape`.
+        is_legal_from(shape):
+            Returns True if the algorithm can be applied from `shape`.
+        apply_to(square1):
+            Applies the algorithm to a Square1 or FastSquare1 and returns
+            True if successful.
+        a * b, a ** n:
+            Returns the CompiledAlg of `a` followed by `b`, or of `a` done
+            `n` times (its inverse's if `n` is negative).
+        inverse():
+            Returns the CompiledAlg that undoes the algorithm.
+        order(shape):
+            Returns how many times the algorithm has to be done from `shape`
+            to get back to the starting state.
+        cycles(square1):
+            Returns the cycles of pieces the algorithm moves.
+
+    CaseIndex: An index of algorithms by the case each one solves.
+        add(alg, name):
+            Adds the cases the algorithm `alg` solves and returns True if
+            any of them is new.
+        recognize(square1):
+            Returns the CaseMatch (algorithm, name and the turns to do
+            before and after it) for the state of `square1`, or None.
+
+    Service: An asyncio service that answers newline-delimited JSON
+    requests over TCP or a Unix socket on a bounded worker pool.
+        start(host, port, path):
+            Starts the worker pool and listens for clients.
+        query(line):
+            Answers one request line (with a timeout).
+        serve_forever(), close():
+            Answers requests until closed, and closes the Service.
+
+    Square1Error: The ValueError every error below is a subclass of.
+    AlgSyntaxError: The Square1Error raised when an algorithm can't be
+    parsed, with the offending symbol, move number and character position.
+    IllegalMoveError: The Square1Error for an algorithm with a move that
+    can't be done, with the move number and character position.
+    InvalidStateError: The Square1Error for an invalid input state.
+
+Functions:
+    set_error_policy(policy):
+        Sets whether errors are printed (default), logged, raised or not
+        reported at all, and returns the previous policy.
+    error_policy(policy):
+        Context manager that sets the error policy until the block ends
+        (only for the current thread or asyncio task).
+    validate_alg(alg, for_case, square1):
+        Returns the error applying `alg` to `square1` would give (or None),
+        without changing, printing or raising anything.
+    validate_state(state):
+        Returns the error applying `state` would give (or None).
+    enable_instrumentation(callback):
+        Starts counting layer turns, slashes, rollbacks and parse failures
+        (of Square1 and FastSquare1) and timing every public entry point
+        (calling `callback` after each), at almost no cost to the hot
+        paths while it's disabled.
+    disable_instrumentation():
+        Stops the instrumentation.
+    instrumentation(callback):
+        Context manager that enables the instrumentation until the block
+        ends.
+    stats(reset):
+        Returns a snapshot of the instrumentation's counters and timings.
+    iter_states(alg, for_case, square1, compact):
+        Lazily yields the state (or its rank) after each move of `alg`,
+        working each one out from the one before it.
+
+    parse_alg(alg, for_case):
+        Parses the input algorithm `alg` in a single pass into a tuple of
+        `Turn(top, bottom)` and `SLASH` moves.
+
+    compile_alg(alg, for_case):
+        Compiles the input algorithm `alg` into a (cached) CompiledAlg.
+    simplify_alg(alg, square1):
+        Returns an equivalent algorithm that is no longer than `alg` (and,
+        if `square1` is given, removes moves that cancel out because of
+        its current shape).
+
+    encode_states(states):
+        Encodes state strings into (N, 24) unit and (N,) equator arrays.
+    decode_states(units, equator):
+        Decodes arrays from `encode_states` back into state strings.
+    batch_apply_alg(units, equator, algs, for_case):
+        Applies one algorithm (or one per row) to a whole batch of encoded
+        states at once and returns the new states and a legality mask.
+        Requires NumPy.
+
+    solve(square1, metric, max_depth, time_limit):
+        Returns a shortest algorithm that solves `square1` (IDA* search
+        with pruning tables), or a quick but long one if the budget runs
+        out first.
+    generate_tables(path):
+        Writes the solver's tables to a versioned binary file.
+    load_tables(path):
+        Memory-maps the solver's tables from a file written by
+        `generate_tables` (shared between processes).
+
+    random_state(seed):
+        Returns a Square1 in a uniformly random reachable state.
+    scramble(seed, optimal):
+        Returns a uniformly random Square1 and an algorithm that scrambles
+        a solved Square1 into it.
+    scrambles(count, seed, optimal):
+        Yields `count` scrambles from a single seeded random generator.
+
+    group_algs(algs, rotations, metric):
+        Groups algorithms with the same effect on a solved Square1 (up to
+        layer rotations if `rotations = True`) by hashing their resulting
+        states, and returns the AlgGroups (each with its shortest
+        algorithm) and the algorithms that are illegal from cubeshape.
+
+    canonical_key(square1, mirror, colours, equator):
+        Returns a hashable key that is the same for states that only differ
+        by layer rotations (and mirroring, colours or the equator), and the
+        Symmetry that maps `square1` onto the state the key stands for.
+    apply_symmetry(square1, symmetry, inverse):
+        Applies (or undoes) a Symmetry from `canonical_key`.
+
+    render_svg(square1, size, colours):
+        Returns an SVG diagram of the top and bottom faces and the equator
+        of a Square1, FastSquare1 or state string.
+    render_png(square1, size, colours):
+        Same as `render_svg`, but returns a PNG file (pure Python).
+    render_sheet(states, columns, format, size, colours):
+        Returns a single SVG or PNG sprite sheet of many diagrams.
+    render_batch(states, directory, format, size, colours, names):
+        Writes the diagram of every state to its own file in a directory.
+
+    rank(square1):
+        Returns the unique number (from 0 to `N_STATES - 1`) of the state of
+        `square1`; reachable states rank below `N_REACHABLE_STATES`.
+    unrank(index):
+        Returns a Square1 in the state with the rank `index`.
+
+    run_batch(items, mode, start, workers, chunk_size, tables, **solve_options):
+        Applies (or solves) every input across a pool of worker processes
+        and yields a BatchResult (with the error instead of printing it)
+        for each, in input order.
+
+    stream(lines, mode):
+        Lazily yields the resulting state (or a structured error) of every
+        JSON record or plain line in `lines`.
+    serve(host, port, path, **options):
+        Runs a Service until it's interrupted.
+
+    main(argv):
+        Runs the command line interface
+        (`virtual-sq1` or `python -m virtual_sq1 stream` runs `stream` from
+        stdin to stdout, `python -m virtual_sq1 tables PATH` writes the
+        solver's tables, `python -m virtual_sq1 batch PATH` runs
+        `run_batch` on a file and `python -m virtual_sq1 serve` runs a
+        Service).
+
 Author: Seby Amador
 License: GNU GPLv3
 
@@ -51,6 +239,33 @@ Need help? Visit https://github.com/Wo0fle/virtual-sq1
 
 __version__ = '1.1.0'
 
+import argparse
+from array import array
+import asyncio
+from bisect import bisect_left
+from collections import deque, namedtuple
+from collections.abc import Mapping, Sequence
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import contextlib
+import contextvars
+from functools import lru_cache, partial, wraps
+import json
+from itertools import count, permutations
+import logging
+import math
+import mmap
+from operator import itemgetter
+import os
+import random
+import struct
+import sys
+import threading
+import time
+import zlib
+
+
+_UNDO_LIMIT = 1000  # the number of moves `undo` can (at least) go back
+
 
 class Square1:
     """
@@ -59,6 +274,8 @@ class Square1:
     Need help? Visit https://github.com/Wo0fle/virtual-sq1
     """
 
+    __slots__ = ("top", "equator_flipped", "bottom", "error_message", "_undo_stack", "_redo_stack", "_recording")
+
     def __init__(self) -> None:
         """Initializes the Square1. Solved by default."""
 
@@ -66,6 +283,9 @@ class Square1:
         self.equator_flipped = False
         self.bottom = Layer("5E6F7G8H")
         self.error_message = ""
+        self._undo_stack = []
+        self._redo_stack = []
+        self._recording = True
 
     def __str__(self) -> str:
         """Converts the Square1's state to a string."""
@@ -95,22 +315,15 @@ class Square1:
             on the Square-1.
         """
 
-        simplified_alg = simplified_alg[::-1]
-
-        for i in range(len(simplified_alg)):
-            for j in range(len(simplified_alg[i])):
-                if "-" in simplified_alg[i][j]:
-                    simplified_alg[i][j] = simplified_alg[i][j].replace('-', '', 1)
-                else:
-                    if simplified_alg[i][j] != '0' and simplified_alg[i][j] != '':
-                        simplified_alg[i][j] = "-" + simplified_alg[i][j]
-
-        return simplified_alg
+        return _invert_moves(simplified_alg)
 
-    def _error_detected(self, input_type: int, errored_input, error_turns: list = [], error_turns_i: int = 0) -> None:
+    def _error_detected(self, input_type: int, errored_input, error_turns: list = [], error_turns_i: int = 0,
+                        error: "Square1Error" = None) -> "Square1Error":
         """
-        Prints an error message depending on the input type `input_type`
-        (where 0 is "Case", 1 is "Algorithm", and 2 is "State").
+        Records an error message depending on the input type `input_type`
+        (where 0 is "Case", 1 is "Algorithm", and 2 is "State"), reports
+        the Square1Error `error` according to the error policy (see
+        `set_error_policy`) and returns it.
 
         `errored_input` can be either an errored simplified algorithm
         (for Algorithm or Case) or an errored state (for State).
@@ -131,12 +344,119 @@ class Square1:
             self.error_message = f'Error at "{",".join(error_turns)}" (move #{error_turns_i + 1}).\nSquare-1 reset to previous state.\n'
         elif input_type == 2:  # state
             self.error_message = f'Error with "{"".join(errored_input)}".\nCheck your input isn\'t missing any or contains any extra symbols.\nSquare-1 reset to previous state.\n'
-        
-        print(self.error_message)
+
+        if error is None:
+            error = Square1Error(self.error_message.strip())
+
+        _report(self.error_message, error)
+
+        return error
+
+    def snapshot(self) -> tuple:
+        """
+        Returns the Square1's current state as an immutable snapshot that
+        `restore` can change it back to (nothing is copied).
+        """
+
+        return self.top.current_state, self.equator_flipped, self.bottom.current_state
+
+    def restore(self, snapshot: tuple) -> None:
+        """
+        Changes the Square1's state back to the state of `snapshot` (from
+        `snapshot`) in place, without creating any new Layers.
+
+        Notes:
+            Restoring isn't a move, so it can't be undone with `undo`.
+        """
+
+        self.top.current_state, self.equator_flipped, self.bottom.current_state = snapshot
+
+    def _record(self, snapshot: tuple) -> None:
+        """Records the snapshot `snapshot` from before a successful move for `undo` (unless in a transaction)."""
+
+        if self._recording:
+            undo_stack = self._undo_stack
+            undo_stack.append(snapshot)
+
+            if len(undo_stack) > 2 * _UNDO_LIMIT:  # forget the oldest moves in bulk
+                del undo_stack[:_UNDO_LIMIT]
+
+            if self._redo_stack:
+                self._redo_stack = []
+
+    def undo(self) -> bool:
+        """
+        Undoes the last move (a `slash`, `apply_alg`, `apply_state` or
+        whole transaction) and returns True (returns False if there is no
+        move to undo).
+
+        Notes:
+            At least the last 1000 moves are kept, and turning a Layer
+            directly isn't recorded.
+        """
+
+        if not self._undo_stack:
+            return False
+
+        self._redo_stack.append(self.snapshot())
+        self.restore(self._undo_stack.pop())
+
+        return True
+
+    def redo(self) -> bool:
+        """
+        Redoes the last move undone by `undo` and returns True (returns
+        False if there is no move to redo, or a new move was made since).
+        """
+
+        if not self._redo_stack:
+            return False
+
+        self._undo_stack.append(self.snapshot())
+        self.restore(self._redo_stack.pop())
+
+        return True
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        Context manager that changes the Square1 back to its state from
+        before the block if the block raises an exception (which is then
+        raised again).
+
+        Every move made in the block is recorded as a single move for
+        `undo`.
+        """
+
+        initial = self.snapshot()
+        recording = self._recording
+        self._recording = False
+
+        try:
+            yield self
+        except BaseException:
+            self._recording = recording
+            self.restore(initial)
+            raise
+
+        self._recording = recording
+
+        if self.snapshot() != initial:
+            self._record(initial)
 
     def slash(self) -> None:  # lol "slice" is taken by Python already
         """Does a slice/slash move to the Square1."""
 
+        initial = self.snapshot()
+        self._slash()
+        self._record(initial)
+
+    def _slash(self) -> None:
+        """Does a slice/slash move to the Square1 (without recording it for `undo`)."""
+
+        if _COUNTING:
+            _COUNTERS["slashes"] += 1
+
         value = 0
 
         for i in range(len(self.top.current_state)):
@@ -161,11 +481,11 @@ class Square1:
                 right_side_D = self.bottom.current_state[:i+1]
                 left_side_D = self.bottom.current_state[i+1:]
 
-        self.top = Layer(left_side_U + right_side_D)
-        self.bottom = Layer(right_side_U + left_side_D)
+        self.top.current_state = left_side_U + right_side_D
+        self.bottom.current_state = right_side_U + left_side_D
         self._flip_equator()
 
-    def apply_alg(self, alg: str, for_case: bool = False) -> None:
+    def apply_alg(self, alg: str, for_case: bool = False) -> "Square1Error":
         """
         If `for_case = False` (default): Applies an input algorithm `alg`
         to the Square1.
@@ -173,136 +493,101 @@ class Square1:
         If `for_case = True`: Changes the Square1's state so that the
         input algorithm `alg` brings it to its current state.
 
-        Resets the Square1 to its previous state if unsuccessful.
+        Resets the Square1 to its previous state if unsuccessful and
+        returns the error (an AlgSyntaxError or IllegalMoveError), which is
+        also reported according to the error policy (see
+        `set_error_policy`). Returns None if successful.
 
         Notes:
             The distinction between a "case" and an "algorithm" was made by
             Tyson Decker's puzzle-gen: https://tdecker91.github.io/puzzlegen-demo/
         """
 
-        initial_top = self.top.current_state
-        initial_equator = self.equator_flipped
-        initial_bottom = self.bottom.current_state
+        initial = self.snapshot()
 
-        simplfied_alg = list(alg)
+        try:
+            segments = _alg_segments(alg, for_case)
+        except AlgSyntaxError:
+            segments = None
 
-        for char in alg:
-            if not char.isnumeric() and ((char != '/') and (char != ',') and (char != '-')):
-                simplfied_alg.remove(char)
+        legal = segments is not None
 
-        simplfied_alg = [slash.split(',') for slash in (''.join(simplfied_alg)).split('/')]
-
-        if for_case:
-            simplfied_alg = self._invert_alg(simplfied_alg)
-
-        legal = True
-
-        for i in range(len(simplfied_alg)):
-            try:
-                turn_amount = int(simplfied_alg[i][0])
-
-                while abs(turn_amount) > 6:
-                    if turn_amount > 0:
-                        turn_amount -= 12
-                    else:
-                        turn_amount += 12
-
-                if not self.top.turn(turn_amount):
-                    self.top = Layer(initial_top)
-                    self.equator_flipped = initial_equator
-                    self.bottom = Layer(initial_bottom)
-                    legal = False
-                    break
-            except ValueError:
-                if simplfied_alg[i][0] != '':
-                    print('\nSYNTAX ERROR involving "-" detected!')
-                    self.top = Layer(initial_top)
-                    self.equator_flipped = initial_equator
-                    self.bottom = Layer(initial_bottom)
-                    legal = False
-                    break
+        if legal:
+            last = len(segments) - 1
 
-            try:
-                turn_amount = int(simplfied_alg[i][1])
-
-                while abs(turn_amount) > 6:
-                    if turn_amount > 0:
-                        turn_amount -= 12
-                    else:
-                        turn_amount += 12
-
-                if not self.bottom.turn(turn_amount):
-                    self.top = Layer(initial_top)
-                    self.equator_flipped = initial_equator
-                    self.bottom = Layer(initial_bottom)
-                    legal = False
-                    break
-            except ValueError:
-                if simplfied_alg[i][1] != '':
-                    print('\nSYNTAX ERROR involving "-" detected!')
-                    self.top = Layer(initial_top)
-                    self.equator_flipped = initial_equator
-                    self.bottom = Layer(initial_bottom)
+            for i, (top, bottom) in enumerate(segments):
+                if not self.top.turn((top + 5) % 12 - 5) or not self.bottom.turn((bottom + 5) % 12 - 5):
                     legal = False
                     break
-            except IndexError:
-                pass  # assume 0 for bottom turn if there's only one input
-
-            if len(simplfied_alg[i]) > 2:
-                print('\nSYNTAX ERROR involving "," detected!')
-                self.top = Layer(initial_top)
-                self.equator_flipped = initial_equator
-                self.bottom = Layer(initial_bottom)
-                legal = False
-                break
 
-            self.slash()
+                if i != last:  # the slash after the last move would be undone anyway
+                    self._slash()
 
         if legal:
-            self.slash()
             self.error_message = ""
+            self._record(initial)
+            return None
+
+        self.restore(initial)
+
+        # find the move that stops it, like applying it move by move would
+        split = _split_moves(alg)
+        i, printed, error = _first_error(_square1_shape(self), alg, split, for_case)
+
+        if _COUNTING:
+            _count_rollback(isinstance(error, AlgSyntaxError))
+
+        if segments is None:  # an illegal turn was already reported by Layer.turn
+            _print(printed)
+
+        simplfied_alg = _written_turns(alg, split)
+
+        if for_case:
+            simplfied_alg = self._invert_alg(simplfied_alg)
+            return self._error_detected(0, simplfied_alg, simplfied_alg[i], i, error)
         else:
-            if for_case:
-                self._error_detected(0, simplfied_alg, simplfied_alg[i], i)
-            else:
-                self._error_detected(1, simplfied_alg, simplfied_alg[i], i)
+            return self._error_detected(1, simplfied_alg, simplfied_alg[i], i, error)
 
-    def apply_state(self, state: str) -> None:
+    def apply_state(self, state: str) -> "Square1Error":
         """
         Changes the Square1's state to match the input state `state`
-        (resets the Square1 to its previous state if unsuccessful).
+        (resets the Square1 to its previous state if unsuccessful and
+        returns the InvalidStateError, or returns None if successful).
 
         Notes:
             This module uses (almost) the same position notation as
             Jaap's Square-1 optimiser: https://www.jaapsch.net/puzzles/square1.htm#progs.
         """
 
-        initial_top = self.top.current_state
-        initial_equator = self.equator_flipped
-        initial_bottom = self.bottom.current_state
+        initial = self.snapshot()
 
         req_pieces = "ABCDEFGH12345678"
         state = [piece for piece in state.upper() if piece != " "]
         state_list = list(state)
+        error = None
 
         for req_piece in req_pieces:
             if len(state_list) == 0 or req_piece not in state_list:
-                print('\nSYNTAX ERROR involving missing pieces detected!')
-                self.top = Layer(initial_top)
-                self.equator_flipped = initial_equator
-                self.bottom = Layer(initial_bottom)
-                self._error_detected(2, state)
+                _print('\nSYNTAX ERROR involving missing pieces detected!')
+                self.restore(initial)
+
+                if _COUNTING:
+                    _count_rollback(True)
+
+                error = self._error_detected(2, state, error=InvalidStateError("".join(state), "missing pieces"))
                 break
 
             if req_piece in state_list:
                 state_list.remove(req_piece)
 
         if len(state_list) > 1:
-            print('\nSYNTAX ERROR involving extra/nonexistent pieces detected!')
-            self.top = Layer(initial_top)
-            self.equator_flipped = initial_equator
-            self.bottom = Layer(initial_bottom)
-            self._error_detected(2, state)
+            _print('\nSYNTAX ERROR involving extra/nonexistent pieces detected!')
+            self.restore(initial)
+
+            if _COUNTING and error is None:  # a missing pieces error already counted the rollback
+                _count_rollback(True)
+
+            error = self._error_detected(2, state, error=InvalidStateError("".join(state), "extra/nonexistent pieces"))
         else:
             value = 0
 
@@ -329,24 +614,31 @@ class Square1:
                     new_top = ''.join(state_list[:i+1])
                     new_bottom = ''.join(state_list[i+1:])
 
-                    self.top = Layer(new_top)
-                    self.bottom = Layer(new_bottom)
+                    self.top.current_state = new_top
+                    self.bottom.current_state = new_bottom
 
                     self.error_message = ""
+                    self._record(initial)
 
                     break
                 elif value > 12:
-                    print('\nSYNTAX ERROR involving impossible layer state detected!')
-                    self.top = Layer(initial_top)
-                    self.equator_flipped = initial_equator
-                    self.bottom = Layer(initial_bottom)
-                    self._error_detected(2, state)
+                    _print('\nSYNTAX ERROR involving impossible layer state detected!')
+                    self.restore(initial)
+
+                    if _COUNTING and error is None:
+                        _count_rollback(True)
+
+                    error = self._error_detected(2, state, error=InvalidStateError("".join(state), "impossible layer state"))
                     break
 
+        return error
+
 
 class Layer:
     """An arbitrary layer of the Square1."""
 
+    __slots__ = ("current_state",)
+
     def __init__(self, initial_state: str) -> None:
         """Initializes the Layer. Initial state `initial_state` is input."""
 
@@ -385,6 +677,9 @@ class Layer:
         the Layer to its previous state and returns False.
         """
 
+        if _COUNTING and amount % 12:
+            _COUNTERS["layer_turns"] += 1
+
         if amount > 0:
             initial_state = self.current_state[::-1]
 
@@ -399,7 +694,7 @@ class Layer:
                     self.current_state = piece + self.current_state[:-1]
                 else:
                     if amount != 0 or not self._is_sliceable():
-                        print('\nLOGIC ERROR involving an incomplete turn detected!\n')
+                        _print('\nLOGIC ERROR involving an incomplete turn detected!\n')
                         self.current_state = initial_state[::-1]
                         return False
 
@@ -419,10 +714,4260 @@ class Layer:
                     self.current_state = self.current_state[1:] + piece
                 else:
                     if amount != 0 or not self._is_sliceable():
-                        print('\nLOGIC ERROR involving an incomplete turn detected!\n')
+                        _print('\nLOGIC ERROR involving an incomplete turn detected!\n')
                         self.current_state = initial_state
                         return False
 
                     return True
         else:
             return True
+
+
+_PIECES = "ABCDEFGH12345678"  # piece ids are indices into this string
+_PIECE_IDS = {piece: i for i, piece in enumerate(_PIECES)}
+_PIECE_WIDTHS = (2,) * 8 + (1,) * 8  # corners take up 2 units, edges 1
+
+_GETTERS = {}  # permutation -> itemgetter (shared between shapes)
+_SHAPE_MOVES = {}  # shape -> (top piece count, top turns, bottom turns, (slash,))
+
+
+def _layer_mask(pieces) -> int:
+    """
+    Returns the 12-bit mask of the units where each piece in `pieces`
+    (piece ids of a single layer) starts, or -1 if the pieces don't add up
+    to exactly 12 units.
+    """
+
+    mask = 0
+    unit = 0
+
+    for piece in pieces:
+        if unit >= 12:
+            return -1
+
+        mask |= 1 << unit
+        unit += _PIECE_WIDTHS[piece]
+
+    return mask if unit == 12 else -1
+
+
+def _getter(permutation: tuple):
+    """Returns a cached itemgetter that applies the permutation `permutation`."""
+
+    getter = _GETTERS.get(permutation)
+
+    if getter is None:
+        getter = _GETTERS[permutation] = itemgetter(*permutation)
+
+    return getter
+
+
+def _build_shape_moves(shape: int) -> tuple:
+    """
+    Builds the turn and slash tables of the shape `shape`.
+
+    Notes:
+        A shape packs the start units of the top layer's pieces into bits
+        0-11 and those of the bottom layer's pieces into bits 12-23.
+
+        Every table entry is either None (illegal move) or a tuple of
+        the resulting shape and the itemgetter that reorders the pieces.
+    """
+
+    top_mask = shape & 0xFFF
+    bottom_mask = shape >> 12
+    top_starts = [unit for unit in range(12) if top_mask >> unit & 1]
+    bottom_starts = [unit for unit in range(12) if bottom_mask >> unit & 1]
+    n_top = len(top_starts)
+    n_bottom = len(bottom_starts)
+    top_range = list(range(n_top))
+    bottom_range = list(range(n_top, n_top + n_bottom))
+
+    top_turns = []
+    bottom_turns = []
+
+    for amount in range(12):
+        for mask, starts, turns in ((top_mask, top_starts, top_turns), (bottom_mask, bottom_starts, bottom_turns)):
+            new_mask = ((mask << amount) | (mask >> (12 - amount))) & 0xFFF
+
+            # same rules as Layer.turn: land on a piece edge and stay sliceable
+            if not new_mask & 1 or (amount != 0 and not new_mask >> 6 & 1):
+                turns.append(None)
+                continue
+
+            first = starts.index((12 - amount) % 12)
+
+            if turns is top_turns:
+                permutation = top_range[first:] + top_range[:first] + bottom_range
+                new_shape = new_mask | (bottom_mask << 12)
+            else:
+                permutation = top_range + bottom_range[first:] + bottom_range[:first]
+                new_shape = top_mask | (new_mask << 12)
+
+            turns.append((new_shape, _getter(tuple(permutation))))
+
+    if top_mask >> 6 & 1 and bottom_mask >> 6 & 1:
+        top_half = sum(1 for unit in top_starts if unit < 6)
+        bottom_half = sum(1 for unit in bottom_starts if unit < 6)
+        permutation = (top_range[:top_half] + bottom_range[:bottom_half]
+                       + top_range[top_half:] + bottom_range[bottom_half:])
+        new_top = (top_mask & 0x3F) | ((bottom_mask & 0x3F) << 6)
+        new_bottom = (top_mask >> 6) | (bottom_mask & 0xFC0)
+        slash = (new_top | (new_bottom << 12), _getter(tuple(permutation)))
+    else:
+        slash = None
+
+    return (n_top, tuple(top_turns), tuple(bottom_turns), (slash,))
+
+
+def _shape_moves(shape: int) -> tuple:
+    """Returns the (cached) turn and slash tables of the shape `shape`."""
+
+    moves = _SHAPE_MOVES.get(shape)
+
+    if moves is None:
+        moves = _SHAPE_MOVES[shape] = _build_shape_moves(shape)
+
+    return moves
+
+
+def _precompute_shape_moves() -> list:
+    """
+    Fills the turn and slash tables for every shape reachable from cubeshape
+    and returns those shapes in breadth-first order.
+    """
+
+    queue = [_SOLVED_SHAPE]
+    seen = {_SOLVED_SHAPE}
+
+    for shape in queue:
+        _, top_turns, bottom_turns, slash = _shape_moves(shape)
+
+        for entry in top_turns + bottom_turns + slash:
+            if entry is not None and entry[0] not in seen:
+                seen.add(entry[0])
+                queue.append(entry[0])
+
+    return queue
+
+
+_ERROR_POLICIES = ("print", "log", "raise", "quiet")
+_ERROR_POLICY = "print"  # every thread's policy, unless an `error_policy` block overrides it
+_ERROR_POLICY_OVERRIDE = contextvars.ContextVar("virtual_sq1_error_policy", default=None)  # set by `error_policy`
+_LOGGER = logging.getLogger("virtual_sq1")
+
+
+def set_error_policy(policy: str) -> str:
+    """
+    Sets how `apply_alg` and `apply_state` (of every Square1 and
+    FastSquare1) report errors and returns the previous policy.
+
+    "print" (default): Prints the error messages, like always.
+    "log": Logs the error as a warning to the "virtual_sq1" logger.
+    "raise": Raises the error (a Square1Error).
+    "quiet": Doesn't report the error anywhere.
+
+    Whatever the policy, the error message is still recorded in
+    `error_message` and the error is returned by `apply_alg` and
+    `apply_state` (unless it was raised).
+
+    Notes:
+        The policy is shared by the whole module (and every thread), so
+        use `error_policy` to change it only for a block of code (which
+        also keeps other threads from being affected).
+    """
+
+    global _ERROR_POLICY
+
+    _check_error_policy(policy)
+    previous, _ERROR_POLICY = _ERROR_POLICY, policy
+
+    return previous
+
+
+@contextlib.contextmanager
+def error_policy(policy: str):
+    """
+    Context manager that sets the error policy `policy` (see
+    `set_error_policy`) until the block ends, only for the current thread
+    (or asyncio task).
+    """
+
+    _check_error_policy(policy)
+    token = _ERROR_POLICY_OVERRIDE.set(policy)
+
+    try:
+        yield
+    finally:
+        _ERROR_POLICY_OVERRIDE.reset(token)
+
+
+def _check_error_policy(policy: str) -> None:
+    """Raises a ValueError if `policy` isn't an error policy."""
+
+    if policy not in _ERROR_POLICIES:
+        raise ValueError(f'Unknown error policy "{policy}" (expected one of {", ".join(_ERROR_POLICIES)}).')
+
+
+def _error_policy() -> str:
+    """Returns the error policy of the current thread (or asyncio task)."""
+
+    return _ERROR_POLICY_OVERRIDE.get() or _ERROR_POLICY
+
+
+def _print(text: str) -> None:
+    """Prints the error details `text` if the error policy is "print"."""
+
+    if _error_policy() == "print":
+        print(text)
+
+
+def _report(message: str, error: "Square1Error") -> None:
+    """Reports the error `error` (with the error message `message`) according to the error policy."""
+
+    policy = _error_policy()
+
+    if policy == "print":
+        print(message)
+    elif policy == "log":
+        _LOGGER.warning("%s", error)
+    elif policy == "raise":
+        raise error
+
+
+class Square1Error(ValueError):
+    """
+    Base class of the errors `apply_alg` and `apply_state` return (or
+    raise, see `set_error_policy`) when their input is illegal.
+    """
+
+
+class InvalidStateError(Square1Error):
+    """
+    An input state that isn't a valid Square-1 state.
+
+    Attributes:
+        state: The state (without spaces).
+        reason: "missing pieces", "extra/nonexistent pieces" or
+        "impossible layer state".
+    """
+
+    def __init__(self, state: str, reason: str) -> None:
+        self.state = state
+        self.reason = reason
+
+        super().__init__(f'Invalid state "{state}": {reason}.')
+
+
+class IllegalMoveError(Square1Error):
+    """
+    An algorithm with a move that can't be done from the state it is
+    applied to.
+
+    Attributes:
+        alg: The algorithm.
+        text: The move's turns as written (only digits, "-" and ",").
+        move: The number of the move (between slashes), counting from 1.
+        position: The index of the first character of the move in `alg`.
+        reason: "incomplete turn" or "unsliceable layer".
+    """
+
+    def __init__(self, alg: str, text: str, move: int, position: int, reason: str) -> None:
+        self.alg = alg
+        self.text = text
+        self.move = move
+        self.position = position
+        self.reason = reason
+
+        super().__init__(f'Illegal move "{text}" (move #{move}, character {position + 1}): {reason}.')
+
+
+SLASH = "/"  # the slash marker in `parse_alg`'s move lists
+Turn = namedtuple("Turn", ("top", "bottom"))
+Turn.__doc__ = "A (top, bottom) turn in a `parse_alg` move list."
+
+
+class AlgSyntaxError(Square1Error):
+    """
+    Raised when an algorithm can't be parsed.
+
+    Attributes:
+        alg: The algorithm that was being parsed.
+        symbol: The offending symbol ("-" or ",").
+        text: The move's turns as written (only digits, "-" and ",").
+        move: The number of the move (between slashes) where the error is,
+        counting from 1.
+        position: The index of the offending character in `alg`.
+    """
+
+    def __init__(self, alg: str, symbol: str, text: str, move: int, position: int) -> None:
+        self.alg = alg
+        self.symbol = symbol
+        self.text = text
+        self.move = move
+        self.position = position
+
+        super().__init__(f'Syntax error involving "{symbol}" at "{text}" (move #{move}, character {position + 1}).')
+
+
+def _invert_turn(text: str) -> str:
+    """Inverts one turn amount `text` as written (see `_invert_moves`)."""
+
+    if "-" in text:
+        return text.replace('-', '', 1)
+    elif text != '0' and text != '':
+        return "-" + text
+
+    return text
+
+
+def _invert_moves(simplified_alg: list) -> list:
+    """
+    Inverts the input simplified algorithm `simplified_alg` (the turns of
+    each move as written, see `_written_turns`) and returns it.
+
+    Notes:
+        The moves are reversed into a new list but each move's turns are
+        inverted in place, so inverting the result again gives back the
+        turns of `simplified_alg`.
+    """
+
+    simplified_alg = simplified_alg[::-1]
+
+    for turns in simplified_alg:
+        for j in range(len(turns)):
+            turns[j] = _invert_turn(turns[j])
+
+    return simplified_alg
+
+
+def _split_moves(alg: str) -> tuple:
+    """
+    Splits the input algorithm `alg` in a single pass into its moves (each
+    a list of turns, each a list of the indices of its characters), the
+    indices of each move's commas and the index where each move starts.
+
+    Every character other than digits, "/", "," and "-" is ignored.
+    """
+
+    moves = []
+    commas = []
+    starts = [0]
+    turns = [[]]
+    move_commas = []
+
+    for position, char in enumerate(alg):
+        if char == '/':
+            moves.append(turns)
+            commas.append(move_commas)
+            starts.append(position + 1)
+            turns = [[]]
+            move_commas = []
+        elif char == ',':
+            turns.append([])
+            move_commas.append(position)
+        elif char == '-' or char.isnumeric():
+            turns[-1].append(position)
+
+    moves.append(turns)
+    commas.append(move_commas)
+
+    return moves, commas, starts
+
+
+def _bad_turn_char(written: str, text: str) -> int:
+    """
+    Returns the index in the turn `written` of the first character of
+    `text` (`written`, possibly inverted) that can't be part of an integer.
+    """
+
+    for n, char in enumerate(text):
+        if (char == '-' and (n or len(text) == 1)) or (char != '-' and not char.isdecimal()):
+            break
+
+    if len(text) > len(written):
+        n -= 1
+    elif len(text) < len(written):
+        n += n >= written.index('-')
+
+    return n
+
+
+def _iter_segments(alg: str, split: tuple, for_case: bool = False):
+    """
+    Yields the index (in the order they are applied), top turn amount and
+    bottom turn amount of every move of the input algorithm `alg`
+    (inverted if `for_case = True`), given `split = _split_moves(alg)`.
+
+    Raises an AlgSyntaxError at the first move (in the order they would be
+    applied) that has a syntax error, right after yielding what comes
+    before the error in that move: its top turn amount (with None as its
+    bottom turn amount) if only the bottom turn is wrong, or both amounts
+    if it has too many commas.
+
+    Notes:
+        Each move is checked in the same order as `Square1.apply_alg` used
+        to (top turn, bottom turn, then extra commas), so the same inputs
+        are accepted and rejected.
+    """
+
+    moves, commas, _ = split
+    order = range(len(moves) - 1, -1, -1) if for_case else range(len(moves))
+
+    for k, i in enumerate(order):
+        amounts = [0, 0]
+
+        for layer, positions in enumerate(moves[i][:2]):
+            written = ''.join([alg[position] for position in positions])
+            text = _invert_turn(written) if for_case else written
+
+            try:
+                amounts[layer] = int(text) if text != '' else 0
+            except ValueError:
+                if layer:
+                    yield k, amounts[0], None
+
+                n = _bad_turn_char(written, text)
+                raise AlgSyntaxError(alg, '-', _move_text(alg, moves[i]), i + 1, positions[n]) from None
+
+        yield k, amounts[0], amounts[1]
+
+        if len(moves[i]) > 2:
+            raise AlgSyntaxError(alg, ',', _move_text(alg, moves[i]), i + 1, commas[i][1])
+
+
+def _parse_segments(alg: str, for_case: bool = False) -> list:
+    """
+    Parses the input algorithm `alg` in a single pass into a list of
+    (top, bottom) turn amounts with a slash between each of them (inverted
+    if `for_case = True`).
+
+    Raises an AlgSyntaxError at the first move (in the order they would be
+    applied) that has a syntax error (see `_iter_segments`).
+    """
+
+    return [(top, bottom) for _, top, bottom in _iter_segments(alg, _split_moves(alg), for_case)]
+
+
+def _written_turns(alg: str, split: tuple) -> list:
+    """Returns the turns of every move of the input algorithm `alg` as written, given `split = _split_moves(alg)`."""
+
+    return [[''.join([alg[position] for position in positions]) for positions in turns] for turns in split[0]]
+
+
+def _move_text(alg: str, turns: list) -> str:
+    """Returns the turns `turns` (lists of character indices) of a move of `alg` as written."""
+
+    return ','.join([''.join([alg[position] for position in positions]) for positions in turns])
+
+
+def parse_alg(alg: str, for_case: bool = False) -> tuple:
+    """
+    Parses the input algorithm `alg` (inverted if `for_case = True`, the
+    same way `apply_alg` treats cases) into a tuple of moves, where each
+    move is either a `Turn(top, bottom)` or `SLASH`.
+
+    Moves without a turn (like "/ /") only give a `SLASH`, and turn amounts
+    are kept as written (not reduced).
+
+    Raises an AlgSyntaxError (a ValueError) with the position of the
+    offending character if `alg` has a syntax error.
+    """
+
+    moves = []
+
+    for i, (top, bottom) in enumerate(_parse_segments(alg, for_case)):
+        if i:
+            moves.append(SLASH)
+
+        if top or bottom:
+            moves.append(Turn(top, bottom))
+
+    return tuple(moves)
+
+
+def _alg_segments(alg: str, for_case: bool = False) -> tuple:
+    """
+    Converts the input algorithm `alg` into a tuple of (top, bottom) turn
+    amounts with a slash between each of them (inverted if
+    `for_case = True`).
+
+    Raises an AlgSyntaxError (a ValueError) if `alg` has a syntax error.
+    """
+
+    return tuple(_parse_segments(alg, for_case))
+
+
+def _first_error(shape: int, alg: str, split: tuple, for_case: bool) -> tuple:
+    """
+    Replays the input algorithm `alg` move by move from the shape `shape`,
+    given `split = _split_moves(alg)`, and returns the index (in the order
+    they are applied) of the move where it went wrong, the error to print
+    and the error (an AlgSyntaxError or IllegalMoveError), or -1, "" and
+    None if it doesn't go wrong.
+    """
+
+    moves = _shape_moves(shape)
+    last = len(split[0]) - 1
+
+    try:
+        for k, top, bottom in _iter_segments(alg, split, for_case):
+            for layer, amount in ((1, top), (2, bottom)):
+                if amount is not None and amount % 12:
+                    entry = moves[layer][amount % 12]
+
+                    if entry is None:
+                        return (k, '\nLOGIC ERROR involving an incomplete turn detected!\n',
+                                _illegal_move(alg, split, k, for_case, "incomplete turn"))
+
+                    moves = _SHAPE_MOVES.get(entry[0]) or _shape_moves(entry[0])
+
+            if k != last and bottom is not None:  # the slash after the last move would be undone anyway
+                entry = moves[3][0]
+
+                if entry is None:
+                    return (k, '\nLOGIC ERROR involving an unsliceable layer detected!\n',
+                            _illegal_move(alg, split, k, for_case, "unsliceable layer"))
+
+                moves = _SHAPE_MOVES.get(entry[0]) or _shape_moves(entry[0])
+    except AlgSyntaxError as error:
+        k = last + 1 - error.move if for_case else error.move - 1
+        return k, f'\nSYNTAX ERROR involving "{error.symbol}" detected!', error
+
+    return -1, '', None
+
+
+def _illegal_move(alg: str, split: tuple, k: int, for_case: bool, reason: str) -> IllegalMoveError:
+    """
+    Returns the IllegalMoveError (with the reason `reason`) of the move `k`
+    (in the order they are applied) of the input algorithm `alg`, given
+    `split = _split_moves(alg)`.
+    """
+
+    moves, _, starts = split
+    i = len(moves) - 1 - k if for_case else k
+    position = starts[i]
+
+    while position < len(alg) - 1 and alg[position].isspace():
+        position += 1
+
+    return IllegalMoveError(alg, _move_text(alg, moves[i]), i + 1, position, reason)
+
+
+def _format_alg(segments) -> str:
+    """
+    Converts a tuple of (top, bottom) turn amounts `segments` back into an
+    algorithm string, with every turn amount reduced to the range -5 to 6.
+    """
+
+    parts = []
+
+    for top, bottom in segments:
+        top = (top + 5) % 12 - 5
+        bottom = (bottom + 5) % 12 - 5
+        parts.append(f"({top},{bottom})" if top or bottom else "")
+
+    return " / ".join(parts).strip()
+
+
+def _segment_ops(segments) -> tuple:
+    """Converts a tuple of (top, bottom) turn amounts `segments` into table operations."""
+
+    ops = []
+    last = len(segments) - 1
+
+    for i, (top, bottom) in enumerate(segments):
+        if top % 12:
+            ops.append((1, top % 12, i))
+
+        if bottom % 12:
+            ops.append((2, bottom % 12, i))
+
+        if i != last:
+            ops.append((3, 0, i))
+
+    return tuple(ops)
+
+
+def _join_segments(parts) -> list:
+    """
+    Concatenates the (top, bottom) turn amounts of the algorithms in `parts`,
+    merging the turns where two algorithms meet and cancelling "/ (0,0) /".
+    """
+
+    joined = []
+
+    for segments in parts:
+        for n, (top, bottom) in enumerate(segments):
+            if n == 0 and joined:
+                previous_top, previous_bottom = joined.pop()
+                top += previous_top
+                bottom += previous_bottom
+            elif n != 0 and len(joined) > 1 and joined[-1] == (0, 0):
+                joined.pop()  # two slashes in a row cancel out
+                previous_top, previous_bottom = joined.pop()
+                top += previous_top
+                bottom += previous_bottom
+
+            joined.append((top % 12, bottom % 12))
+
+    return joined
+
+
+_SOLVED_PIECES = tuple(_PIECE_IDS[piece] for piece in "A1B2C3D45E6F7G8H")
+_SOLVED_SHAPE = _layer_mask(_SOLVED_PIECES[:8]) | (_layer_mask(_SOLVED_PIECES[8:]) << 12)
+
+
+def _parse_state(state: list) -> tuple:
+    """
+    Converts the input state `state` (a list of its characters, without
+    spaces) into a tuple of piece ids, its shape and its separators
+    ("/" or "-").
+
+    Raises an InvalidStateError if `state` isn't a valid state.
+    """
+
+    separators = [piece for piece in state if piece in "/-"]
+    pieces = [_PIECE_IDS.get(piece, -1) for piece in state if piece not in "/-"]
+
+    if any(piece not in state for piece in _PIECES):
+        raise InvalidStateError(''.join(state), "missing pieces")
+    elif len(pieces) != len(_PIECES) or len(separators) > 1:
+        raise InvalidStateError(''.join(state), "extra/nonexistent pieces")
+
+    value = 0
+
+    for n_top in range(len(pieces)):
+        value += _PIECE_WIDTHS[pieces[n_top]]
+
+        if value >= 12:
+            break
+
+    if value > 12:
+        raise InvalidStateError(''.join(state), "impossible layer state")
+
+    return tuple(pieces), _layer_mask(pieces[:n_top + 1]) | (_layer_mask(pieces[n_top + 1:]) << 12), separators
+
+
+class FastSquare1:
+    """
+    A virtual Square-1 object backed by precomputed turn and slash tables.
+
+    Has the same `apply_alg`, `apply_state` and `__str__` behaviour as
+    Square1, but stores its state as a tuple of piece ids plus an integer
+    shape, so every move is a single table lookup and permutation.
+
+    Need help? Visit https://github.com/Wo0fle/virtual-sq1
+    """
+
+    __slots__ = ("pieces", "shape", "equator_flipped", "error_message", "_undo_stack", "_redo_stack", "_recording")
+
+    _flip_equator = Square1._flip_equator
+    _invert_alg = Square1._invert_alg
+    _error_detected = Square1._error_detected
+    _record = Square1._record
+    undo = Square1.undo
+    redo = Square1.redo
+    transaction = Square1.transaction
+
+    def __init__(self) -> None:
+        """Initializes the FastSquare1. Solved by default."""
+
+        self.pieces = _SOLVED_PIECES
+        self.shape = _SOLVED_SHAPE
+        self.equator_flipped = False
+        self.error_message = ""
+        self._undo_stack = []
+        self._redo_stack = []
+        self._recording = True
+
+    def __str__(self) -> str:
+        """Converts the FastSquare1's state to a string."""
+
+        return _state_string(_shape_moves(self.shape)[0], self.pieces, self.equator_flipped)
+
+    def snapshot(self) -> tuple:
+        """Same as Square1.snapshot."""
+
+        return self.pieces, self.shape, self.equator_flipped
+
+    def restore(self, snapshot: tuple) -> None:
+        """Same as Square1.restore."""
+
+        self.pieces, self.shape, self.equator_flipped = snapshot
+
+    def turn(self, top: int, bottom: int = 0) -> bool:
+        """
+        Rotates the top layer by `top` and the bottom layer by `bottom`
+        and returns True (if successful).
+
+        If either rotation leaves its layer in an unsliceable position, the
+        FastSquare1 is left in its previous state and False is returned.
+        """
+
+        shape = self.shape
+        pieces = self.pieces
+
+        for layer, amount in ((1, top), (2, bottom)):
+            if amount % 12:
+                if _COUNTING:
+                    _COUNTERS["layer_turns"] += 1
+
+                entry = _shape_moves(shape)[layer][amount % 12]
+
+                if entry is None:
+                    _print('\nLOGIC ERROR involving an incomplete turn detected!\n')
+                    return False
+
+                shape, getter = entry
+                pieces = getter(pieces)
+
+        self._record(self.snapshot())
+        self.shape = shape
+        self.pieces = pieces
+
+        return True
+
+    def slash(self) -> bool:
+        """
+        Does a slice/slash move to the FastSquare1 and returns True
+        (returns False without moving if a layer is unsliceable).
+        """
+
+        if _COUNTING:
+            _COUNTERS["slashes"] += 1
+
+        entry = _shape_moves(self.shape)[3][0]
+
+        if entry is None:
+            return False
+
+        self._record(self.snapshot())
+        self.shape, getter = entry
+        self.pieces = getter(self.pieces)
+        self._flip_equator()
+
+        return True
+
+    def apply_alg(self, alg: str, for_case: bool = False) -> "Square1Error":
+        """
+        If `for_case = False` (default): Applies an input algorithm `alg`
+        to the FastSquare1.
+
+        If `for_case = True`: Changes the FastSquare1's state so that the
+        input algorithm `alg` brings it to its current state.
+
+        Leaves the FastSquare1 in its previous state and returns the error
+        if unsuccessful (returns None if successful).
+        """
+
+        compiled = _compile_input(alg, for_case)
+
+        if compiled is not None:
+            effect = compiled._effects.get(self.shape) or compiled._effect(self.shape)
+
+            if effect is not None:
+                if _COUNTING:
+                    _count_moves(compiled.segments)
+
+                self._record(self.snapshot())
+                self.shape = effect[0]
+                self.pieces = effect[1](self.pieces)
+                self.equator_flipped ^= effect[2]
+                self.error_message = ""
+                return None
+
+        # illegal: replay the moves one by one to find out where it went wrong
+        split = _split_moves(alg)
+        i, printed, error = _first_error(self.shape, alg, split, for_case)
+        _print(printed)
+
+        if _COUNTING:
+            _count_rollback(isinstance(error, AlgSyntaxError))
+        simplified_alg = _written_turns(alg, split)
+
+        if for_case:
+            simplified_alg = self._invert_alg(simplified_alg)
+            return self._error_detected(0, simplified_alg, simplified_alg[i], i, error)
+        else:
+            return self._error_detected(1, simplified_alg, simplified_alg[i], i, error)
+
+    def apply_state(self, state: str) -> "Square1Error":
+        """
+        Changes the FastSquare1's state to match the input state `state`
+        (leaves the FastSquare1 in its previous state and returns the
+        InvalidStateError if unsuccessful, or returns None if successful).
+        """
+
+        state = [piece for piece in state.upper() if piece != " "]
+
+        try:
+            pieces, shape, separators = _parse_state(state)
+        except InvalidStateError as error:
+            _print(f'\nSYNTAX ERROR involving {error.reason} detected!')
+
+            if _COUNTING:
+                _count_rollback(True)
+
+            return self._error_detected(2, state, error=error)
+
+        self._record(self.snapshot())
+        self.pieces = pieces
+        self.shape = shape
+
+        if separators == ["/"]:  # like Square1.apply_state, "/" flips the equator and "-" leaves it as it is
+            self.equator_flipped = not self.equator_flipped
+
+        self.error_message = ""
+
+        return None
+
+
+class CompiledAlg:
+    """
+    An algorithm compiled into its net effect (resulting shape, piece
+    permutation and equator flip) from each starting shape.
+
+    Create with `compile_alg(alg)`.
+
+    Need help? Visit https://github.com/Wo0fle/virtual-sq1
+    """
+
+    def __init__(self, alg: str, segments: tuple) -> None:
+        """Initializes the CompiledAlg from its normalized algorithm `alg` and its turn amounts `segments`."""
+
+        self.alg = alg
+        self.segments = segments
+        self._ops = _segment_ops(segments)
+        self._effects = {}  # starting shape -> (end shape, itemgetter, equator flip, permutation) or None
+
+    def __str__(self) -> str:
+        """Converts the CompiledAlg to its normalized algorithm string."""
+
+        return self.alg
+
+    def __repr__(self) -> str:
+        return f"CompiledAlg({self.alg!r})"
+
+    def _effect(self, shape: int):
+        """Replays the algorithm on piece positions from the shape `shape` and caches its net effect."""
+
+        effect = self._effects.get(shape)
+
+        if effect is not None or shape in self._effects:
+            return effect
+
+        start_shape = shape
+        pieces = tuple(range(len(_PIECES)))
+        equator_flip = False
+
+        for layer, amount, _ in self._ops:
+            entry = _shape_moves(shape)[layer][amount]
+
+            if entry is None:
+                self._effects[start_shape] = None
+                return None
+
+            shape, getter = entry
+            pieces = getter(pieces)
+            equator_flip ^= layer == 3
+
+        effect = self._effects[start_shape] = (shape, _getter(pieces), equator_flip, pieces)
+
+        return effect
+
+    def effect(self, shape: int = _SOLVED_SHAPE):
+        """
+        Returns the algorithm's net effect from the starting shape `shape`
+        (solved cubeshape by default) as a tuple of the resulting shape,
+        the piece permutation (new piece i = old piece `permutation[i]`)
+        and whether the equator flips.
+
+        Returns None if the algorithm can't be applied from `shape`.
+        """
+
+        effect = self._effect(shape)
+
+        return None if effect is None else (effect[0], effect[3], effect[2])
+
+    def is_legal_from(self, shape: int = _SOLVED_SHAPE) -> bool:
+        """Returns True if the algorithm can be applied from the starting shape `shape` (False otherwise)."""
+
+        return self._effect(shape) is not None
+
+    def apply_to(self, square1) -> bool:
+        """
+        Applies the algorithm to the input Square1 or FastSquare1 `square1`
+        and returns True (if successful).
+
+        Leaves `square1` in its previous state and returns False if the
+        algorithm can't be applied from its current shape.
+        """
+
+        if isinstance(square1, FastSquare1):
+            effect = self._effects.get(square1.shape) or self._effect(square1.shape)
+
+            if effect is None:
+                return False
+
+            if _COUNTING:
+                _count_moves(self.segments)
+
+            square1._record(square1.snapshot())
+            square1.shape = effect[0]
+            square1.pieces = effect[1](square1.pieces)
+            square1.equator_flipped ^= effect[2]
+        else:
+            top = [_PIECE_IDS[piece] for piece in square1.top.current_state]
+            pieces = top + [_PIECE_IDS[piece] for piece in square1.bottom.current_state]
+            effect = self._effect(_layer_mask(top) | (_layer_mask(pieces[len(top):]) << 12))
+
+            if effect is None:
+                return False
+
+            if _COUNTING:
+                _count_moves(self.segments)
+
+            state = ''.join(map(_PIECES.__getitem__, effect[1](pieces)))
+            n_top = _shape_moves(effect[0])[0]
+            square1._record(square1.snapshot())
+            square1.top.current_state = state[:n_top]
+            square1.bottom.current_state = state[n_top:]
+            square1.equator_flipped ^= effect[2]
+
+        square1.error_message = ""
+
+        return True
+
+    def __mul__(self, other: "CompiledAlg") -> "CompiledAlg":
+        """Returns the CompiledAlg of this algorithm followed by the CompiledAlg `other`."""
+
+        if not isinstance(other, CompiledAlg):
+            return NotImplemented
+
+        return _compile_normalized(_format_alg(_join_segments((self.segments, other.segments))))
+
+    def __pow__(self, power: int) -> "CompiledAlg":
+        """Returns the CompiledAlg of this algorithm done `power` times in a row (the inverse's if `power` is negative)."""
+
+        if not isinstance(power, int):
+            return NotImplemented
+
+        if power < 0:
+            return self.inverse() ** -power
+
+        return _compile_normalized(_format_alg(_join_segments((self.segments,) * power)))
+
+    def inverse(self) -> "CompiledAlg":
+        """
+        Returns the CompiledAlg that undoes this algorithm (the same
+        inversion `apply_alg` does for cases).
+        """
+
+        return compile_alg(self.alg, True)
+
+    def order(self, shape: int = _SOLVED_SHAPE):
+        """
+        Returns the number of times the algorithm has to be done in a row
+        from the starting shape `shape` (solved cubeshape by default) to get
+        back to the starting state, or None if it can't be done that many
+        times.
+
+        Notes:
+            Works out the net effect (from each shape it goes through) once
+            and then the order of the permutation from its cycles, instead
+            of doing the algorithm over and over.
+        """
+
+        start_shape = shape
+        permutation = tuple(range(len(_PIECES)))
+        equator_flip = False
+        repeats = 0
+
+        while True:  # until the algorithm gets back to the starting shape
+            effect = self._effect(shape)
+
+            if effect is None:
+                return None
+
+            shape = effect[0]
+            permutation = effect[1](permutation)
+            equator_flip ^= effect[2]
+            repeats += 1
+
+            if shape == start_shape:
+                break
+
+        order = 2 if equator_flip else 1
+
+        for cycle in _cycles(permutation):
+            order = order * len(cycle) // math.gcd(order, len(cycle))
+
+        return repeats * order
+
+    def cycles(self, square1=None) -> list:
+        """
+        Returns the cycles of pieces the algorithm moves when applied to
+        `square1` (a solved Square1 by default) as tuples of their names,
+        where each piece moves to where the next one was (and the last one
+        to where the first one was).
+
+        Raises a ValueError if the algorithm can't be applied to `square1`
+        or doesn't leave it in the same shape (so the pieces don't move
+        between places).
+        """
+
+        if square1 is None:
+            square1 = FastSquare1()
+
+        effect = self._effect(_square1_shape(square1))
+
+        if effect is None or effect[0] != _square1_shape(square1):
+            raise ValueError(f'"{self.alg}" has to be applied without changing the shape to have cycles.')
+
+        names = str(square1).replace("/", "").replace("-", "")
+
+        return [tuple(names[position] for position in cycle) for cycle in _cycles(effect[3])]
+
+
+def _cycles(permutation: tuple) -> list:
+    """
+    Returns the cycles (longer than one) of positions of the permutation
+    `permutation` (new piece i = old piece `permutation[i]`), where the
+    piece at each position moves to the next position.
+    """
+
+    moves_to = [0] * len(permutation)
+
+    for new, old in enumerate(permutation):
+        moves_to[old] = new
+
+    seen = set()
+    cycles = []
+
+    for start in range(len(permutation)):
+        if start in seen or moves_to[start] == start:
+            continue
+
+        cycle = [start]
+        seen.add(start)
+
+        while moves_to[cycle[-1]] != start:
+            cycle.append(moves_to[cycle[-1]])
+            seen.add(cycle[-1])
+
+        cycles.append(tuple(cycle))
+
+    return cycles
+
+
+@lru_cache(maxsize=1024)
+def _compile_normalized(alg: str) -> CompiledAlg:
+    """Compiles the normalized algorithm `alg` (LRU-cached)."""
+
+    return CompiledAlg(alg, _alg_segments(alg))
+
+
+@lru_cache(maxsize=4096)
+def _compile_input(alg: str, for_case: bool):
+    """Compiles the raw input algorithm `alg` (LRU-cached), returning None if it has a syntax error."""
+
+    try:
+        return compile_alg(alg, for_case)
+    except ValueError:
+        return None
+
+
+def compile_alg(alg: str, for_case: bool = False) -> CompiledAlg:
+    """
+    Compiles the input algorithm `alg` (inverted if `for_case = True`, the
+    same way `apply_alg` treats cases) into a reusable CompiledAlg.
+
+    Compiled algorithms are kept in a bounded LRU cache keyed by their
+    normalized algorithm string.
+
+    Raises a ValueError if `alg` has a syntax error.
+    """
+
+    return _compile_normalized(_format_alg(_alg_segments(alg, for_case)))
+
+
+def _square1_shape(square1) -> int:
+    """Returns the shape of the input Square1 or FastSquare1 `square1`."""
+
+    if isinstance(square1, FastSquare1):
+        return square1.shape
+
+    top = [_PIECE_IDS[piece] for piece in square1.top.current_state]
+    bottom = [_PIECE_IDS[piece] for piece in square1.bottom.current_state]
+
+    return _layer_mask(top) | (_layer_mask(bottom) << 12)
+
+
+def validate_alg(alg: str, for_case: bool = False, square1=None) -> Square1Error:
+    """
+    Returns the error (an AlgSyntaxError or IllegalMoveError) that applying
+    the input algorithm `alg` to `square1` (solved by default) would give,
+    or None if it can be applied.
+
+    Nothing is changed, printed, logged or raised, whatever the error
+    policy.
+    """
+
+    return _first_error(_SOLVED_SHAPE if square1 is None else _square1_shape(square1), alg, _split_moves(alg), for_case)[2]
+
+
+def validate_state(state: str) -> Square1Error:
+    """
+    Returns the InvalidStateError that applying the input state `state`
+    would give, or None if it is a valid state.
+
+    Nothing is changed, printed, logged or raised, whatever the error
+    policy.
+    """
+
+    try:
+        _parse_state([piece for piece in state.upper() if piece != " "])
+    except InvalidStateError as error:
+        return error
+
+    return None
+
+
+def iter_states(alg: str, for_case: bool = False, square1=None, compact: bool = False):
+    """
+    Lazily yields the state after each move of the input algorithm `alg`
+    (each `Turn` and `SLASH` of `parse_alg(alg, for_case)`) applied to
+    `square1` (solved by default, and left unchanged).
+
+    The states are state strings (like `str(square1)`), or their `rank` if
+    `compact = True`.
+
+    Raises an AlgSyntaxError if `alg` has a syntax error (before yielding
+    anything) or an IllegalMoveError once it gets to a move that can't be
+    done, whatever the error policy.
+
+    Notes:
+        Each state is worked out from the one before it with a table
+        lookup, so going through every move is about as fast as `apply_alg`
+        and stopping early skips the rest of the work.
+    """
+
+    if square1 is None:
+        square1 = FastSquare1()
+
+    if isinstance(square1, FastSquare1):
+        shape, pieces = square1.shape, square1.pieces
+    else:
+        shape = _square1_shape(square1)
+        pieces = tuple(_PIECE_IDS[piece] for piece in square1.top.current_state + square1.bottom.current_state)
+
+    equator_flipped = square1.equator_flipped
+
+    split = _split_moves(alg)
+
+    for i, (top, bottom) in enumerate([(top, bottom) for _, top, bottom in _iter_segments(alg, split, for_case)]):
+        moves = _shape_moves(shape)
+
+        if i:
+            if moves[3][0] is None:
+                raise _illegal_move(alg, split, i - 1, for_case, "unsliceable layer")
+
+            shape, getter = moves[3][0]
+            pieces = getter(pieces)
+            equator_flipped = not equator_flipped
+            moves = _shape_moves(shape)
+
+            yield _rank_state(shape, pieces, equator_flipped) if compact else _state_string(moves[0], pieces, equator_flipped)
+
+        if top or bottom:
+            for layer, amount in ((1, top % 12), (2, bottom % 12)):
+                if amount:
+                    if moves[layer][amount] is None:
+                        raise _illegal_move(alg, split, i, for_case, "incomplete turn")
+
+                    shape, getter = moves[layer][amount]
+                    pieces = getter(pieces)
+                    moves = _shape_moves(shape)
+
+            yield _rank_state(shape, pieces, equator_flipped) if compact else _state_string(moves[0], pieces, equator_flipped)
+
+
+def _state_string(n_top: int, pieces, equator_flipped: bool) -> str:
+    """Returns the state string of the piece ids `pieces` (the first `n_top` on top) and equator `equator_flipped`."""
+
+    state = ''.join(map(_PIECES.__getitem__, pieces))
+
+    return f"{state[:n_top]}{'/' if equator_flipped else '-'}{state[n_top:]}"
+
+
+_TURN_ORDER = sorted(range(12), key=lambda amount: abs((amount + 5) % 12 - 5))  # smallest turns first
+
+
+def _layer_turns_from(shape: int, pieces):
+    """
+    Yields the (top, bottom) turn amounts (smallest first), resulting
+    shape and piece permutation of every turn of both layers from the
+    shape `shape` with the piece ids `pieces`.
+    """
+
+    top_turns = _shape_moves(shape)[1]
+
+    for a in _TURN_ORDER:
+        top_entry = top_turns[a] if a else (shape, None)
+
+        if top_entry is None:
+            continue
+
+        top_pieces = pieces if top_entry[1] is None else top_entry[1](pieces)
+        bottom_turns = _shape_moves(top_entry[0])[2]
+
+        for b in _TURN_ORDER:
+            bottom_entry = bottom_turns[b] if b else (top_entry[0], None)
+
+            if bottom_entry is not None:
+                yield (a, b), bottom_entry[0], top_pieces if bottom_entry[1] is None else bottom_entry[1](top_pieces)
+
+
+@lru_cache(maxsize=256)
+def _one_slash_effects(shape: int) -> dict:
+    """
+    Returns the (top, bottom) turn amounts of the shortest "(a,b) / (c,d)"
+    that gets to each (resulting shape, piece permutation) from the shape
+    `shape` (LRU-cached).
+    """
+
+    effects = {}
+
+    for first, turned, pieces in _layer_turns_from(shape, _IDENTITY):
+        slash = _shape_moves(turned)[3][0]
+
+        if slash is None:
+            continue
+
+        for second, result, result_pieces in _layer_turns_from(slash[0], slash[1](pieces)):
+            if (result, result_pieces) not in effects:
+                effects[(result, result_pieces)] = (first, second)
+
+    return effects
+
+
+def _segments_effect(shape: int, segments) -> tuple:
+    """
+    Returns the resulting shape and piece permutation of the turn amounts
+    `segments` (with a slash between each of them) from the shape `shape`,
+    or None if they can't be applied.
+    """
+
+    pieces = _IDENTITY
+
+    for layer, amount, _ in _segment_ops(segments):
+        entry = _shape_moves(shape)[layer][amount]
+
+        if entry is None:
+            return None
+
+        shape = entry[0]
+        pieces = entry[1](pieces)
+
+    return shape, pieces
+
+
+def simplify_alg(alg: str, square1=None) -> str:
+    """
+    Returns an equivalent algorithm to the input algorithm `alg` that is
+    no longer than it: turns between the same slashes are merged, "/ /"
+    cancels out, turn amounts are reduced to the range -5 to 6 and (0,0)
+    turns are dropped.
+
+    If a Square1 or FastSquare1 `square1` is given, moves that only cancel
+    out because of its current shape are removed as well (any three
+    slashes that have the same effect as a single one), so the result is
+    only equivalent when applied to that shape.
+
+    Raises an AlgSyntaxError (a ValueError) if `alg` has a syntax error.
+    """
+
+    segments = _join_segments([_parse_segments(alg)])
+
+    if square1 is not None:
+        start = _square1_shape(square1)
+        shape = start
+        i = 0
+
+        while i + 3 < len(segments):
+            effect = _segments_effect(shape, segments[i:i + 4])
+
+            if effect is None:
+                break  # illegal from here on, so nothing else is known to be equivalent
+
+            replacement = _one_slash_effects(shape).get(effect)
+
+            if replacement is not None:
+                # the new turns can cancel with the ones before them, so start over
+                segments = _join_segments([segments[:i] + list(replacement) + segments[i + 4:]])
+                shape = start
+                i = 0
+                continue
+
+            shape = _segments_effect(shape, segments[i:i + 1] + [(0, 0)])[0]
+            i += 1
+
+    return _format_alg(segments)
+
+
+def _numpy():
+    """Imports NumPy for the batch functions (an optional dependency)."""
+
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError('The batch functions need NumPy. Install it with "pip install virtual-sq1[numpy]".') from None
+
+    return numpy
+
+
+def _batch_program(compiled: CompiledAlg) -> tuple:
+    """
+    Converts the CompiledAlg `compiled` into a single gather over the 24
+    units of a batch state, the unit pairs that must hold different pieces
+    for every move to be legal (a corner is never cut in half), and whether
+    the equator flips.
+    """
+
+    program = getattr(compiled, "_batch", None)
+
+    if program is not None:
+        return program
+
+    units = list(range(24))
+    checks = set()
+    equator_flip = False
+
+    for layer, amount, _ in compiled._ops:
+        if layer == 3:
+            checks.update(((units[5], units[6]), (units[17], units[18])))
+            units = units[:6] + units[12:18] + units[6:12] + units[18:]
+            equator_flip = not equator_flip
+        else:
+            offset = 0 if layer == 1 else 12
+            layer_units = units[offset:offset + 12]
+            layer_units = layer_units[-amount:] + layer_units[:-amount]
+            units[offset:offset + 12] = layer_units
+            checks.update(((layer_units[0], layer_units[11]), (layer_units[5], layer_units[6])))
+
+    checks = sorted(checks)
+    program = compiled._batch = (units, [a for a, _ in checks], [b for _, b in checks], equator_flip)
+
+    return program
+
+
+def encode_states(states) -> tuple:
+    """
+    Encodes the input states `states` (strings like `str(square1)`) into
+    an (N, 24) uint8 array and an (N,) bool array of equator flips.
+
+    Each row of the array holds a piece's symbol in every 30-degree unit
+    it covers (so corners appear twice), top layer first, both layers
+    starting just clockwise of the slice.
+
+    Raises a ValueError if a state isn't in that form.
+    """
+
+    np = _numpy()
+    units = []
+    equator = []
+
+    for state in states:
+        separator = max(state.find("/"), state.find("-"))
+        pieces = state[:separator] + state[separator + 1:]
+
+        if separator < 0 or sorted(pieces) != sorted(_PIECES):
+            raise ValueError(f'Invalid state "{state}".')
+
+        top = ''.join([piece * _PIECE_WIDTHS[_PIECE_IDS[piece]] for piece in state[:separator]])
+        bottom = ''.join([piece * _PIECE_WIDTHS[_PIECE_IDS[piece]] for piece in state[separator + 1:]])
+
+        if len(top) != 12:
+            raise ValueError(f'Invalid state "{state}".')
+
+        units.append(top + bottom)
+        equator.append(state[separator] == "/")
+
+    encoded = np.frombuffer(''.join(units).encode("ascii"), dtype=np.uint8).reshape(len(units), 24)
+
+    return encoded.copy(), np.array(equator, dtype=bool)
+
+
+def decode_states(units, equator) -> list:
+    """Decodes an (N, 24) array `units` and (N,) array `equator` from `encode_states` back into state strings."""
+
+    np = _numpy()
+    units = np.asarray(units, dtype=np.uint8)
+    starts = np.ones(units.shape, dtype=bool)
+    starts[:, 1:] = units[:, 1:] != units[:, :-1]
+    starts[:, 12] = True
+    decoded = []
+
+    for row, row_starts, flipped in zip(units, starts, equator):
+        top = row[:12][row_starts[:12]].tobytes().decode("ascii")
+        bottom = row[12:][row_starts[12:]].tobytes().decode("ascii")
+        decoded.append(f"{top}/{bottom}" if flipped else f"{top}-{bottom}")
+
+    return decoded
+
+
+def batch_apply_alg(units, equator, algs, for_case: bool = False) -> tuple:
+    """
+    Applies algorithms to a whole batch of states at once (see
+    `encode_states` for the encoding of `units` and `equator`).
+
+    `algs` is either one algorithm for every row or a sequence with one
+    algorithm per row. If `for_case = True`, each row is changed so that
+    its algorithm brings it to its current state (like `apply_alg`).
+
+    Returns the new (N, 24) units, the new (N,) equator flips and an (N,)
+    bool mask of the rows where the algorithm was legal. Illegal rows
+    (including syntax errors) are left in their previous state.
+    """
+
+    np = _numpy()
+    units = np.asarray(units, dtype=np.uint8)
+    equator = np.asarray(equator, dtype=bool)
+    new_units = units.copy()
+    new_equator = equator.copy()
+    legal = np.zeros(len(units), dtype=bool)
+
+    if isinstance(algs, str):
+        groups = {algs: slice(None)}
+    else:
+        groups = {}
+
+        for row, alg in enumerate(algs):
+            groups.setdefault(alg, []).append(row)
+
+    for alg, rows in groups.items():
+        compiled = _compile_input(alg, for_case)
+
+        if compiled is None:
+            continue
+
+        gather, check_a, check_b, equator_flip = _batch_program(compiled)
+        group_units = units[rows]
+        group_legal = np.all(group_units[:, check_a] != group_units[:, check_b], axis=1)
+        new_units[rows] = np.where(group_legal[:, None], group_units[:, gather], group_units)
+        new_equator[rows] = equator[rows] ^ (group_legal & equator_flip)
+        legal[rows] = group_legal
+
+    return new_units, new_equator, legal
+
+
+_N_PERMUTATIONS = math.factorial(8)  # orders of the 8 corners (or the 8 edges)
+_PERMUTATION_RANKS = {}  # positions of the 8 corners (or edges) as bytes -> rank (filled on first use)
+_RANK_MAPS = {}  # corner/edge order permutation -> permutation rank permutation
+_IDENTITY = tuple(range(len(_PIECES)))
+_NEAR_DEPTH = 4  # the exact distance of every state up to this many slashes from solved is stored
+_SEARCH_TABLES = None
+_TABLES_MAGIC = b"VSQ1TBLS"
+_TABLES_VERSION = 3
+_TABLES_HEADER = "<8s11I"  # magic, version, then the number of shapes, moves, permutations, rank maps, classes,
+# symmetries, turn pairs, children, near keys and ranks
+_TABLES_MOVE = "<BBHHHH"  # layer, amount, new shape index, permutation, corner map, edge map
+_TABLES_CLASS = "<HHH"  # turn class, corner map, edge map (of every shape index and of every class symmetry)
+_TABLES_TURN_PAIR = "<BBHHHHH"  # top, bottom, top corner/edge maps, bottom corner/edge maps, new shape index
+_TABLES_CHILD = "<BBB7H"  # slashes needed, top, bottom, top/bottom/slash corner/edge maps, new shape index
+
+_SearchTables = namedtuple("_SearchTables", (
+    "shape_index",  # reachable shape -> shape index
+    "moves",  # shape index -> (top turns, bottom turns, slash) search moves
+    "classes",  # shape index -> (turn class, corner rank map, edge rank map) into the class's ranks
+    "symmetries",  # turn class -> ((corner rank map, edge rank map) of every turn that keeps its shape) or None
+    "shape_distances",  # (shape index, equator) -> slashes
+    "corner_distances",  # (turn class, equator, corner rank) -> slashes
+    "edge_distances",  # (turn class, equator, edge rank) -> slashes
+    "near_distances",  # near key (see `_near_key`) -> slashes, up to _NEAR_DEPTH
+    "turn_pairs",  # shape index -> every (top, bottom) turn (see `_turn_pairs`)
+    "children",  # (shape index, equator) -> every (top, bottom) turn and slash (see `_search_children`)
+))
+
+
+class _SearchTimeout(Exception):
+    """Raised inside the solver's search when its time limit runs out."""
+
+
+class _TableRows(Sequence):
+    """
+    A read-only sequence of rows of the solver's tables, each one built
+    (and kept) the first time it's used, so loading the tables from a file
+    doesn't have to build them all.
+    """
+
+    __slots__ = ("_rows", "_build")
+
+    def __init__(self, length: int, build) -> None:
+        """Initializes the sequence with `length` rows, where `build(k)` builds row k."""
+
+        self._rows = [None] * length
+        self._build = build
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __getitem__(self, k: int):
+        row = self._rows[k]
+
+        if row is None:
+            row = self._rows[k] = self._build(k)
+
+        return row
+
+
+class _NearTable(Mapping):
+    """
+    The near distances table (see `_near_distances`) of a tables file: its
+    keys sorted in a memory-mapped array, searched by bisection, with the
+    distance of each key at the same index of another one.
+    """
+
+    __slots__ = ("_keys", "_distances")
+
+    def __init__(self, keys, distances) -> None:
+        """Initializes the table with the sorted keys `keys` and their distances `distances`."""
+
+        self._keys = keys
+        self._distances = distances
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __getitem__(self, key: int) -> int:
+        distance = self.get(key)
+
+        if distance is None:
+            raise KeyError(key)
+
+        return distance
+
+    def get(self, key: int, default=None):
+        k = bisect_left(self._keys, key)
+
+        return self._distances[k] if k < len(self._keys) and self._keys[k] == key else default
+
+
+def _permutation_rank_table() -> dict:
+    """Returns the (cached) rank of every order of 8 corners (or edges), keyed by the bytes of their positions."""
+
+    if not _PERMUTATION_RANKS:
+        _PERMUTATION_RANKS.update((bytes(positions), rank) for rank, positions in enumerate(permutations(range(8))))
+
+    return _PERMUTATION_RANKS
+
+
+def _permutation_ranks(pieces) -> tuple:
+    """Returns the ranks of the order of the corners and of the order of the edges of `pieces`."""
+
+    corners = bytearray(8)
+    edges = bytearray(8)
+    n_corners = 0
+    n_edges = 0
+
+    for piece in pieces:
+        if piece < 8:
+            corners[piece] = n_corners
+            n_corners += 1
+        else:
+            edges[piece - 8] = n_edges
+            n_edges += 1
+
+    ranks = _permutation_rank_table()
+
+    return ranks[bytes(corners)], ranks[bytes(edges)]
+
+
+def _rank_map(order: tuple) -> tuple:
+    """
+    Returns the (cached) permutation of permutation ranks caused by moving
+    the new corner/edge k to the old corner/edge `order[k]`.
+
+    Notes:
+        Rank maps are tuples rather than arrays because the search indexes
+        them millions of times (and a tuple hands back its stored ints
+        instead of making new ones).
+    """
+
+    rank_map = _RANK_MAPS.get(order)
+
+    if rank_map is None:
+        moved = bytearray(256)  # old position -> new position, as a bytes.translate table
+
+        for new, old in enumerate(order):
+            moved[old] = new
+
+        ranks = _permutation_rank_table()
+        rank_map = _RANK_MAPS[order] = tuple([ranks[positions.translate(moved)] for positions in ranks])
+
+    return rank_map
+
+
+def _inverse_order(order: tuple) -> tuple:
+    """Returns the corner/edge order permutation that undoes `order`."""
+
+    inverse = [0] * len(order)
+
+    for new, old in enumerate(order):
+        inverse[old] = new
+
+    return tuple(inverse)
+
+
+@lru_cache(maxsize=None)
+def _piece_positions(shape: int) -> tuple:
+    """Returns the positions (in piece order) of the corners and of the edges of the shape `shape`."""
+
+    widths = []
+
+    for mask in (shape & 0xFFF, shape >> 12):
+        for unit in range(12):
+            if mask >> unit & 1:
+                widths.append(1 if mask >> ((unit + 1) % 12) & 1 else 2)
+
+    return (tuple(i for i in range(len(widths)) if widths[i] == 2),
+            tuple(i for i in range(len(widths)) if widths[i] == 1))
+
+
+def _piece_orders(shape: int, new_shape: int, permutation: tuple) -> tuple:
+    """
+    Returns the corner and edge order permutations caused by reordering the
+    pieces of the shape `shape` with `permutation` (into the shape
+    `new_shape`).
+    """
+
+    orders = []
+
+    for old_positions, new_positions in zip(_piece_positions(shape), _piece_positions(new_shape)):
+        old_index = {position: k for k, position in enumerate(old_positions)}
+        orders.append(tuple(old_index[permutation[i]] for i in new_positions))
+
+    return tuple(orders)
+
+
+def _search_move(shape: int, entry: tuple, amount: int, shape_index: dict) -> tuple:
+    """
+    Converts a turn/slash table entry `entry` from the shape `shape` into a
+    search move: (amount, new shape index, itemgetter, corner rank map,
+    edge rank map), where shapes are indexed by `shape_index`.
+    """
+
+    new_shape, getter = entry
+    corner_order, edge_order = _piece_orders(shape, new_shape, getter(_IDENTITY))
+
+    return (amount, shape_index[new_shape], getter, _rank_map(corner_order), _rank_map(edge_order))
+
+
+def _shape_turns(shape: int) -> list:
+    """Returns the new shape and the piece permutation of every legal (top, bottom) turn of the shape `shape`."""
+
+    turns = []
+
+    for top_entry in _shape_moves(shape)[1]:
+        if top_entry is not None:
+            for bottom_entry in _shape_moves(top_entry[0])[2]:
+                if bottom_entry is not None:
+                    turns.append((bottom_entry[0], bottom_entry[1](top_entry[1](_IDENTITY))))
+
+    return turns
+
+
+def _turn_classes(shape_index: dict) -> tuple:
+    """
+    Groups the shapes of `shape_index` into turn classes (shapes that only
+    differ by a (top, bottom) turn) and returns the class and the corner and
+    edge orders of the turn into the class's smallest shape of every shape
+    index, and the corner and edge orders of every turn that keeps the
+    smallest shape of each class (doing nothing first).
+
+    Notes:
+        Turns are free in the twist metric, so the permutation pruning
+        tables count ranks in the smallest shape of each class instead of
+        in every shape (170 classes instead of 3678 shapes).
+    """
+
+    classes = []
+    symmetries = []
+    class_index = {}
+
+    for shape in shape_index:
+        turns = _shape_turns(shape)
+        smallest = min(new_shape for new_shape, _ in turns)
+
+        if smallest not in class_index:
+            class_index[smallest] = len(symmetries)
+            symmetries.append([_piece_orders(smallest, smallest, permutation)
+                               for new_shape, permutation in _shape_turns(smallest) if new_shape == smallest])
+
+        permutation = next(permutation for new_shape, permutation in turns if new_shape == smallest)
+        classes.append((class_index[smallest], *_piece_orders(shape, smallest, permutation)))
+
+    return classes, symmetries
+
+
+def _class_moves(moves: list, classes: list, n_classes: int) -> list:
+    """
+    Returns the slash out of every shape of every turn class as (corner rank
+    maps, edge rank maps, new class), where each of the rank maps tuples
+    goes from the class's ranks to the shape's ranks, through the slash and
+    into the new class's ranks.
+    """
+
+    class_moves = [[] for _ in range(n_classes)]
+
+    for i, (class_, corner_order, edge_order) in enumerate(classes):
+        slash = moves[i][2]
+        new_class, new_corner_order, new_edge_order = classes[slash[1]]
+        class_moves[class_].append((
+            (_rank_map(_inverse_order(corner_order)), slash[3], _rank_map(new_corner_order)),
+            (_rank_map(_inverse_order(edge_order)), slash[4], _rank_map(new_edge_order)),
+            new_class,
+        ))
+
+    return class_moves
+
+
+def _shape_distances(moves: list, solved: int) -> bytearray:
+    """
+    Breadth-first searches from the solved shape index `solved` and returns
+    the number of slashes needed to reach it from every (shape index,
+    equator) node, where turns are free (twist metric).
+    """
+
+    distances = bytearray(b"\xff") * (len(moves) * 2)
+    distances[solved * 2] = 0
+    frontier = [(solved, False)]
+    depth = 0
+
+    while frontier:
+        for i, equator in frontier:  # grows while iterating: every turn is free
+            top_turns, bottom_turns, _ = moves[i]
+
+            for move in top_turns + bottom_turns:
+                if distances[move[1] * 2 + equator] == 255:
+                    distances[move[1] * 2 + equator] = depth
+                    frontier.append((move[1], equator))
+
+        depth += 1
+        next_frontier = []
+
+        for i, equator in frontier:
+            slash = moves[i][2]
+
+            if slash is not None and distances[slash[1] * 2 + (not equator)] == 255:
+                distances[slash[1] * 2 + (not equator)] = depth
+                next_frontier.append((slash[1], not equator))
+
+        frontier = next_frontier
+
+    return distances
+
+
+def _permutation_distances(class_moves: list, symmetries: list, which: int, goal: tuple) -> bytearray:
+    """
+    Breadth-first searches from the goal node `goal` and returns the number
+    of slashes needed to reach it from every (turn class, equator,
+    permutation rank) node, where turns are free (twist metric).
+
+    `which` is 0 for the corners' ranks and 1 for the edges' ranks.
+
+    Notes:
+        There are 170 * 2 * 8! nodes, so the search uses NumPy when it's
+        installed (a few seconds) and plain Python when it isn't (a few
+        minutes).
+    """
+
+    twins = [[_rank_map(orders[which]) for orders in class_symmetries] for class_symmetries in symmetries]
+    distances = bytearray(b"\xff") * (len(symmetries) * 2 * _N_PERMUTATIONS)
+    goal_class, goal_rank = goal
+
+    for twin in twins[goal_class]:  # the same state, turned
+        distances[goal_class * 2 * _N_PERMUTATIONS + twin[goal_rank]] = 0
+
+    try:
+        np = _numpy()
+    except ImportError:
+        _python_permutation_search(distances, class_moves, twins, which, goal)
+    else:
+        _numpy_permutation_search(np, distances, class_moves, twins, which)
+
+    return distances
+
+
+def _numpy_permutation_search(np, distances: bytearray, class_moves: list, twins: list, which: int) -> None:
+    """Fills in `distances` (see `_permutation_distances`) a whole class and equator at a time with NumPy."""
+
+    arrays = {}  # id(rank map) -> the same map as an index array
+
+    for rank_map in _RANK_MAPS.values():
+        arrays[id(rank_map)] = np.array(rank_map, dtype=np.intp)
+
+    table = np.frombuffer(distances, dtype=np.uint8).reshape(len(twins) * 2, _N_PERMUTATIONS)
+    depth = 0
+    found = True
+
+    while found:
+        found = False
+
+        for class_, class_moves_ in enumerate(class_moves):
+            for equator in (0, 1):
+                ranks = np.flatnonzero(table[class_ * 2 + equator] == depth)
+
+                if not len(ranks):
+                    continue
+
+                for rank_maps in class_moves_:
+                    to_shape, slash, to_class = (arrays[id(rank_map)] for rank_map in rank_maps[which])
+                    new_class = rank_maps[2]
+                    new_ranks = to_class[slash[to_shape[ranks]]]
+                    new_ranks = new_ranks[table[new_class * 2 + 1 - equator, new_ranks] == 255]
+
+                    for twin in twins[new_class]:
+                        table[new_class * 2 + 1 - equator, arrays[id(twin)][new_ranks]] = depth + 1
+
+                    found = found or len(new_ranks) > 0
+
+        depth += 1
+
+
+def _python_permutation_search(distances: bytearray, class_moves: list, twins: list, which: int, goal: tuple) -> None:
+    """Fills in `distances` (see `_permutation_distances`) one node at a time in plain Python."""
+
+    goal_class, goal_rank = goal
+    frontier = [(goal_class, 0, [twin[goal_rank] for twin in twins[goal_class]])]
+    depth = 0
+
+    while frontier:
+        next_frontier = {}
+
+        for class_, equator, ranks in frontier:
+            for rank_maps in class_moves[class_]:
+                to_shape, slash, to_class = rank_maps[which]
+                new_class = rank_maps[2]
+                offset = (new_class * 2 + 1 - equator) * _N_PERMUTATIONS
+                new_ranks = next_frontier.setdefault((new_class, 1 - equator), [])
+
+                for rank in ranks:
+                    rank = to_class[slash[to_shape[rank]]]
+
+                    if distances[offset + rank] == 255:
+                        for twin in twins[new_class]:
+                            distances[offset + twin[rank]] = depth + 1
+                            new_ranks.append(twin[rank])
+
+        frontier = [(class_, equator, ranks) for (class_, equator), ranks in next_frontier.items() if ranks]
+        depth += 1
+
+
+def _near_key(offset: int, corner_rank: int, edge_rank: int, symmetries) -> int:
+    """
+    Returns the key of a state in the near distances table, where `offset`
+    is (turn class * 2 + equator) * 8!, the ranks are counted in the class's
+    smallest shape and `symmetries` are the class's symmetries (or None).
+
+    Notes:
+        A state turned by a symmetry of its class is the same state, so
+        the key is the smallest one of all of them.
+    """
+
+    if symmetries is None:
+        return (offset + corner_rank) * _N_PERMUTATIONS + edge_rank
+
+    return min((offset + corner_map[corner_rank]) * _N_PERMUTATIONS + edge_map[edge_rank]
+               for corner_map, edge_map in symmetries)
+
+
+def _near_distances(class_moves: list, symmetries: list, goal: tuple) -> dict:
+    """
+    Breadth-first searches from the goal node `goal` and returns the number
+    of slashes (up to _NEAR_DEPTH) needed to reach it from every (turn class,
+    equator, corner rank, edge rank) node that close to it, keyed by
+    `_near_key`.
+    """
+
+    twins = [[(_rank_map(corner_order), _rank_map(edge_order)) for corner_order, edge_order in class_symmetries]
+             for class_symmetries in symmetries]
+    keys = [None if len(class_twins) == 1 else class_twins for class_twins in twins]
+    goal_class, corner_rank, edge_rank = goal
+    distances = {_near_key(goal_class * 2 * _N_PERMUTATIONS, corner_rank, edge_rank, keys[goal_class]): 0}
+    frontier = [(goal_class, 0, corner_map[corner_rank], edge_map[edge_rank])
+                for corner_map, edge_map in twins[goal_class]]
+
+    for depth in range(1, _NEAR_DEPTH + 1):
+        next_frontier = []
+
+        for class_, equator, corner_rank, edge_rank in frontier:
+            for (corners_to_shape, corner_slash, corners_to_class), (edges_to_shape, edge_slash, edges_to_class), \
+                    new_class in class_moves[class_]:
+                new_corners = corners_to_class[corner_slash[corners_to_shape[corner_rank]]]
+                new_edges = edges_to_class[edge_slash[edges_to_shape[edge_rank]]]
+                key = _near_key((new_class * 2 + 1 - equator) * _N_PERMUTATIONS, new_corners, new_edges,
+                                keys[new_class])
+
+                if key not in distances:
+                    distances[key] = depth
+
+                    if depth < _NEAR_DEPTH:  # every turned copy of the state, so every slash out of it is tried
+                        next_frontier.extend((new_class, 1 - equator, corner_map[new_corners], edge_map[new_edges])
+                                             for corner_map, edge_map in twins[new_class])
+
+        frontier = next_frontier
+
+    return distances
+
+
+def _turn_pairs(moves: list) -> list:
+    """
+    Returns every (top, bottom) turn (doing nothing first) of every shape
+    index of the search moves `moves` as (top amount, bottom amount, top
+    corner rank map, top edge rank map, bottom corner rank map, bottom edge
+    rank map, new shape index).
+    """
+
+    identity = _rank_map(tuple(range(8)))
+    pairs = []
+
+    for i, (top_turns, _, _) in enumerate(moves):
+        shape_pairs = []
+
+        for top in ((0, i, None, identity, identity),) + top_turns:
+            for bottom in ((0, top[1], None, identity, identity),) + moves[top[1]][1]:
+                shape_pairs.append((top[0], bottom[0], top[3], top[4], bottom[3], bottom[4], bottom[1]))
+
+        pairs.append(shape_pairs)
+
+    return pairs
+
+
+def _search_children(moves: list, classes: list, symmetries: list, shape_distances, turn_pairs: list) -> list:
+    """
+    Returns every (top, bottom) turn followed by a slash out of every (shape
+    index, equator) node, sorted by the slashes the new shape still needs,
+    as (those slashes, top amount, bottom amount, the rank maps of the top
+    turn, the bottom turn and the slash (corners then edges), new shape
+    index, new pruning offset, new class rank maps, new class symmetries).
+    """
+
+    children = []
+
+    for i in range(len(moves)):
+        for equator in (0, 1):
+            node_children = []
+
+            for top, bottom, top_corners, top_edges, bottom_corners, bottom_edges, j in turn_pairs[i]:
+                slash = moves[j][2]
+
+                if slash is not None:
+                    node_children.append(_search_child(
+                        classes, symmetries, equator, shape_distances[slash[1] * 2 + (not equator)], top, bottom,
+                        top_corners, top_edges, bottom_corners, bottom_edges, slash[3], slash[4], slash[1],
+                    ))
+
+            node_children.sort(key=itemgetter(0))
+            children.append(node_children)
+
+    return children
+
+
+def _search_child(classes, symmetries, equator: bool, shape_distance: int, top: int, bottom: int, *rank_maps) -> tuple:
+    """
+    Returns a child (see `_search_children`) of a node with the equator
+    `equator`, given the slashes its new shape still needs, its turn
+    amounts and its rank maps followed by its new shape index.
+    """
+
+    new_i = rank_maps[-1]
+    class_, corner_map, edge_map = classes[new_i]
+
+    return (shape_distance, top, bottom) + rank_maps + (
+        (class_ * 2 + (not equator)) * _N_PERMUTATIONS, corner_map, edge_map, symmetries[class_])
+
+
+def _build_search_tables() -> tuple:
+    """
+    Builds the solver's tables: the index of every reachable shape, the
+    search moves of each shape, its turn class and the pruning tables
+    (slashes needed to solve the shape and equator, the order of the corners
+    and the order of the edges, and every state close to solved).
+    """
+
+    shape_index = {shape: i for i, shape in enumerate(_precompute_shape_moves())}
+    moves = []
+
+    for shape in shape_index:
+        _, top_turns, bottom_turns, (slash,) = _shape_moves(shape)
+        moves.append((
+            tuple(_search_move(shape, top_turns[amount], amount, shape_index)
+                  for amount in range(1, 12) if top_turns[amount]),
+            tuple(_search_move(shape, bottom_turns[amount], amount, shape_index)
+                  for amount in range(1, 12) if bottom_turns[amount]),
+            _search_move(shape, slash, 0, shape_index) if slash else None,
+        ))
+
+    class_orders, symmetry_orders = _turn_classes(shape_index)
+    class_moves = _class_moves(moves, class_orders, len(symmetry_orders))
+    solved_class, corner_order, edge_order = class_orders[shape_index[_SOLVED_SHAPE]]
+    corner_rank, edge_rank = _permutation_ranks(_SOLVED_PIECES)
+    corner_rank = _rank_map(corner_order)[corner_rank]
+    edge_rank = _rank_map(edge_order)[edge_rank]
+    symmetries = [None if len(orders) == 1 else tuple((_rank_map(corner_order), _rank_map(edge_order))
+                                                      for corner_order, edge_order in orders)
+                  for orders in symmetry_orders]
+
+    classes = [(class_, _rank_map(corner_order), _rank_map(edge_order)) for class_, corner_order, edge_order in class_orders]
+    shape_distances = _shape_distances(moves, shape_index[_SOLVED_SHAPE])
+    turn_pairs = _turn_pairs(moves)
+
+    return _SearchTables(
+        shape_index,
+        moves,
+        classes,
+        symmetries,
+        shape_distances,
+        _permutation_distances(class_moves, symmetry_orders, 0, (solved_class, corner_rank)),
+        _permutation_distances(class_moves, symmetry_orders, 1, (solved_class, edge_rank)),
+        _near_distances(class_moves, symmetry_orders, (solved_class, corner_rank, edge_rank)),
+        turn_pairs,
+        _search_children(moves, classes, symmetries, shape_distances, turn_pairs),
+    )
+
+
+def _packed_rows(groups, pack) -> tuple:
+    """Returns every row of every group of `groups` packed by `pack`, and the index where each group starts (and ends)."""
+
+    rows = []
+    offsets = [0]
+
+    for group in groups:
+        rows.extend(map(pack, group))
+        offsets.append(len(rows))
+
+    return rows, offsets
+
+
+def _table_sections(tables: tuple) -> list:
+    """Returns the sections of a tables file (see `generate_tables`) holding the solver's tables `tables`."""
+
+    getters = {}
+    rank_maps = {}  # id(rank map) -> (index, rank map): the maps are shared, and tuples of 8! ints are slow to hash
+
+    def map_index(rank_map):
+        return rank_maps.setdefault(id(rank_map), (len(rank_maps), rank_map))[0]
+
+    def pack_move(move):
+        layer, amount, new_i, getter, corner_map, edge_map = move
+        permutation = getters.setdefault(getter(_IDENTITY), len(getters))
+        return struct.pack(_TABLES_MOVE, layer, amount, new_i, permutation, map_index(corner_map), map_index(edge_map))
+
+    moves, move_offsets = _packed_rows((
+        [(1,) + move for move in top_turns] + [(2,) + move for move in bottom_turns] + [(3,) + slash] * (slash is not None)
+        for top_turns, bottom_turns, slash in tables.moves
+    ), pack_move)
+    pairs, pair_offsets = _packed_rows(tables.turn_pairs, lambda pair: struct.pack(
+        _TABLES_TURN_PAIR, *pair[:2], *map(map_index, pair[2:6]), pair[6]))
+    children, child_offsets = _packed_rows(tables.children, lambda child: struct.pack(
+        _TABLES_CHILD, *child[:3], *map(map_index, child[3:9]), child[9]))
+    offsets = array("I", move_offsets + pair_offsets + child_offsets)  # where each shape's (or node's) rows start
+    classes = [struct.pack(_TABLES_CLASS, class_, map_index(corner_map), map_index(edge_map))
+               for class_, corner_map, edge_map in tables.classes]
+    symmetries = [struct.pack(_TABLES_CLASS, class_, map_index(corner_map), map_index(edge_map))
+                  for class_, class_symmetries in enumerate(tables.symmetries) if class_symmetries is not None
+                  for corner_map, edge_map in class_symmetries]
+    maps = array("H")
+
+    for _, rank_map in rank_maps.values():
+        maps.extend(rank_map)
+
+    near_keys = array("Q", sorted(tables.near_distances))
+
+    if sys.byteorder == "big":  # the file is little-endian
+        for values in (offsets, maps, near_keys):
+            values.byteswap()
+
+    return [
+        struct.pack(_TABLES_HEADER, _TABLES_MAGIC, _TABLES_VERSION, len(tables.shape_index), len(moves), len(getters),
+                    len(rank_maps), len(tables.symmetries), len(symmetries), len(pairs), len(children), len(near_keys),
+                    _N_PERMUTATIONS),
+        struct.pack(f"<{len(tables.shape_index)}I", *tables.shape_index),
+        b"".join(bytes(permutation) for permutation in getters),
+        maps.tobytes(),
+        offsets.tobytes(),
+        b"".join(moves),
+        b"".join(classes),
+        b"".join(symmetries),
+        b"".join(pairs),
+        b"".join(children),
+        near_keys.tobytes(),
+        bytes(map(tables.near_distances.__getitem__, sorted(tables.near_distances))),
+        bytes(tables.shape_distances),
+        bytes(tables.corner_distances),
+        bytes(tables.edge_distances),
+    ]
+
+
+def generate_tables(path: str) -> None:
+    """
+    Writes the solver's tables (built first if needed) to the binary file
+    `path` (see `load_tables`).
+
+    Notes:
+        Besides the pruning tables, the file holds the search moves, turn
+        pairs and children of every shape, so loading it doesn't have to
+        derive them. Every section starts on a multiple of 8 bytes, so its
+        arrays can be used straight from the memory map.
+    """
+
+    with open(f"{path}.tmp", "wb") as file:
+        for section in _table_sections(_search_tables()):
+            file.write(section + bytes(-len(section) % 8))
+
+    os.replace(f"{path}.tmp", path)  # never leave a half-written file for other processes to map
+
+
+def _table_array(section: memoryview, typecode: str):
+    """
+    Returns the little-endian array of the type `typecode` in the tables
+    file section `section`, as a view of the memory map (or as a copy on
+    big-endian machines).
+    """
+
+    if sys.byteorder == "little":
+        return section.cast(typecode)
+
+    values = array(typecode, section)
+    values.byteswap()
+
+    return values
+
+
+def _load_search_tables(path: str) -> tuple:
+    """
+    Memory-maps the solver's tables from the binary file `path` (see
+    `generate_tables`).
+
+    Notes:
+        The rank maps, near keys and distances stay in the memory map (so
+        every process shares one copy through the page cache), and the
+        search moves, turn pairs and children of each shape are only turned
+        into tuples when the search first gets there.
+    """
+
+    with open(path, "rb") as file:
+        data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    view = memoryview(data)
+
+    # older versions have shorter headers, so check the magic and version first
+    if len(view) < struct.calcsize(_TABLES_HEADER) \
+            or struct.unpack_from("<8sI", view) != (_TABLES_MAGIC, _TABLES_VERSION):
+        raise ValueError(f'"{path}" isn\'t a version {_TABLES_VERSION} table file. Regenerate it with generate_tables.')
+
+    _, _, n_shapes, n_moves, n_permutations, n_rank_maps, n_classes, n_symmetries, n_pairs, n_children, n_near, \
+        n_ranks = struct.unpack_from(_TABLES_HEADER, view)
+    sizes = [
+        4 * n_shapes, 16 * n_permutations, 2 * n_ranks * n_rank_maps, 4 * (4 * n_shapes + 3),
+        struct.calcsize(_TABLES_MOVE) * n_moves, struct.calcsize(_TABLES_CLASS) * n_shapes,
+        struct.calcsize(_TABLES_CLASS) * n_symmetries, struct.calcsize(_TABLES_TURN_PAIR) * n_pairs,
+        struct.calcsize(_TABLES_CHILD) * n_children, 8 * n_near, n_near, 2 * n_shapes, n_classes * 2 * n_ranks,
+        n_classes * 2 * n_ranks,
+    ]
+    sections = []
+    offset = struct.calcsize(_TABLES_HEADER)
+
+    for size in sizes:
+        offset += -offset % 8
+        sections.append(view[offset:offset + size])
+        offset += size
+
+    if offset > len(view):
+        raise ValueError(f'"{path}" is truncated. Regenerate it with generate_tables.')
+
+    shapes, orders, maps, offsets, moves, classes, symmetries, pairs, children, near_keys, near_distances, \
+        *distances = sections
+    maps = _table_array(maps, "H")
+    rank_maps = [maps[k * n_ranks:(k + 1) * n_ranks] for k in range(n_rank_maps)]
+    getters = [_getter(tuple(orders[k * 16:(k + 1) * 16])) for k in range(n_permutations)]
+    offsets = _table_array(offsets, "I")
+    classes = [(class_, rank_maps[corner_map], rank_maps[edge_map])
+               for class_, corner_map, edge_map in struct.iter_unpack(_TABLES_CLASS, classes)]
+    turns = [[] for _ in range(n_classes)]  # the symmetries of each turn class
+
+    for class_, corner_map, edge_map in struct.iter_unpack(_TABLES_CLASS, symmetries):
+        turns[class_].append((rank_maps[corner_map], rank_maps[edge_map]))
+
+    symmetries = [tuple(class_turns) or None for class_turns in turns]
+
+    def rows(table, row_format, k, start):
+        # the rows of shape index (or node) k of a table, where its offsets start at `start`
+        size = struct.calcsize(row_format)
+        return struct.iter_unpack(row_format, table[offsets[start + k] * size:offsets[start + k + 1] * size])
+
+    def shape_moves(i):
+        layers = ([], [], [None])
+
+        for layer, amount, new_i, permutation, corner_map, edge_map in rows(moves, _TABLES_MOVE, i, 0):
+            layers[layer - 1].append((amount, new_i, getters[permutation], rank_maps[corner_map], rank_maps[edge_map]))
+
+        return tuple(layers[0]), tuple(layers[1]), layers[2][-1]
+
+    def shape_pairs(i):
+        return [(top, bottom, *map(rank_maps.__getitem__, pair_maps), j)
+                for top, bottom, *pair_maps, j in rows(pairs, _TABLES_TURN_PAIR, i, n_shapes + 1)]
+
+    def node_children(node):
+        return [_search_child(classes, symmetries, node % 2, shape_distance, top, bottom,
+                              *map(rank_maps.__getitem__, child_maps), new_i)
+                for shape_distance, top, bottom, *child_maps, new_i in rows(children, _TABLES_CHILD, node, 2 * n_shapes + 2)]
+
+    return _SearchTables(
+        {shape: i for i, shape in enumerate(_table_array(shapes, "I"))},
+        _TableRows(n_shapes, shape_moves),
+        classes,
+        symmetries,
+        *distances,
+        _NearTable(_table_array(near_keys, "Q"), near_distances),
+        _TableRows(n_shapes, shape_pairs),
+        _TableRows(2 * n_shapes, node_children),
+    )
+
+
+def load_tables(path: str) -> None:
+    """
+    Memory-maps the solver's tables from the binary file `path` (written by
+    `generate_tables`) instead of building them, so many processes can
+    share one read-only copy.
+
+    Raises a ValueError if `path` was written by an incompatible version.
+
+    Notes:
+        If the environment variable VIRTUAL_SQ1_TABLES is set, the tables
+        are loaded from that path the first time they're needed.
+    """
+
+    global _SEARCH_TABLES
+
+    _SEARCH_TABLES = _load_search_tables(path)
+
+
+def _search_tables() -> tuple:
+    """Returns the solver's tables (loaded or built on first use)."""
+
+    global _SEARCH_TABLES
+
+    if _SEARCH_TABLES is None:
+        if os.environ.get("VIRTUAL_SQ1_TABLES"):
+            _SEARCH_TABLES = _load_search_tables(os.environ["VIRTUAL_SQ1_TABLES"])
+        else:
+            _SEARCH_TABLES = _build_search_tables()
+
+    return _SEARCH_TABLES
+
+
+class _Search:
+    """
+    The iterative-deepening A* search of `solve` from a sliceable shape,
+    which adds the (top, bottom) turns of the solution to `path`.
+    """
+
+    __slots__ = ("tables", "face", "deadline", "nodes", "path", "solved", "solved_corners", "solved_edges")
+
+    def __init__(self, tables: tuple, face: bool, deadline: float = None) -> None:
+        """Initializes the search with the solver's tables `tables`, the metric and the time it has to end by."""
+
+        self.tables = tables
+        self.face = face
+        self.deadline = deadline
+        self.nodes = 0
+        self.path = []
+        self.solved = tables.shape_index[_SOLVED_SHAPE]
+        self.solved_corners, self.solved_edges = _permutation_ranks(_SOLVED_PIECES)
+
+    def heuristic(self, i: int, corner_rank: int, edge_rank: int, equator: bool) -> int:
+        """Returns the fewest slashes the pruning tables allow from the node."""
+
+        class_, corner_map, edge_map = self.tables.classes[i]
+        offset = (class_ * 2 + equator) * _N_PERMUTATIONS
+
+        return max(
+            self.tables.shape_distances[i * 2 + equator],
+            self.tables.corner_distances[offset + corner_map[corner_rank]],
+            self.tables.edge_distances[offset + edge_map[edge_rank]],
+        )
+
+    def finish(self, i: int, corner_rank: int, edge_rank: int, remaining: int) -> bool:
+        """Adds the last (top, bottom) turn to the path and returns True if one solves the node."""
+
+        for top, bottom, top_corners, top_edges, bottom_corners, bottom_edges, j in self.tables.turn_pairs[i]:
+            if j == self.solved and (self.face and bool(top or bottom)) <= remaining \
+                    and bottom_corners[top_corners[corner_rank]] == self.solved_corners \
+                    and bottom_edges[top_edges[edge_rank]] == self.solved_edges:
+                self.path.append((top, bottom))
+                return True
+
+        return False
+
+    def search(self, i: int, corner_rank: int, edge_rank: int, equator: bool, remaining: int, first: bool,
+               solvable: bool) -> bool:
+        """
+        Returns True (with the solution on the path) if the node can be
+        solved in `remaining` moves. `solvable` means every pruning table
+        says it's only a (top, bottom) turn away from solved.
+        """
+
+        self.nodes += 1
+
+        if self.deadline is not None and not self.nodes & 0x3FF and time.perf_counter() > self.deadline:
+            raise _SearchTimeout
+
+        if solvable and self.finish(i, corner_rank, edge_rank, remaining):
+            return True
+
+        face, path = self.face, self.path
+        corner_distances, edge_distances, near_distances = \
+            self.tables.corner_distances, self.tables.edge_distances, self.tables.near_distances
+
+        for shape_distance, top, bottom, top_corners, top_edges, bottom_corners, bottom_edges, slash_corners, \
+                slash_edges, new_i, offset, corner_map, edge_map, symmetries in self.tables.children[i * 2 + equator]:
+            if shape_distance >= remaining:
+                break  # so does every later child
+
+            limit = remaining - 1 - (face and bool(top or bottom))
+
+            # cheapest pruning table first, and "/ /" cancels out
+            if shape_distance > limit or not (first or top or bottom):
+                continue
+
+            new_corners = slash_corners[bottom_corners[top_corners[corner_rank]]]
+            corner_rank_ = corner_map[new_corners]
+            corner_distance = corner_distances[offset + corner_rank_]
+
+            if corner_distance > limit:
+                continue
+
+            new_edges = slash_edges[bottom_edges[top_edges[edge_rank]]]
+            edge_rank_ = edge_map[new_edges]
+            edge_distance = edge_distances[offset + edge_rank_]
+
+            if edge_distance > limit:
+                continue
+
+            if limit <= _NEAR_DEPTH and \
+                    near_distances.get(_near_key(offset, corner_rank_, edge_rank_, symmetries), 255) > limit:
+                continue
+
+            path.append((top, bottom))
+
+            if self.search(new_i, new_corners, new_edges, not equator, limit, False,
+                           not (shape_distance or corner_distance or edge_distance)):
+                return True
+
+            path.pop()
+
+        return False
+
+    def run(self, square1: FastSquare1, max_depth: int = None) -> list:
+        """
+        Searches from the FastSquare1 `square1` at each depth in turn and
+        returns the (top, bottom) turns of the first solution found (or None
+        if there's none up to `max_depth` moves).
+        """
+
+        i = self.tables.shape_index[square1.shape]
+        corner_rank, edge_rank = _permutation_ranks(square1.pieces)
+        distance = self.heuristic(i, corner_rank, edge_rank, square1.equator_flipped)
+
+        for depth in count(distance) if max_depth is None else range(distance, max_depth + 1):
+            self.path.clear()
+
+            if self.search(i, corner_rank, edge_rank, square1.equator_flipped, depth, True, distance == 0):
+                return self.path
+
+        return None
+
+
+def _fallback_solution(square1: FastSquare1) -> list:
+    """
+    Returns the (top, bottom) turns of a quick but long solution (about 80
+    slashes) of the FastSquare1 `square1`: a shortest path to cubeshape,
+    then a stabilizer chain fixing the corners, the edges and the equator
+    (the inverse of `_scramble_alg`).
+    """
+
+    return _parse_segments(_scramble_alg(square1.shape, square1.pieces, square1.equator_flipped), for_case=True)
+
+
+def solve(square1, metric: str = "twist", max_depth: int = None, time_limit: float = None) -> str:
+    """
+    Finds a shortest algorithm that solves the input Square1 or FastSquare1
+    `square1` (without changing it) using iterative-deepening A* with shape,
+    corner permutation and edge permutation pruning tables (the largest of
+    them bounds the search) and an exact table of the states close to
+    solved, and returns it.
+
+    `metric` is "twist" (every slash counts as one move) or "face" (every
+    slash and every (top, bottom) turn counts as one move).
+
+    `max_depth` limits the length (in `metric` moves) of the solutions the
+    search looks for and `time_limit` limits its time in seconds. Because
+    the search tries every shorter length first, the first solution found
+    within the budget is always a shortest one. If the budget runs out
+    first, the best solution found so far is returned instead: a quick but
+    long one (about 80 slashes, see `_fallback_solution`) found before the
+    search starts.
+
+    Notes:
+        The pruning tables are built the first time this is called, which
+        takes about ten seconds with NumPy installed and a few minutes
+        without it (see `load_tables` to load them from a file). Most
+        random states then take from a fraction of a second to a minute in
+        the twist metric, but the deepest ones (like "1A2B3C4D-5E6F7G8H")
+        take a few minutes, and the face metric is much slower, so set a
+        `time_limit` to bound it.
+    """
+
+    if metric not in ("twist", "face"):
+        raise ValueError(f'Unknown metric "{metric}" (expected "twist" or "face").')
+
+    start = FastSquare1()
+    start.apply_state(str(square1))
+    tables = _search_tables()
+
+    if start.shape not in tables.shape_index:
+        raise ValueError(f'"{start}" can\'t be solved (its shape can\'t be reached from solved).')
+
+    deadline = None if time_limit is None else time.perf_counter() + time_limit
+    best = None if max_depth is None and time_limit is None else _fallback_solution(start)
+
+    try:
+        solution = _Search(tables, metric == "face", deadline).run(start, max_depth)
+    except _SearchTimeout:
+        solution = None
+
+    return _format_alg(best if solution is None else solution)
+
+
+_SCRAMBLE_ALGS = (  # cubeshape-preserving algorithms (and their inverses) that generate every cubeshape state
+    "(3,0)",
+    "(0,3)",
+    "(1,0) / (-1,0)",
+    "/ (3,0) / (1,0) / (0,-3) / (-1,0) / (-3,0) / (1,0) / (0,3) / (-1,0)",
+    "/ (6,6) / (2,1)",
+    "/ (0,-3) / (-2,5) / (-4,4) / (-4,4) / (-5,2) / (-3,6) /",  # odd corner and edge parity
+)
+_SCRAMBLER = None  # (reachable shapes, shape paths, stabilizer chain)
+
+
+def _shape_paths(shapes: list) -> dict:
+    """
+    Returns the turn amounts of an algorithm with the fewest slashes from
+    solved cubeshape to each shape in `shapes`, along with the piece
+    permutation it causes.
+    """
+
+    paths = {_SOLVED_SHAPE: ([(0, 0)], _IDENTITY)}
+    queue = deque([_SOLVED_SHAPE])
+
+    while queue:
+        shape = queue.popleft()
+        segments, pieces = paths[shape]
+        n_top, top_turns, bottom_turns, (slash,) = _shape_moves(shape)
+
+        for layer, turns in ((0, top_turns), (1, bottom_turns)):
+            for amount, entry in enumerate(turns):
+                if entry is not None and (entry[0] not in paths or len(paths[entry[0]][0]) > len(segments)):
+                    last = list(segments[-1])
+                    last[layer] += amount
+                    paths[entry[0]] = (segments[:-1] + [tuple(last)], entry[1](pieces))
+                    queue.appendleft(entry[0])
+
+        if slash is not None and (slash[0] not in paths or len(paths[slash[0]][0]) > len(segments) + 1):
+            paths[slash[0]] = (segments + [(0, 0)], slash[1](pieces))
+            queue.append(slash[0])
+
+    return {shape: paths[shape] for shape in shapes}
+
+
+def _sift(levels: list, base: tuple, permutation: tuple, flip: bool, word: tuple, cost: int) -> None:
+    """
+    Sifts the element (`permutation`, `flip`) with the generator indices
+    `word` and cost `cost` through the stabilizer chain `levels` (fixing
+    the positions `base`, then the equator), storing it at the first level
+    where it's a new or cheaper coset representative.
+    """
+
+    for k, position in enumerate(base + (None,)):
+        value = flip if position is None else permutation[position]
+        entry = levels[k].get(value)
+
+        if entry is None or cost < entry[3]:
+            levels[k][value] = (permutation, flip, word, cost)
+
+            if entry is None:
+                return
+
+            permutation, flip, word, cost = entry
+
+        if position is None:
+            return
+
+        # strip the representative: what's left fixes this position
+        representative, representative_flip, representative_word, representative_cost = levels[k][value]
+        permutation = tuple(map(_inverse_order(representative).__getitem__, permutation))
+        flip ^= representative_flip
+        word = tuple(g ^ 1 for g in reversed(representative_word)) + word  # generators 2n and 2n + 1 are inverses
+        cost += representative_cost
+
+        if cost > 3000:
+            return
+
+
+def _fill_scramble_chain(levels: list, base: tuple, sizes: list, generators: list) -> None:
+    """
+    Fills the coset tables of the stabilizer chain `levels` (see `_sift`)
+    with the products of `generators` found by a breadth-first search,
+    then with products of representatives until every level has `sizes`
+    entries, and for one round after that.
+    """
+
+    seen = {(_IDENTITY, False)}
+    queue = [(_IDENTITY, False, (), 0)]
+
+    for permutation, flip, word, cost in queue:
+        if len(queue) > 3000:
+            break
+
+        for g, (generator, generator_flip, _, generator_cost) in enumerate(generators):
+            element = (tuple(map(permutation.__getitem__, generator)), flip ^ generator_flip)
+
+            if element not in seen:
+                seen.add(element)
+                queue.append(element + (word + (g,), cost + generator_cost))
+                _sift(levels, base, *queue[-1])
+
+    filled = False
+
+    while not filled:  # once every level is filled, one more round shortens the representatives
+        filled = all(len(level) == size for level, size in zip(levels, sizes))
+        entries = [entry for level in levels for entry in level.values() if entry[2]]
+
+        for a in entries:
+            for b in entries:
+                _sift(levels, base, tuple(map(a[0].__getitem__, b[0])), a[1] ^ b[1], a[2] + b[2], a[3] + b[3])
+
+
+def _build_scramble_chain() -> tuple:
+    """
+    Builds a stabilizer chain of the cubeshape states (piece permutation
+    and equator), storing a short algorithm for each coset representative.
+
+    Notes:
+        The chain fixes the corner positions, then the edge positions, then
+        the equator. Representatives are found by sifting a breadth-first
+        search over `_SCRAMBLE_ALGS` and then products of representatives,
+        keeping the one with the fewest slashes (Minkwitz's method), until
+        every level is filled and for one round after that (which cuts the
+        average scramble from about 100 to about 77 slashes).
+    """
+
+    generators = []
+
+    for alg in _SCRAMBLE_ALGS:
+        for for_case in (False, True):
+            compiled = compile_alg(alg, for_case)
+            _, permutation, flip = compiled.effect()
+            generators.append((permutation, flip, compiled.segments, 1 + 10 * (len(compiled.segments) - 1)))
+
+    base = _piece_positions(_SOLVED_SHAPE)[0] + _piece_positions(_SOLVED_SHAPE)[1]
+    sizes = [len(base) // 2 - k % (len(base) // 2) for k in range(len(base))] + [2]
+    levels = [{position: (_IDENTITY, False, (), 0)} for position in base] + [{False: (_IDENTITY, False, (), 0)}]
+    _fill_scramble_chain(levels, base, sizes, generators)
+
+    return [{value: (_inverse_order(entry[0]), entry[1], _join_segments(generators[g][2] for g in entry[2]))
+             for value, entry in level.items()} for level in levels]
+
+
+def _scrambler() -> tuple:
+    """Returns the scrambler's reachable shapes, shape paths and stabilizer chain (built on first use)."""
+
+    global _SCRAMBLER
+
+    if _SCRAMBLER is None:
+        shapes = _precompute_shape_moves()
+        _SCRAMBLER = (shapes, _shape_paths(shapes), _build_scramble_chain())
+
+    return _SCRAMBLER
+
+
+def _random_pieces(rng) -> tuple:
+    """Draws a uniformly random reachable shape, piece arrangement and equator with the random generator `rng`."""
+
+    shape = rng.choice(_scrambler()[0])
+    corners = list(range(8))
+    edges = list(range(8, len(_PIECES)))
+    rng.shuffle(corners)
+    rng.shuffle(edges)
+    pieces = [0] * len(_PIECES)
+
+    for positions, shuffled in zip(_piece_positions(shape), (corners, edges)):
+        for position, piece in zip(positions, shuffled):
+            pieces[position] = piece
+
+    return shape, tuple(pieces), rng.random() < 0.5
+
+
+def _random_square1(shape: int, pieces: tuple, equator_flipped: bool) -> Square1:
+    """Creates a Square1 in the state given by `shape`, `pieces` and `equator_flipped`."""
+
+    n_top = _shape_moves(shape)[0]
+    state = ''.join(map(_PIECES.__getitem__, pieces))
+    square1 = Square1()
+    square1.apply_state(state[:n_top] + ('/' if equator_flipped else '-') + state[n_top:])
+
+    return square1
+
+
+def _scramble_alg(shape: int, pieces: tuple, equator_flipped: bool) -> str:
+    """Returns an algorithm that brings a solved Square1 to the state given by `shape`, `pieces` and `equator_flipped`."""
+
+    _, paths, levels = _scrambler()
+    path, path_permutation = paths[shape]
+
+    # the cubeshape state that the shape's path turns into `pieces`
+    cubeshape = [0] * len(_PIECES)
+
+    for position, piece in zip(path_permutation, pieces):
+        cubeshape[position] = piece
+
+    permutation = tuple(_SOLVED_PIECES.index(piece) for piece in cubeshape)
+    flip = equator_flipped ^ (len(path) % 2 == 0)
+    parts = []
+
+    for level, position in zip(levels, _piece_positions(_SOLVED_SHAPE)[0] + _piece_positions(_SOLVED_SHAPE)[1]):
+        inverse, entry_flip, segments = level[permutation[position]]
+        permutation = tuple(map(inverse.__getitem__, permutation))
+        flip ^= entry_flip
+        parts.append(segments)
+
+    parts.append(levels[-1][flip][2])
+    parts.append(path)
+
+    return _format_alg(_join_segments(parts))
+
+
+def random_state(seed=None) -> Square1:
+    """
+    Returns a Square1 in a uniformly random reachable state (shape, corner
+    and edge arrangement and equator).
+
+    `seed` is anything `random.Random` accepts (or a `random.Random` to draw
+    from), so the same seed always gives the same state.
+    """
+
+    rng = seed if isinstance(seed, random.Random) else random.Random(seed)
+
+    return _random_square1(*_random_pieces(rng))
+
+
+def scramble(seed=None, optimal: bool = False) -> tuple:
+    """
+    Returns a Square1 in a uniformly random reachable state and an
+    algorithm that scrambles a solved Square1 into it.
+
+    `seed` works the same way as in `random_state` (and gives the same state).
+    If `optimal = True`, the algorithm is the inverse of `solve`'s solution
+    (the fewest slashes possible, at most 13 in the twist metric).
+
+    Notes:
+        By default, the algorithm isn't optimal (77 slashes on average and
+        up to about 125) since it's built from a table of precomputed
+        pieces rather than searched for, which keeps it fast (thousands
+        per second). The table is built the first time this is called,
+        which takes about a second. Optimal scrambles take from a fraction
+        of a second to a few minutes each (see `solve`).
+    """
+
+    rng = seed if isinstance(seed, random.Random) else random.Random(seed)
+    state = _random_pieces(rng)
+    square1 = _random_square1(*state)
+
+    if optimal:
+        return square1, _format_alg(_parse_segments(solve(square1), for_case=True))
+
+    return square1, _scramble_alg(*state)
+
+
+def scrambles(count: int, seed=None, optimal: bool = False):
+    """
+    Yields `count` scrambles (see `scramble`) drawn from a single random
+    generator seeded with `seed`.
+    """
+
+    rng = seed if isinstance(seed, random.Random) else random.Random(seed)
+
+    for _ in range(count):
+        yield scramble(rng, optimal)
+
+
+_MIRROR_PIECES = tuple(_PIECE_IDS[piece] for piece in "CBADGFEH21438765")  # piece id -> its mirror image
+_SWAP_PIECES = tuple(_PIECE_IDS[piece] for piece in "GHEFCDAB85672341")  # piece id -> same place, other colour
+Symmetry = namedtuple("Symmetry", ("mirror", "swap", "top", "bottom", "equator"))
+Symmetry.__doc__ = """
+A symmetry of the Square-1 (see `canonical_key`): mirror it, swap its top
+and bottom colours, rotate the top and bottom layers by (`top`, `bottom`)
+and flip the equator, in that order.
+"""
+
+
+def _state_units(square1) -> tuple:
+    """Returns the piece ids of every unit of the top and bottom layers of the input Square1 or FastSquare1 `square1`."""
+
+    if isinstance(square1, FastSquare1):
+        n_top = _shape_moves(square1.shape)[0]
+        top, bottom = square1.pieces[:n_top], square1.pieces[n_top:]
+    else:
+        top = [_PIECE_IDS[piece] for piece in square1.top.current_state]
+        bottom = [_PIECE_IDS[piece] for piece in square1.bottom.current_state]
+
+    return ([piece for piece in top for _ in range(_PIECE_WIDTHS[piece])],
+            [piece for piece in bottom for _ in range(_PIECE_WIDTHS[piece])])
+
+
+def _units_pieces(units: list, start: int) -> tuple:
+    """Returns the piece ids of the layer with units `units` reading from the unit `start` (where a piece has to start)."""
+
+    return tuple(units[unit % 12] for unit in range(start, start + 12) if units[unit % 12] != units[(unit - 1) % 12])
+
+
+def _transform_units(top: list, bottom: list, mirror: bool, swap: bool) -> tuple:
+    """Mirrors and/or swaps the colours of the layers with units `top` and `bottom`."""
+
+    if mirror:  # reflect in the plane through the middle of the right half, which maps the slice onto itself
+        top = [_MIRROR_PIECES[top[(5 - unit) % 12]] for unit in range(12)]
+        bottom = [_MIRROR_PIECES[bottom[(5 - unit) % 12]] for unit in range(12)]
+
+    if swap:  # turn it upside down
+        top, bottom = ([_SWAP_PIECES[bottom[(unit - 6) % 12]] for unit in range(12)],
+                       [_SWAP_PIECES[top[(unit + 6) % 12]] for unit in range(12)])
+
+    return top, bottom
+
+
+def canonical_key(square1, mirror: bool = True, colours: bool = False, equator: bool = False) -> tuple:
+    """
+    Returns a compact hashable key (an int) for the state of the input
+    Square1 or FastSquare1 `square1` that is the same for every state that
+    only differs from it by rotating the top or bottom layer (AUF/ADF) or,
+    if `mirror = True` (default), by mirroring it.
+
+    If `colours = True`, turning it upside down (swapping the top and
+    bottom colours) counts as the same state as well, and if
+    `equator = True`, the equator is ignored.
+
+    Also returns the Symmetry that turns `square1` into the state the key
+    stands for (see `apply_symmetry` to apply or invert it).
+
+    Notes:
+        Layer rotations include ones that aren't legal turns (any rotation
+        that lines the pieces up with the slice counts).
+    """
+
+    top, bottom = _state_units(square1)
+    best = None
+
+    for mirrored in ((False, True) if mirror else (False,)):
+        for swapped in ((False, True) if colours else (False,)):
+            new_top, new_bottom = _transform_units(top, bottom, mirrored, swapped)
+            layers = []
+
+            for units in (new_top, new_bottom):
+                # smallest rotation of the layer, starting at one of its pieces
+                start = 1 if units[0] == units[-1] else 0  # a corner can straddle unit 0 after mirroring
+                pieces = _units_pieces(units, start)
+                rotations = []
+
+                for k, piece in enumerate(pieces):
+                    rotations.append((pieces[k:] + pieces[:k], -start))
+                    start += _PIECE_WIDTHS[piece]
+
+                layers.append(min(rotations))
+
+            candidate = (layers[0][0], layers[1][0], not equator and square1.equator_flipped)
+
+            if best is None or candidate < best[0]:
+                best = (candidate, Symmetry(mirrored, swapped, (layers[0][1] + 5) % 12 - 5, (layers[1][1] + 5) % 12 - 5,
+                                            equator and square1.equator_flipped))
+
+    (top, bottom, equator_flipped), symmetry = best
+    key = 0
+
+    for piece in top + bottom:
+        key = key << 4 | piece
+
+    return key << 5 | len(top) << 1 | equator_flipped, symmetry
+
+
+def apply_symmetry(square1, symmetry: Symmetry, inverse: bool = False) -> None:
+    """
+    Applies the Symmetry `symmetry` (from `canonical_key`) to the input
+    Square1 or FastSquare1 `square1`, or undoes it if `inverse = True`.
+
+    Raises a ValueError (and leaves `square1` unchanged) if a rotation
+    doesn't line the pieces up with the slice.
+    """
+
+    top, bottom = _state_units(square1)
+    top_amount, bottom_amount = (-symmetry.top, -symmetry.bottom) if inverse else (symmetry.top, symmetry.bottom)
+
+    if not inverse:
+        top, bottom = _transform_units(top, bottom, symmetry.mirror, symmetry.swap)
+
+    if (top[-top_amount % 12] == top[(-top_amount - 1) % 12]
+            or bottom[-bottom_amount % 12] == bottom[(-bottom_amount - 1) % 12]):
+        raise ValueError(f"Rotating by ({symmetry.top},{symmetry.bottom}) doesn't line the pieces up with the slice.")
+
+    top = [top[(unit - top_amount) % 12] for unit in range(12)]
+    bottom = [bottom[(unit - bottom_amount) % 12] for unit in range(12)]
+
+    if inverse:
+        # the mirror and the colour swap are their own inverses
+        top, bottom = _transform_units(top, bottom, False, symmetry.swap)
+        top, bottom = _transform_units(top, bottom, symmetry.mirror, False)
+
+        if top[0] == top[-1] or bottom[0] == bottom[-1]:
+            raise ValueError("The state can't be mirrored without a rotation (the pieces don't line up with the slice).")
+
+    top, bottom = _units_pieces(top, 0), _units_pieces(bottom, 0)
+    equator_flipped = square1.equator_flipped ^ symmetry.equator
+
+    if isinstance(square1, FastSquare1):
+        square1.pieces = top + bottom
+        square1.shape = _layer_mask(top) | (_layer_mask(bottom) << 12)
+        square1.equator_flipped = equator_flipped
+    else:
+        square1.top = Layer(''.join(map(_PIECES.__getitem__, top)))
+        square1.bottom = Layer(''.join(map(_PIECES.__getitem__, bottom)))
+        square1.equator_flipped = equator_flipped
+
+
+_CASE_CLASSES = {  # what a case is made of -> piece id -> the class of piece it counts as
+    "state": tuple(range(len(_PIECES))),
+    "colours": tuple(piece // 4 for piece in range(len(_PIECES))),  # top corners, bottom corners, top edges, bottom edges
+    "shape": tuple(piece // 8 for piece in range(len(_PIECES))),  # corners, edges
+}
+CaseMatch = namedtuple("CaseMatch", ("alg", "name", "pre", "post"))
+CaseMatch.__doc__ = """
+A case recognized by `CaseIndex.recognize`: the algorithm (and its name)
+and the `Turn`s to do before (`pre`) and after (`post`) it to solve the
+Square-1.
+"""
+
+
+@lru_cache(maxsize=None)
+def _post_turns() -> tuple:
+    """Returns every Turn that solves a solved Square1 with its layers turned, smallest first."""
+
+    moves = _shape_moves(_SOLVED_SHAPE)
+    turns = [Turn(top, bottom) for top in range(-5, 7) for bottom in range(-5, 7)
+             if (not top % 12 or moves[1][-top % 12]) and (not bottom % 12 or moves[2][-bottom % 12])]
+
+    return tuple(sorted(turns, key=lambda turn: abs(turn.top) + abs(turn.bottom)))
+
+
+def _case_layer(pieces, classes: tuple) -> tuple:
+    """
+    Returns the smallest rotation (as a tuple of piece classes `classes`)
+    of the layer with the piece ids `pieces`, and the amount to rotate the
+    layer by to get it.
+    """
+
+    best = None
+    start = 0
+
+    for k, piece in enumerate(pieces):
+        rotation = tuple([classes[piece] for piece in pieces[k:] + pieces[:k]])
+
+        if best is None or rotation < best[0]:
+            best = (rotation, -start)
+
+        start += _PIECE_WIDTHS[piece]
+
+    return best
+
+
+def _case_key(square1, match: str) -> tuple:
+    """
+    Returns the CaseIndex key (matching `match`) of the state of the input
+    Square1 or FastSquare1 `square1`, and the (top, bottom) rotation that
+    turns it into the state the key stands for.
+    """
+
+    if isinstance(square1, FastSquare1):
+        n_top = _shape_moves(square1.shape)[0]
+        top, bottom = square1.pieces[:n_top], square1.pieces[n_top:]
+    else:
+        top = tuple([_PIECE_IDS[piece] for piece in square1.top.current_state])
+        bottom = tuple([_PIECE_IDS[piece] for piece in square1.bottom.current_state])
+
+    top, top_amount = _case_layer(top, _CASE_CLASSES[match])
+    bottom, bottom_amount = _case_layer(bottom, _CASE_CLASSES[match])
+
+    return (top, bottom, match == "state" and square1.equator_flipped), (top_amount, bottom_amount)
+
+
+class CaseIndex:
+    """
+    An index of algorithms (like a CSP, OBL or PLL set) by the case each
+    one solves, which recognizes the case of a Square1 with one lookup.
+
+    Need help? Visit https://github.com/Wo0fle/virtual-sq1
+    """
+
+    def __init__(self, algs=(), match: str = "state", post: bool = True) -> None:
+        """
+        Initializes the CaseIndex with the algorithms `algs` (a dict of
+        names to algorithms, or an iterable of algorithms).
+
+        `match` is what a case is made of: "state" (every piece and the
+        equator, like PLL), "colours" (the shape and the top/bottom colour
+        of every piece, like OBL) or "shape" (only the shape, like CSP).
+        Cases always match whatever the rotation of each layer.
+
+        If `post = True` (default), states that an algorithm solves up to a
+        final turn of the layers (AUF/ADF) are recognized as well.
+        """
+
+        if match not in _CASE_CLASSES:
+            raise ValueError(f'Unknown match "{match}" (expected one of {", ".join(_CASE_CLASSES)}).')
+
+        self.match = match
+        self.post = post
+        self._cases = {}  # case key -> (alg, name, rotation to the key's state, post turn)
+
+        for name, alg in (algs.items() if isinstance(algs, dict) else ((None, alg) for alg in algs)):
+            self.add(alg, name)
+
+    def __len__(self) -> int:
+        """Returns the number of cases (counting each post turn) in the CaseIndex."""
+
+        return len(self._cases)
+
+    def add(self, alg: str, name: str = None) -> bool:
+        """
+        Adds the cases the input algorithm `alg` (named `name`) solves and
+        returns True (returns False if every one of them already has an
+        algorithm, which it keeps).
+
+        Raises the Square1Error of `alg` if it can't be applied as a case
+        to a solved Square1.
+
+        Notes:
+            The cases are worked out once here by applying `alg` with
+            `for_case = True` to a solved Square1 (turned by each post turn).
+        """
+
+        error = validate_alg(alg, True)
+
+        if error is not None:
+            raise error
+
+        compiled = compile_alg(alg, True)
+        added = False
+
+        for post in (_post_turns() if self.post else (Turn(0, 0),)):
+            square1 = FastSquare1()
+            square1.turn(-post.top, -post.bottom)
+
+            if not compiled.apply_to(square1):  # `alg` may not line up with the slice after the post turn
+                continue
+
+            key, rotation = _case_key(square1, self.match)
+
+            if key not in self._cases:
+                self._cases[key] = (alg, name, rotation, post)
+                added = True
+
+        return added
+
+    def recognize(self, square1):
+        """
+        Returns the CaseMatch for the state of the input Square1 or
+        FastSquare1 `square1` (or None if it isn't one of the cases).
+
+        Doing `pre`, the algorithm and then `post` solves `square1` (or its
+        colours or shape, depending on `match`).
+        """
+
+        key, rotation = _case_key(square1, self.match)
+        case = self._cases.get(key)
+
+        if case is None:
+            return None
+
+        alg, name, case_rotation, post = case
+        pre = Turn((rotation[0] - case_rotation[0] + 5) % 12 - 5, (rotation[1] - case_rotation[1] + 5) % 12 - 5)
+
+        return CaseMatch(alg, name, pre, post)
+
+
+AlgGroup = namedtuple("AlgGroup", ("representative", "algs"))
+AlgGroup.__doc__ = """
+A group of algorithms with the same effect (see `group_algs`): the
+shortest one and every one of them, in input order.
+"""
+
+
+def _alg_length(segments, metric: str) -> int:
+    """Returns the length in `metric` moves (see `solve`) of an algorithm's turn amounts `segments`."""
+
+    length = len(segments) - 1
+
+    if metric == "face":
+        length += sum(1 for top, bottom in segments if top % 12 or bottom % 12)
+
+    return length
+
+
+def group_algs(algs, rotations: bool = False, metric: str = "twist") -> tuple:
+    """
+    Groups the algorithms in `algs` by the state they leave a solved
+    Square1 in, and returns a list of AlgGroups (in the order of their
+    first algorithms) and a list of the (algorithm, Square1Error) of every
+    algorithm that can't be applied to a solved Square1.
+
+    If `rotations = True`, algorithms whose states only differ by turning
+    the layers (AUF/ADF) are grouped together as well.
+
+    The representative of each group is its shortest algorithm in `metric`
+    moves ("twist" or "face", like `solve`), the first one if there's a
+    tie.
+
+    Notes:
+        Each different algorithm is parsed and applied once (with the
+        turn and slash tables), and groups are found by hashing the
+        resulting states, so the time it takes grows linearly with the
+        number of algorithms (no two algorithms are ever compared).
+    """
+
+    if metric not in ("twist", "face"):
+        raise ValueError(f'Unknown metric "{metric}" (expected "twist" or "face").')
+
+    groups = {}  # resulting state -> [(length, index, algorithm)]
+    seen = {}  # algorithm -> (resulting state, length), or the error that makes it illegal
+    illegal = []
+
+    for i, alg in enumerate(algs):
+        if alg not in seen:
+            try:
+                segments = _alg_segments(alg)
+            except AlgSyntaxError as error:
+                segments, effect = None, error
+            else:
+                effect = _segments_effect(_SOLVED_SHAPE, segments)
+
+            if segments is None:
+                seen[alg] = effect
+            elif effect is None:
+                seen[alg] = validate_alg(alg)
+            else:
+                square1 = FastSquare1()
+                square1.shape, square1.pieces = effect[0], tuple(_SOLVED_PIECES[k] for k in effect[1])
+                square1.equator_flipped = len(segments) % 2 == 0  # an odd number of slashes flips it
+                key = _case_key(square1, "state")[0] if rotations else (square1.shape, square1.pieces, square1.equator_flipped)
+                seen[alg] = (key, _alg_length(segments, metric))
+
+        if isinstance(seen[alg], Square1Error):
+            illegal.append((alg, seen[alg]))
+        else:
+            key, length = seen[alg]
+            groups.setdefault(key, []).append((length, i, alg))
+
+    return [AlgGroup(min(group)[2], [alg for _, _, alg in group]) for group in groups.values()], illegal
+
+
+_COLOURS = {"U": "#ffffff", "D": "#ffd500", "F": "#009b48", "R": "#b71234", "B": "#0046ad", "L": "#ff5800"}
+_OUTLINE = "#000000"
+_STICKER = 0.2  # width of the side stickers (the faces are 2 wide)
+_DIAGRAM_SIZE = (7.0, 4.0)  # width and height of a diagram: the top face, then the bottom face, each above half the equator
+_FACE_CENTRES = ((1.75, 1.75), (5.25, 1.75))
+_EQUATOR = ((0.25, 3.55, 3.25, 0.3), (3.5, 3.55, 3.25, 0.3))  # x, y, width and height of the fixed and turning halves
+_RENDER_FORMATS = ("svg", "png")
+
+
+def _unit_angle(unit: int, bottom: bool) -> float:
+    """
+    Returns the smallest angle (in degrees, seen from above, clockwise
+    from the right) of the unit `unit` of the top (or bottom) layer.
+
+    Notes:
+        The slice runs from -75 to 105 degrees and the slash reflects
+        angles in the line at 15 degrees, which takes the unit `6 + k` of
+        the top layer to the unit `k` of the bottom layer (and back).
+    """
+
+    return 30 * unit - 75 if not bottom else -105 - 30 * unit
+
+
+def _piece_sides() -> tuple:
+    """Returns the sides of the stickers of each piece (in clockwise order seen from above) when the Square1 is solved."""
+
+    sides = [None] * len(_PIECES)
+
+    for bottom, layer in enumerate((_SOLVED_PIECES[:8], _SOLVED_PIECES[8:])):
+        unit = 0
+
+        for piece in layer:
+            width = _PIECE_WIDTHS[piece]
+            centre = min(_unit_angle(unit, bottom), _unit_angle(unit + width - 1, bottom)) + 15 * width
+            directions = (centre,) if width == 1 else (centre - 45, centre + 45)
+
+            sides[piece] = tuple("RFLB"[round(direction / 90) % 4] for direction in directions)
+            unit += width
+
+    return tuple(sides)
+
+
+_PIECE_SIDES = _piece_sides()
+_TOP_PIECES = frozenset(_SOLVED_PIECES[:8])
+
+
+@lru_cache(maxsize=1024)
+def _layer_geometry(mask: int, bottom: bool) -> tuple:
+    """
+    Returns the polygons (tuples of (x, y) points, in diagram units) of the
+    stickers of the top (or bottom) layer with the 12-bit shape `mask`: the
+    face and then the side stickers (in clockwise order seen from above)
+    of each piece, and then its half of the equator.
+    """
+
+    tan15 = math.tan(math.radians(15))
+    outer = 1 + _STICKER
+    edge = (((0, 0), (1, -tan15), (1, tan15)),
+            ((1, -tan15), (1, tan15), (outer, outer * tan15), (outer, -outer * tan15)))
+    corner = (((0, 0), (1, tan15), (1, 1), (tan15, 1)),  # facing 45 degrees
+              ((1, tan15), (1, 1), (outer, outer), (outer, outer * tan15)),
+              ((1, 1), (tan15, 1), (outer * tan15, outer), (outer, outer)))
+    x0, y0 = _FACE_CENTRES[bottom]
+    mirror = -1 if bottom else 1  # the bottom face is drawn as seen from below
+    polygons = []
+
+    for unit in range(12):
+        if mask >> unit & 1:
+            width = 1 if mask >> (unit + 1) % 12 & 1 else 2
+            start = min(_unit_angle(unit, bottom), _unit_angle(unit + width - 1, bottom))
+            angle = math.radians(start + 15 * width - (45 if width == 2 else 0))
+            cos, sin = math.cos(angle), math.sin(angle)
+
+            polygons.extend(tuple((round(x0 + mirror * (x * cos - y * sin), 4), round(y0 + x * sin + y * cos, 4))
+                                  for x, y in points)
+                            for points in (edge if width == 1 else corner))
+
+    x, y, width, height = _EQUATOR[bottom]
+    polygons.append(((x, y), (x + width, y), (x + width, y + height), (x, y + height)))
+
+    return tuple(polygons)
+
+
+def _diagram_layers(square1) -> tuple:
+    """
+    Returns the 12-bit shape of the top and bottom layers of the input
+    Square1, FastSquare1 or state string `square1`, and the side (U, D, F,
+    R, B or L) of each of their stickers (in the order of
+    `_layer_geometry`).
+
+    Raises an InvalidStateError if `square1` is an invalid state string.
+    """
+
+    if isinstance(square1, FastSquare1):
+        n_top = _shape_moves(square1.shape)[0]
+        pieces, equator_flipped = square1.pieces, square1.equator_flipped
+    elif isinstance(square1, Square1):
+        pieces = tuple(_PIECE_IDS[piece] for piece in square1.top.current_state + square1.bottom.current_state)
+        n_top, equator_flipped = len(square1.top.current_state), square1.equator_flipped
+    else:
+        pieces, shape, separators = _parse_state([piece for piece in square1.upper() if piece != " "])
+        n_top, equator_flipped = _shape_moves(shape)[0], separators == ["/"]
+
+    layers = []
+
+    for bottom, layer in enumerate((pieces[:n_top], pieces[n_top:])):
+        sides = []
+
+        for piece in layer:
+            home = (piece in _TOP_PIECES) != bottom  # the slash mirrors the pieces it moves to the other layer
+
+            sides.append("U" if piece in _TOP_PIECES else "D")
+            sides.extend(_PIECE_SIDES[piece] if home else _PIECE_SIDES[piece][::-1])
+
+        sides.append("B" if bottom and equator_flipped else "F")
+        layers.append((_layer_mask(layer), sides))
+
+    return layers
+
+
+def _diagram_colours(colours: dict) -> dict:
+    """Returns the default colours (see `render_svg`) updated with `colours`."""
+
+    if not colours:
+        return _COLOURS
+
+    unknown = set(colours) - set(_COLOURS)
+
+    if unknown:
+        raise ValueError(f'Unknown sides {sorted(unknown)} (expected some of "{"".join(_COLOURS)}").')
+
+    return dict(_COLOURS, **colours)
+
+
+@lru_cache(maxsize=1024)
+def _layer_svg(mask: int, bottom: bool) -> tuple:
+    """Same as `_layer_geometry`, but with SVG polygon elements (missing their colour and end)."""
+
+    return tuple(f'<polygon points="{" ".join(f"{x:g},{y:g}" for x, y in points)}" fill="'
+                 for points in _layer_geometry(mask, bottom))
+
+
+def _svg_body(square1, colours: dict) -> str:
+    """Returns the SVG elements of the diagram of the input `square1` (see `_diagram_layers`) with the `colours`."""
+
+    return "".join(f'{element}{colours[side]}"/>' for bottom, (mask, sides) in enumerate(_diagram_layers(square1))
+                   for element, side in zip(_layer_svg(mask, bool(bottom)), sides))
+
+
+def _svg(body: str, columns: int, rows: int, size: int) -> str:
+    """Returns an SVG document of `columns` by `rows` diagrams (each `size` pixels wide) drawn by the elements `body`."""
+
+    width, height = _DIAGRAM_SIZE[0] * columns, _DIAGRAM_SIZE[1] * rows
+    scale = size / _DIAGRAM_SIZE[0]
+
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" width="{round(width * scale)}" height="{round(height * scale)}" '
+            f'viewBox="0 0 {width:g} {height:g}"><g stroke="{_OUTLINE}" stroke-width="0.03" stroke-linejoin="round">'
+            f'{body}</g></svg>')
+
+
+def render_svg(square1, size: int = 200, colours: dict = None) -> str:
+    """
+    Returns an SVG diagram of the top face (left), bottom face (right, as
+    seen from below) and equator of the input Square1, FastSquare1 or
+    state string (like `str(square1)`) `square1`, `size` pixels wide.
+
+    `colours` can change the colour of any of the sides "U", "D", "F",
+    "R", "B" and "L" (white, yellow, green, red, blue and orange by
+    default).
+
+    Raises an InvalidStateError if `square1` is an invalid state string.
+
+    Notes:
+        The outline of each sticker only depends on the shape of its
+        layer, so it's worked out once per layer shape and cached.
+    """
+
+    return _svg(_svg_body(square1, _diagram_colours(colours)), 1, 1, size)
+
+
+def _png_palette(colours: dict) -> tuple:
+    """
+    Returns the PNG palette (transparent, outline, then the `colours` of
+    U, D, F, R, B and L) and each side's index in it.
+
+    Raises a ValueError if any of the colours isn't a hex colour.
+    """
+
+    palette = b""
+
+    for colour in [_OUTLINE] + list(colours.values()):
+        digits = colour[1:] if len(colour) != 4 else "".join(digit * 2 for digit in colour[1:])
+
+        try:
+            if not colour.startswith("#") or len(digits) != 6:
+                raise ValueError
+            palette += bytes.fromhex(digits)
+        except ValueError:
+            raise ValueError(f'PNG colours have to be hex colours like "#ff5800" (not "{colour}").') from None
+
+    return b"\x00\x00\x00" + palette, {side: i for i, side in enumerate(colours, 2)}
+
+
+def _polygon_pixels(image: bytearray, width: int, points: tuple, scale: float, x0: int, index: int) -> None:
+    """
+    Draws the convex polygon `points` (scaled by `scale` and moved left by
+    `x0` pixels) into the `width` pixel wide `image`: the pixels whose
+    centres are inside it are set to 1 (its outline), and the ones whose 4
+    neighbours are inside it too to `index`.
+    """
+
+    points = [(x * scale - x0, y * scale) for x, y in points]
+    edges = list(zip(points, points[1:] + points[:1]))
+    ys = [y for _, y in points]
+    spans = {}
+
+    for row in range(math.ceil(min(ys) - 0.5), math.floor(max(ys) - 0.5) + 1):
+        y = row + 0.5
+        xs = [xa + (y - ya) * (xb - xa) / (yb - ya) for (xa, ya), (xb, yb) in edges if ya <= y < yb or yb <= y < ya]
+
+        if xs:
+            start, end = max(0, math.ceil(min(xs) - 0.5)), min(width, math.floor(max(xs) - 0.5) + 1)
+
+            if start < end:
+                spans[row] = (start, end)
+
+    for row, (start, end) in spans.items():
+        image[row * width + start:row * width + end] = b"\x01" * (end - start)
+
+        if row - 1 in spans and row + 1 in spans:
+            start = max(start + 1, spans[row - 1][0], spans[row + 1][0])
+            end = min(end - 1, spans[row - 1][1], spans[row + 1][1])
+
+            if start < end:
+                image[row * width + start:row * width + end] = bytes((index,)) * (end - start)
+
+
+def _png_size(size: int) -> tuple:
+    """Returns the width and height (in pixels) of a `size` pixel wide diagram, and the width of its top face."""
+
+    return size, round(size * _DIAGRAM_SIZE[1] / _DIAGRAM_SIZE[0]), round(size / 2)
+
+
+@lru_cache(maxsize=512)
+def _layer_pixels(mask: int, bottom: bool, size: int) -> bytes:
+    """
+    Returns the pixels of the top (or bottom) half of a `size` pixel wide
+    diagram (see `_png_size`) of a layer with the 12-bit shape `mask`: 0
+    where it's transparent, 1 on the outlines, and 2 plus the index in
+    `_layer_geometry` of every sticker on each of the sticker's pixels.
+    """
+
+    width, height, split = _png_size(size)
+    layer_width = split if not bottom else width - split
+    image = bytearray(layer_width * height)
+
+    for i, points in enumerate(_layer_geometry(mask, bottom), 2):
+        _polygon_pixels(image, layer_width, points, size / _DIAGRAM_SIZE[0], split if bottom else 0, i)
+
+    return bytes(image)
+
+
+def _png_rows(square1, sides: dict, size: int) -> list:
+    """
+    Returns each row of pixels (palette indices, see `_png_palette`) of
+    the `size` pixel wide diagram of the input `square1` (see
+    `_diagram_layers`), where `sides` is each side's palette index.
+
+    Notes:
+        Drawing a diagram just recolours the cached pixels of both layers
+        (`bytes.translate`) and puts their rows side by side.
+    """
+
+    width, height, split = _png_size(size)
+    halves = []
+
+    for bottom, (mask, layer_sides) in enumerate(_diagram_layers(square1)):
+        colours = bytes([0, 1] + [sides[side] for side in layer_sides])
+        halves.append(_layer_pixels(mask, bool(bottom), size).translate(colours + bytes(256 - len(colours))))
+
+    top, bottom = halves
+
+    return [top[row * split:(row + 1) * split] + bottom[row * (width - split):(row + 1) * (width - split)]
+            for row in range(height)]
+
+
+def _png(rows: list, width: int, palette: bytes) -> bytes:
+    """Encodes the rows of pixels (palette indices) `rows`, each `width` pixels wide, as a PNG file with the `palette`."""
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, len(rows), 8, 3, 0, 0, 0))
+            + chunk(b"PLTE", palette) + chunk(b"tRNS", b"\x00")  # the first colour is transparent
+            + chunk(b"IDAT", zlib.compress(b"".join(b"\x00" + row for row in rows))) + chunk(b"IEND", b""))
+
+
+def render_png(square1, size: int = 200, colours: dict = None) -> bytes:
+    """
+    Same as `render_svg`, but returns the diagram as a PNG file (encoded
+    without any image library). `colours` have to be hex colours.
+
+    Notes:
+        The pixels of each sticker only depend on the shape of its layer
+        and `size`, so they're drawn once per layer shape and cached.
+    """
+
+    palette, sides = _png_palette(_diagram_colours(colours))
+
+    return _png(_png_rows(square1, sides, size), size, palette)
+
+
+def _check_format(format: str) -> None:
+    """Raises a ValueError if `format` isn't one of the formats diagrams can be rendered in."""
+
+    if format not in _RENDER_FORMATS:
+        raise ValueError(f'Unknown format "{format}" (expected one of {", ".join(_RENDER_FORMATS)}).')
+
+
+def render_sheet(states, columns: int = 10, format: str = "svg", size: int = 200, colours: dict = None):
+    """
+    Returns a single sprite sheet (an SVG string, or a PNG file if
+    `format = "png"`) of the diagrams (see `render_svg`) of every input
+    Square1, FastSquare1 or state string in `states`, `columns` diagrams
+    (each `size` pixels wide) per row, in input order.
+
+    Raises an InvalidStateError at the first invalid state string.
+    """
+
+    _check_format(format)
+    colours = _diagram_colours(colours)
+    states = list(states)
+    n_rows = max(1, -(-len(states) // columns))
+
+    if format == "svg":
+        width, height = _DIAGRAM_SIZE
+
+        return _svg("".join(f'<g transform="translate({i % columns * width:g},{i // columns * height:g})">'
+                            f'{_svg_body(square1, colours)}</g>' for i, square1 in enumerate(states)), columns, n_rows, size)
+
+    palette, sides = _png_palette(colours)
+    height = _png_size(size)[1]
+    empty = bytes(size)
+    rows = [[empty] * columns for _ in range(n_rows * height)]
+
+    for i, square1 in enumerate(states):
+        for row, pixels in enumerate(_png_rows(square1, sides, size), i // columns * height):
+            rows[row][i % columns] = pixels
+
+    return _png([b"".join(row) for row in rows], columns * size, palette)
+
+
+def render_batch(states, directory: str, format: str = "svg", size: int = 200, colours: dict = None, names=None) -> list:
+    """
+    Writes the diagram (see `render_svg` and `render_png`) of every input
+    Square1, FastSquare1 or state string in `states` to its own file in
+    the directory `directory` (created if needed), named after `names` (or
+    numbered from 00000), and returns the paths of the files.
+
+    Raises an InvalidStateError at the first invalid state string.
+    """
+
+    _check_format(format)
+    colours = _diagram_colours(colours)
+    os.makedirs(directory, exist_ok=True)
+    names = iter(names) if names is not None else (f"{i:05d}" for i in range(sys.maxsize))
+    paths = []
+
+    if format == "png":
+        palette, sides = _png_palette(colours)
+
+    for square1, name in zip(states, names):
+        path = os.path.join(directory, f"{name}.{format}")
+
+        if format == "svg":
+            with open(path, "w") as file:
+                file.write(_svg(_svg_body(square1, colours), 1, 1, size))
+        else:
+            with open(path, "wb") as file:
+                file.write(_png(_png_rows(square1, sides, size), size, palette))
+
+        paths.append(path)
+
+    return paths
+
+
+_RANK_SHAPES = None  # (shapes in rank order, shape -> shape index)
+_N_SHAPES = 8518  # shapes `apply_state` accepts (the length of `_rank_shapes()[0]`)
+_N_REACHABLE_SHAPES = 3678  # shapes reachable from solved (the ones `_precompute_shape_moves` finds)
+N_STATES = _N_SHAPES * _N_PERMUTATIONS * _N_PERMUTATIONS * 2  # every state `apply_state` accepts
+N_REACHABLE_STATES = _N_REACHABLE_SHAPES * _N_PERMUTATIONS * _N_PERMUTATIONS * 2  # every state reachable from solved
+
+
+def _rank_shapes() -> tuple:
+    """
+    Returns every shape (reachable ones first, then the rest, each in
+    ascending order) and the index of each shape (built on first use).
+    """
+
+    global _RANK_SHAPES
+
+    if _RANK_SHAPES is None:
+        layers = {}  # corner count -> layer masks
+
+        for mask in range(1, 1 << 12, 2):
+            starts = [unit for unit in range(12) if mask >> unit & 1] + [12]
+            gaps = [end - start for start, end in zip(starts, starts[1:])]
+
+            if all(gap in (1, 2) for gap in gaps):
+                layers.setdefault(gaps.count(2), []).append(mask)
+
+        every_shape = {top | (bottom << 12) for corners in layers for top in layers[corners]
+                       for bottom in layers.get(8 - corners, ())}
+        reachable = set(_precompute_shape_moves())
+        shapes = sorted(reachable) + sorted(every_shape - reachable)
+        _RANK_SHAPES = (shapes, {shape: i for i, shape in enumerate(shapes)})
+
+    return _RANK_SHAPES
+
+
+def _unrank_permutation(rank: int) -> list:
+    """Returns the order of the numbers 0-7 with the lexicographic rank `rank`."""
+
+    digits = []
+
+    for base in range(1, 9):
+        rank, digit = divmod(rank, base)
+        digits.append(digit)
+
+    remaining = list(range(8))
+
+    return [remaining.pop(digit) for digit in reversed(digits)]
+
+
+def rank(square1) -> int:
+    """
+    Returns the rank of the state of the input Square1 or FastSquare1
+    `square1`: a number from 0 to `N_STATES - 1` that no other state has.
+
+    Notes:
+        The rank is ((shape index * 8! + corner rank) * 8! + edge rank) *
+        2 + equator (see `_permutation_ranks`), and reachable shapes come
+        first, so every state that can be reached from solved ranks below
+        `N_REACHABLE_STATES` (states can be stored in a bitmap or a flat
+        array of that size).
+    """
+
+    if isinstance(square1, FastSquare1):
+        pieces, shape = square1.pieces, square1.shape
+    else:
+        pieces = [_PIECE_IDS[piece] for piece in square1.top.current_state + square1.bottom.current_state]
+        shape = _square1_shape(square1)
+
+    return _rank_state(shape, pieces, square1.equator_flipped)
+
+
+def _rank_state(shape: int, pieces, equator_flipped: bool) -> int:
+    """Returns the rank (see `rank`) of the state with the shape `shape`, piece ids `pieces` and equator `equator_flipped`."""
+
+    corner_rank, edge_rank = _permutation_ranks(pieces)
+
+    return ((_rank_shapes()[1][shape] * _N_PERMUTATIONS + corner_rank) * _N_PERMUTATIONS + edge_rank) * 2 + equator_flipped
+
+
+def unrank(index: int) -> Square1:
+    """
+    Returns a Square1 in the state with the rank `index` (see `rank`).
+
+    Raises a ValueError if `index` isn't between 0 and `N_STATES - 1`.
+    """
+
+    if not 0 <= index < N_STATES:
+        raise ValueError(f"Rank {index} is out of range (0 to {N_STATES - 1}).")
+
+    index, equator_flipped = divmod(index, 2)
+    index, edge_rank = divmod(index, _N_PERMUTATIONS)
+    shape_index, corner_rank = divmod(index, _N_PERMUTATIONS)
+    shape = _rank_shapes()[0][shape_index]
+    corners, edges = _piece_positions(shape)
+    pieces = [0] * len(_PIECES)
+
+    for piece, position in enumerate(_unrank_permutation(corner_rank)):
+        pieces[corners[position]] = piece
+
+    for piece, position in enumerate(_unrank_permutation(edge_rank)):
+        pieces[edges[position]] = piece + 8
+
+    return _random_square1(shape, tuple(pieces), bool(equator_flipped))
+
+
+_TIMED = (  # (owner or None for a module function, attribute) of every timed entry point
+    [("Square1", name) for name in ("slash", "apply_alg", "apply_state", "undo", "redo")]
+    + [("FastSquare1", name) for name in ("turn", "slash", "apply_alg", "apply_state")]
+    + [("CompiledAlg", "apply_to"), ("CaseIndex", "add"), ("CaseIndex", "recognize")]
+    + [(None, name) for name in ("parse_alg", "compile_alg", "simplify_alg", "validate_alg", "validate_state", "encode_states",
+                                 "decode_states", "batch_apply_alg", "solve", "generate_tables", "load_tables", "random_state",
+                                 "scramble", "canonical_key", "apply_symmetry", "rank", "unrank", "group_algs", "render_svg",
+                                 "render_png", "render_sheet", "render_batch")]
+)
+_COUNTING = False  # whether the engines count their moves and rollbacks into _COUNTERS
+_COUNTERS = dict.fromkeys(("layer_turns", "slashes", "rollbacks", "parse_failures"), 0)
+_TIMINGS = {}  # entry point -> [calls, seconds]
+_TIMINGS_LOCK = threading.Lock()  # timed calls can end in several threads at once (e.g. a Service's)
+_ORIGINALS = {}  # (owner, attribute) -> the original function, while instrumentation is enabled
+_CALLBACK = None
+
+
+def _count_moves(segments) -> None:
+    """Counts the layer turns and slashes of the (top, bottom) turn amounts `segments` (a whole algorithm at once)."""
+
+    _COUNTERS["layer_turns"] += sum((top % 12 != 0) + (bottom % 12 != 0) for top, bottom in segments)
+    _COUNTERS["slashes"] += len(segments) - 1
+
+
+def _count_rollback(parse_failure: bool) -> None:
+    """Counts a failed `apply_alg` or `apply_state` call (and a parse failure if `parse_failure = True`)."""
+
+    _COUNTERS["rollbacks"] += 1
+
+    if parse_failure:
+        _COUNTERS["parse_failures"] += 1
+
+
+def _timed(function, name: str):
+    """Returns `function` wrapped to add its run time to the timings of `name` (and pass it to the callback)."""
+
+    @wraps(function)
+    def timed(*args, **kwargs):
+        start = time.perf_counter()
+
+        try:
+            return function(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start
+
+            with _TIMINGS_LOCK:
+                timing = _TIMINGS.setdefault(name, [0, 0.0])
+                timing[0] += 1
+                timing[1] += seconds
+
+            if _CALLBACK is not None:
+                _CALLBACK(name, seconds)
+
+    return timed
+
+
+def enable_instrumentation(callback=None) -> None:
+    """
+    Starts counting layer turns and slashes (done or tried by a Square1,
+    a FastSquare1 or `CompiledAlg.apply_to`), rollbacks (failed
+    `apply_alg` and `apply_state` calls) and parse failures (the rollbacks
+    caused by a syntax error or an invalid state), and timing every call
+    to each public entry point (the moves and `apply_*` methods, and every
+    public function that isn't a generator), until
+    `disable_instrumentation` is called.
+
+    If given, `callback(name, seconds)` is called after every timed call,
+    e.g. to export it to a metrics system (see `stats` for the totals).
+
+    Notes:
+        The engines do the counting themselves behind a single flag, so
+        when it's disabled the hot paths only pay for checking it. Timing
+        wraps the entry points, and disabling it puts the original ones
+        back. Functions imported with `from virtual_sq1 import ...` before
+        enabling it aren't timed (methods always are), and it only covers
+        the current process (not `run_batch`'s or a Service's worker
+        processes). A FastSquare1 applies a whole algorithm with a single
+        table lookup, so a failed `apply_alg` doesn't count any moves.
+        The timings are exact across threads, but the counters aren't
+        locked (to keep the hot paths cheap), so they're approximate while
+        several threads move puzzles at once.
+    """
+
+    global _CALLBACK, _COUNTING
+
+    _CALLBACK = callback
+    _COUNTING = True
+
+    if _ORIGINALS:
+        return
+
+    module = sys.modules[__name__]
+
+    for owner, attribute in _TIMED:
+        name = attribute if owner is None else f"{owner}.{attribute}"
+        owner = module if owner is None else getattr(module, owner)
+        _ORIGINALS[owner, attribute] = getattr(owner, attribute)
+        setattr(owner, attribute, _timed(getattr(owner, attribute), name))
+
+
+def disable_instrumentation() -> None:
+    """Stops the instrumentation (see `enable_instrumentation`), keeping what it has counted so far."""
+
+    global _CALLBACK, _COUNTING
+
+    _CALLBACK = None
+    _COUNTING = False
+
+    for (owner, attribute), function in _ORIGINALS.items():
+        setattr(owner, attribute, function)
+
+    _ORIGINALS.clear()
+
+
+@contextlib.contextmanager
+def instrumentation(callback=None):
+    """Context manager that enables the instrumentation (see `enable_instrumentation`) until the block ends."""
+
+    enabled, previous = _COUNTING, _CALLBACK
+    enable_instrumentation(callback)
+
+    try:
+        yield
+    finally:
+        if enabled:
+            enable_instrumentation(previous)
+        else:
+            disable_instrumentation()
+
+
+def stats(reset: bool = False) -> dict:
+    """
+    Returns a snapshot of the instrumentation (see
+    `enable_instrumentation`): whether it's "enabled", the "counters" and
+    the "timings" (number of "calls" and total "seconds", including the
+    time spent in other entry points it calls) of every entry point called
+    so far. Everything is set back to 0 afterwards if `reset = True`.
+    """
+
+    with _TIMINGS_LOCK:
+        snapshot = {
+            "enabled": _COUNTING,
+            "counters": dict(_COUNTERS),
+            "timings": {name: {"calls": calls, "seconds": seconds} for name, (calls, seconds) in _TIMINGS.items()},
+        }
+
+        if reset:
+            _COUNTERS.update(dict.fromkeys(_COUNTERS, 0))
+            _TIMINGS.clear()
+
+    return snapshot
+
+
+_BATCH_MODES = ("alg", "case", "state", "solve")
+BatchResult = namedtuple("BatchResult", ("input", "state", "solution", "error"))
+BatchResult.__doc__ = """
+The result of one input of `run_batch`: the input, the resulting state
+string, the solution (only when solving) and the error message (None if
+successful).
+"""
+
+
+def _run_chunk(mode: str, start: str, options: dict, items: list) -> list:
+    """Runs `run_batch`'s work on one chunk of inputs `items` (in a worker process)."""
+
+    results = []
+
+    with error_policy("quiet"):  # errors are returned instead of reported
+        for item in items:
+            square1 = FastSquare1()
+
+            if start is not None:
+                square1.apply_state(start)
+
+            if mode == "alg" or mode == "case":
+                square1.apply_alg(item, mode == "case")
+            else:
+                square1.apply_state(item)
+
+            error = square1.error_message or None
+            state = None if error else str(square1)
+            solution = None
+
+            if mode == "solve" and error is None:
+                try:
+                    solution = solve(square1, **options)
+                except ValueError as solve_error:  # a shape that can't be reached
+                    error = f"{solve_error}\n"
+
+            results.append(BatchResult(item, state, solution, error))
+
+    return results
+
+
+def run_batch(items, mode: str = "alg", start: str = None, workers: int = None, chunk_size: int = 256,
+              tables: str = None, **solve_options):
+    """
+    Applies every input in `items` to its own Square1 across a pool of
+    worker processes and yields a BatchResult for each, in input order.
+
+    `mode` is "alg" (apply each input algorithm), "case" (apply each input
+    as a case), "state" (apply each input state) or "solve" (apply each
+    input state and solve it, passing `solve_options` on to `solve`).
+    Algorithms and cases are applied to the state `start` (solved by
+    default).
+
+    `workers` is the number of processes (every CPU by default, and 1 runs
+    everything in this process) and `chunk_size` is the number of inputs
+    sent to a worker at once. `tables` is a tables file (see
+    `generate_tables`) every worker loads so it doesn't build its own.
+
+    Raises a ValueError straight away (before any worker starts) if
+    `mode`, `start` or `chunk_size` is invalid.
+
+    Notes:
+        Errors are returned in BatchResult.error instead of being printed,
+        and the state of a failed input is None. `items` is read lazily:
+        at most two chunks per worker are waiting or running at a time.
+    """
+
+    if mode not in _BATCH_MODES:
+        raise ValueError(f'Unknown mode "{mode}" (expected one of {", ".join(_BATCH_MODES)}).')
+
+    if chunk_size < 1:
+        raise ValueError("chunk_size has to be at least 1.")
+
+    if start is not None:
+        error = validate_state(start)
+
+        if error is not None:
+            raise ValueError(f'Invalid start state "{error.state}": {error.reason}.')
+
+    return _batch_results(_chunks(items, chunk_size), partial(_run_chunk, mode, start, solve_options), workers, tables)
+
+
+def _batch_results(chunks, run, workers: int, tables: str):
+    """Yields the results of `run` on every chunk in `chunks` for `run_batch`, in order."""
+
+    if workers == 1:
+        if tables is not None:
+            load_tables(tables)
+
+        for chunk in chunks:
+            yield from run(chunk)
+
+        return
+
+    initializer, initargs = (load_tables, (tables,)) if tables is not None else (None, ())
+    in_flight = 2 * (workers or os.cpu_count() or 1)
+    pending = deque()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs) as executor:
+        try:
+            for chunk in chunks:
+                pending.append(executor.submit(run, chunk))
+
+                if len(pending) >= in_flight:
+                    yield from pending.popleft().result()
+
+            while pending:
+                yield from pending.popleft().result()
+        finally:
+            for future in pending:  # stopped early: don't run what's left
+                future.cancel()
+
+
+def _chunks(items, chunk_size: int):
+    """Yields the inputs `items` in lists of `chunk_size`."""
+
+    chunk = []
+
+    for item in items:
+        chunk.append(item)
+
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+
+def _apply_record(state: str, alg: str, for_case: bool) -> tuple:
+    """
+    Applies the state `state` and then the algorithm `alg` (either can be
+    None) to a solved FastSquare1 and returns the resulting state string,
+    or None and a dictionary describing the error.
+    """
+
+    square1 = FastSquare1()
+
+    with error_policy("quiet"):
+        if state is not None and square1.apply_state(state) is not None:
+            return None, {"kind": "state", "message": square1.error_message}
+
+        error = square1.apply_alg(alg, for_case) if alg is not None else None
+
+    if error is not None:
+        syntax = isinstance(error, AlgSyntaxError)
+        record = {"kind": "syntax" if syntax else "logic", "message": square1.error_message, "move": error.move}
+
+        if syntax:
+            record["position"] = error.position
+
+        return None, record
+
+    return str(square1), None
+
+
+def stream(lines, mode: str = "alg"):
+    """
+    Lazily yields one output line for every input line in `lines`.
+
+    A line holding a JSON object is a record with an optional "state" to
+    start from, an optional "alg" to apply and an optional "for_case"
+    (False by default); its output is a JSON object with the resulting
+    "state" or a structured "error" (plus the record's "id", if it has one).
+
+    Any other line is an algorithm (`mode = "alg"`), a case
+    (`mode = "case"`) or a state (`mode = "state"`), and its output is the
+    resulting state or "ERROR " followed by the error message.
+    """
+
+    if mode not in ("alg", "case", "state"):
+        raise ValueError(f'Unknown mode "{mode}" (expected alg, case or state).')
+
+    for line in lines:
+        line = line.rstrip("\r\n")
+
+        if not line.lstrip().startswith("{"):
+            state, error = _apply_record(line if mode == "state" else None, None if mode == "state" else line, mode == "case")
+            yield state if error is None else "ERROR " + " ".join(error["message"].split())
+            continue
+
+        try:
+            record = json.loads(line)
+        except ValueError as json_error:
+            yield json.dumps({"error": {"kind": "input", "message": f"Invalid JSON: {json_error}"}})
+            continue
+
+        if (not isinstance(record, dict) or not isinstance(record.get("state", ""), str)
+                or not isinstance(record.get("alg", ""), str)):
+            output = {"error": {"kind": "input", "message": 'Expected an object with a "state" and/or "alg" string.'}}
+        else:
+            state, error = _apply_record(record.get("state"), record.get("alg"), bool(record.get("for_case", False)))
+            output = {"state": state} if error is None else {"error": error}
+
+            if "id" in record:
+                output["id"] = record["id"]
+
+        yield json.dumps(output)
+
+
+_SERVICE_EXECUTORS = ("process", "thread")
+
+
+def _serve_chunk(lines: list) -> list:
+    """Answers one batch of the Service's request lines `lines` (in a worker)."""
+
+    return list(stream(lines))
+
+
+def _service_error(line: str, kind: str, message: str) -> str:
+    """Returns the response line of the error `kind` with the message `message` to the request line `line`."""
+
+    output = {"error": {"kind": kind, "message": message}}
+
+    try:
+        record = json.loads(line)
+    except ValueError:
+        record = None
+
+    if isinstance(record, dict) and "id" in record:
+        output["id"] = record["id"]
+
+    return json.dumps(output)
+
+
+class Service:
+    """
+    An asyncio service that answers newline-delimited JSON requests from
+    any number of clients over TCP or a Unix socket, batching them across
+    clients onto a bounded pool of worker processes (or threads).
+
+    Each request is a record like the JSON lines of `stream` (an optional
+    "state", "alg", "for_case" and "id") and gets exactly one response
+    line, in request order on each connection.
+
+    Need help? Visit https://github.com/Wo0fle/virtual-sq1
+    """
+
+    def __init__(self, workers: int = None, executor: str = "process", max_batch: int = 64, batch_delay: float = 0.002,
+                 max_pending: int = 1024, timeout: float = 10.0) -> None:
+        """
+        Initializes the Service (see `start`).
+
+        `workers` is the size of the pool (every CPU by default) and
+        `executor` is "process" or "thread". Up to `max_batch` requests
+        (waiting up to `batch_delay` seconds for more to come in) are sent
+        to a worker at once, and at most `workers` batches run at a time.
+
+        At most `max_pending` requests wait for a worker (and for each
+        client to read its responses) before the Service stops reading
+        more, and a request that isn't answered within `timeout` seconds
+        gets a "timeout" error instead.
+        """
+
+        if executor not in _SERVICE_EXECUTORS:
+            raise ValueError(f'Unknown executor "{executor}" (expected one of {", ".join(_SERVICE_EXECUTORS)}).')
+
+        if max_batch < 1 or max_pending < 1:
+            raise ValueError("max_batch and max_pending have to be at least 1.")
+
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = executor
+        self.max_batch = max_batch
+        self.batch_delay = batch_delay
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._pool = None
+        self._server = None
+        self._requests = None  # (request line, future of its response line) waiting for a worker
+        self._slots = None  # one per batch that can run at once
+        self._batcher = None
+        self._writers = set()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0, path: str = None):
+        """
+        Starts the worker pool and listens on the Unix socket `path`, or
+        on `host` and `port` (0 picks a free port), and returns the
+        address it's listening on.
+        """
+
+        loop = asyncio.get_running_loop()
+        self._pool = (ProcessPoolExecutor if self.executor == "process" else ThreadPoolExecutor)(max_workers=self.workers)
+        self._requests = asyncio.Queue(self.max_pending)
+        self._slots = asyncio.Semaphore(self.workers)
+        self._batcher = loop.create_task(self._batch_requests())
+
+        if path is not None:
+            self._server = await asyncio.start_unix_server(self._handle, path=path)
+        else:
+            self._server = await asyncio.start_server(self._handle, host, port)
+
+        return self._server.sockets[0].getsockname()
+
+    async def serve_forever(self) -> None:
+        """Answers requests until the Service is closed (or the task is cancelled)."""
+
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.close()
+
+    async def close(self) -> None:
+        """Stops listening, disconnects every client and shuts down the worker pool."""
+
+        if self._server is None:
+            return
+
+        server, self._server = self._server, None
+        server.close()
+
+        for writer in list(self._writers):
+            writer.close()
+
+        await server.wait_closed()
+        self._batcher.cancel()
+        await asyncio.get_running_loop().run_in_executor(None, self._pool.shutdown)
+
+    async def query(self, line: str) -> str:
+        """
+        Answers the request line `line` (a JSON record, see `stream`) and
+        returns the response line, or a "timeout" error if it takes longer
+        than the Service's `timeout`.
+
+        Notes:
+            Waits (without blocking the event loop) while `max_pending`
+            requests are already waiting for a worker.
+        """
+
+        if not line.lstrip().startswith("{"):
+            return _service_error(line, "input", "Expected a JSON object.")
+
+        try:
+            return await asyncio.wait_for(self._answer(line), self.timeout)
+        except asyncio.TimeoutError:
+            return _service_error(line, "timeout", f"No response within {self.timeout} seconds.")
+
+    async def _answer(self, line: str) -> str:
+        """Queues the request line `line` for a worker and returns its response line."""
+
+        response = asyncio.get_running_loop().create_future()
+        await self._requests.put((line, response))
+
+        return await response
+
+    async def _batch_requests(self) -> None:
+        """Sends the queued requests to the worker pool in batches, running at most `workers` batches at a time."""
+
+        loop = asyncio.get_running_loop()
+
+        while True:
+            await self._slots.acquire()  # while every worker is busy, the requests pile up into bigger batches
+            batch = [await self._requests.get()]
+
+            if self.batch_delay > 0 and self._requests.qsize() < self.max_batch - 1:
+                await asyncio.sleep(self.batch_delay)  # let other clients' requests join the batch
+
+            while len(batch) < self.max_batch and not self._requests.empty():
+                batch.append(self._requests.get_nowait())
+
+            batch = [(line, response) for line, response in batch if not response.done()]  # timed out while queued
+
+            if batch:
+                loop.create_task(self._run_batch(batch))
+            else:
+                self._slots.release()
+
+    async def _run_batch(self, batch: list) -> None:
+        """Answers the batch of (request line, future of its response line) `batch` in the worker pool."""
+
+        try:
+            lines = await asyncio.get_running_loop().run_in_executor(self._pool, _serve_chunk, [line for line, _ in batch])
+        except Exception as error:  # e.g. a worker process died
+            lines = [_service_error(line, "service", f"{type(error).__name__}: {error}") for line, _ in batch]
+        finally:
+            self._slots.release()
+
+        for (_, response), line in zip(batch, lines):
+            if not response.done():
+                response.set_result(line)
+
+    async def _handle(self, reader, writer) -> None:
+        """Answers every request line a client sends, in order, until it disconnects."""
+
+        self._writers.add(writer)
+        responses = asyncio.Queue(self.max_pending)  # when the client stops reading responses, stop reading its requests
+        sender = asyncio.get_running_loop().create_task(self._send(responses, writer))
+
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ConnectionError, ValueError):  # a line longer than the stream's limit
+                    break
+
+                if not line:
+                    break
+
+                line = line.decode("utf-8", "replace").strip()
+
+                if line:
+                    await responses.put(asyncio.ensure_future(self.query(line)))
+        finally:
+            await responses.put(None)
+            await sender
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _send(self, responses: asyncio.Queue, writer) -> None:
+        """Writes each response line in `responses` to the client (until None), in order."""
+
+        connected = True
+
+        while True:
+            response = await responses.get()
+
+            if response is None:
+                return
+
+            line = await response
+
+            if connected:
+                try:
+                    writer.write(line.encode() + b"\n")
+                    await writer.drain()
+                except ConnectionError:
+                    connected = False  # keep going so the reader never waits on a full queue
+
+
+def serve(host: str = "127.0.0.1", port: int = 8765, path: str = None, **options) -> None:
+    """
+    Runs a Service (created with `options`) on the Unix socket `path`, or
+    on `host` and `port`, until it's interrupted.
+    """
+
+    async def run():
+        service = Service(**options)
+        address = await service.start(host, port, path)
+        print(f"virtual_sq1 service listening on {address}", file=sys.stderr, flush=True)
+        await service.serve_forever()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+def _run_batch_command(parser: argparse.ArgumentParser, args: argparse.Namespace) -> None:
+    """Runs the `batch` command of `main` and prints one line per input.
+
+    Notes:
+        Invalid options (like an invalid --start state) are reported through `parser`, which exits."""
+
+    solve_options = {}
+
+    if args.mode == "solve":
+        solve_options = {"metric": args.metric, "max_depth": args.max_depth, "time_limit": args.time_limit}
+
+    with (contextlib.nullcontext(sys.stdin) if args.path == "-" else open(args.path)) as lines:
+        items = (line.rstrip("\n") for line in lines)
+
+        try:
+            results = run_batch(items, args.mode, args.start, args.workers, args.chunk_size, args.tables, **solve_options)
+        except ValueError as error:
+            parser.error(str(error))
+
+        # one line out per line in: the state (or solution), or the error
+        for result in results:
+            if result.error is not None:
+                print("ERROR " + " ".join(result.error.split()))
+            else:
+                print(result.solution if args.mode == "solve" else result.state)
+
+
+def main(argv: list = None) -> None:
+    """Runs the `virtual_sq1` command line interface with the arguments `argv`."""
+
+    parser = argparse.ArgumentParser(prog="virtual_sq1",
+                                     description="Python module that simulates a Square-1 twisty puzzle")
+    commands = parser.add_subparsers(dest="command")
+
+    tables_parser = commands.add_parser("tables", help="generate the solver's tables file (see load_tables)")
+    tables_parser.add_argument("path", help="where to write the tables")
+
+    batch_parser = commands.add_parser("batch",
+                                       help="apply (or solve) every line of a file across worker processes (see run_batch)")
+    batch_parser.add_argument("path", help='file with one input per line ("-" for stdin)')
+    batch_parser.add_argument("--mode", choices=_BATCH_MODES, default="alg", help="what each line is (default: alg)")
+    batch_parser.add_argument("--start", help="state to apply algorithms and cases to (default: solved)")
+    batch_parser.add_argument("--workers", type=int, help="number of worker processes (default: every CPU)")
+    batch_parser.add_argument("--chunk-size", type=int, default=256,
+                              help="inputs sent to a worker at once (default: 256)")
+    batch_parser.add_argument("--tables", help="solver's tables file for the workers to load")
+    batch_parser.add_argument("--metric", choices=("twist", "face"), default="twist",
+                              help="solving metric (default: twist)")
+    batch_parser.add_argument("--max-depth", type=int, help="longest solution to look for")
+    batch_parser.add_argument("--time-limit", type=float, help="seconds to spend solving each state")
+
+    stream_parser = commands.add_parser("stream", help="apply every line of stdin and write the results to stdout "
+                                                       "(the default command, see stream)")
+    stream_parser.add_argument("--mode", choices=("alg", "case", "state"), default="alg",
+                               help="what each plain (non-JSON) line is (default: alg)")
+
+    serve_parser = commands.add_parser("serve",
+                                       help="answer newline-delimited JSON requests over TCP or a Unix socket (see Service)")
+    serve_parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    serve_parser.add_argument("--port", type=int, default=8765, help="port to listen on (default: 8765)")
+    serve_parser.add_argument("--path", help="Unix socket to listen on instead of a port")
+    serve_parser.add_argument("--workers", type=int, help="size of the worker pool (default: every CPU)")
+    serve_parser.add_argument("--executor", choices=_SERVICE_EXECUTORS, default="process",
+                              help="worker pool kind (default: process)")
+    serve_parser.add_argument("--max-batch", type=int, default=64, help="requests sent to a worker at once (default: 64)")
+    serve_parser.add_argument("--max-pending", type=int, default=1024,
+                              help="requests waiting before clients are slowed down (default: 1024)")
+    serve_parser.add_argument("--timeout", type=float, default=10.0,
+                              help="seconds before a request gets a timeout error (default: 10)")
+
+    args = parser.parse_args(argv)
+
+    if args.command is None:
+        args = parser.parse_args(["stream"])
+
+    if args.command == "stream":
+        for line in stream(sys.stdin, args.mode):
+            sys.stdout.write(line + "\n")
+    elif args.command == "tables":
+        generate_tables(args.path)
+    elif args.command == "serve":
+        serve(args.host, args.port, args.path, workers=args.workers, executor=args.executor, max_batch=args.max_batch,
+              max_pending=args.max_pending, timeout=args.timeout)
+    elif args.command == "batch":
+        _run_batch_command(parser, args)
+
+
+if __name__ == "__main__":
+    main()